@@ -0,0 +1,435 @@
+"""Benchmark the Smart Host repositories, services and HTTP API.
+
+Each dataset size runs in a fresh process against its own SQLite file seeded
+with that many rooms and bookings (and a tenth as many properties). Every
+case reports throughput and p50/p95/p99 latency. The levels, selectable with
+``--levels``, are:
+
+* ``repository`` - ``add_booking``, ``list_bookings`` and ``list_rooms``
+* ``service`` - converting bookings to dicts and encoding them as JSON
+* ``api`` - requests through ``TestClient``
+* ``uvicorn`` - the same requests against a real Uvicorn process, optionally
+  from ``--concurrency`` parallel clients
+
+Save a run and compare a later one against it; ``compare`` exits with
+status 1 when a case got slower than the threshold allows::
+
+    python scripts/bench.py run --sizes 1000,100000 --output before.json
+    python scripts/bench.py run --sizes 1000,100000 --output after.json
+    python scripts/bench.py compare before.json after.json --threshold 0.15
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+LEVELS = ("repository", "service", "api", "uvicorn")
+SEED_CHUNK = 50_000
+FUTURE = date(2100, 1, 1)
+
+
+def summarize(samples: list[float], wall: float) -> dict:
+    """Return throughput and latency percentiles of ``samples`` (seconds)."""
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "n": len(samples),
+        "ops_per_sec": round(len(samples) / wall, 1),
+        "p50_ms": round(cuts[49] * 1000, 4),
+        "p95_ms": round(cuts[94] * 1000, 4),
+        "p99_ms": round(cuts[98] * 1000, 4),
+    }
+
+
+def measure(
+    op: Callable[[int], object], iterations: int, warmup: int, concurrency: int = 1
+) -> dict:
+    """Call ``op(i)`` ``iterations`` times after ``warmup`` untimed calls."""
+    for i in range(warmup):
+        op(-1 - i)
+
+    def timed(i: int) -> float:
+        start = time.perf_counter()
+        op(i)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(timed, range(iterations)))
+    else:
+        samples = [timed(i) for i in range(iterations)]
+    return summarize(samples, time.perf_counter() - start)
+
+
+def seed(size: int) -> None:
+    """Fill the configured database with ``size`` rooms and bookings."""
+    from sqlalchemy import insert
+
+    from smart_host.infrastructure import init_db
+    from smart_host.infrastructure.sql import engine
+    from smart_host.infrastructure.sql.models import (
+        BookingTable,
+        PropertyTable,
+        RoomTable,
+    )
+
+    init_db()
+    rng = random.Random(size)
+    properties = max(1, size // 10)
+    features = ["wifi", "sea view", "garden", "kitchen", "balcony", "pool"]
+    tables = [
+        (
+            PropertyTable,
+            properties,
+            lambda i: {"name": f"Property {i}", "location": f"Town {i % 100}"},
+        ),
+        (
+            RoomTable,
+            size,
+            lambda i: {
+                "property_id": i % properties + 1,
+                "beds": rng.randint(1, 6),
+                "features": ", ".join(rng.sample(features, 2)),
+                "price": round(rng.uniform(30, 500), 2),
+            },
+        ),
+        (
+            BookingTable,
+            size,
+            lambda i: {
+                "room_id": i + 1,
+                "guest_name": f"Guest {i}",
+                "language": rng.choice(["en", "nl", "es", "pap"]),
+                "check_in": date(2024, 1, 1) + timedelta(days=i % 300),
+                "check_out": date(2024, 1, 3) + timedelta(days=i % 300),
+            },
+        ),
+    ]
+    for table, count, row in tables:
+        for start in range(0, count, SEED_CHUNK):
+            stop = min(start + SEED_CHUNK, count)
+            with engine.begin() as conn:
+                conn.execute(insert(table), [row(i) for i in range(start, stop)])
+
+
+class _Stays:
+    """Hands out stays that never overlap, one per call."""
+
+    def __init__(self, rooms: int) -> None:
+        self._rooms = rooms
+        self._counter = itertools.count()  # next() is atomic across threads
+
+    def __call__(self) -> tuple[int, date, date]:
+        n = next(self._counter)
+        room_id = n % self._rooms + 1
+        check_in = FUTURE + timedelta(days=2 * (n // self._rooms))
+        return room_id, check_in, check_in + timedelta(days=1)
+
+
+def repository_cases(size: int, stays: _Stays) -> dict[str, Callable[[int], object]]:
+    from smart_host.domain import Booking
+    from smart_host.infrastructure import BookingRepository, PropertyRepository
+
+    bookings = BookingRepository()
+    properties = PropertyRepository()
+    rng = random.Random(1)
+
+    def add_booking(i: int) -> None:
+        room_id, check_in, check_out = stays()
+        bookings.add_booking(Booking(0, room_id, "Bench", "en", check_in, check_out))
+
+    return {
+        "add_booking": add_booking,
+        "list_bookings[limit=100]": lambda i: bookings.list_bookings(
+            limit=100, after=rng.randrange(size)
+        ),
+        "list_rooms[property]": lambda i: properties.list_rooms(
+            rng.randrange(max(1, size // 10)) + 1
+        ),
+    }
+
+
+def service_cases() -> dict[str, Callable[[int], object]]:
+    from smart_host.domain import Booking
+    from smart_host.interface.responses import dumps
+    from smart_host.service.serialization import to_dict
+
+    page = [
+        Booking(i, i, f"Guest {i}", "en", date(2024, 1, 1), date(2024, 1, 3))
+        for i in range(100)
+    ]
+    return {
+        "to_dict[100 bookings]": lambda i: [to_dict(b) for b in page],
+        "to_dict+dumps[100 bookings]": lambda i: dumps([to_dict(b) for b in page]),
+    }
+
+
+def http_cases(get, post, size: int, stays: _Stays) -> dict[str, Callable]:
+    rng = random.Random(2)
+
+    def create_booking(i: int) -> None:
+        room_id, check_in, check_out = stays()
+        post(
+            "/bookings",
+            params={
+                "room_id": room_id,
+                "guest_name": "Bench",
+                "language": "en",
+                "check_in": check_in.isoformat(),
+                "check_out": check_out.isoformat(),
+            },
+        ).raise_for_status()
+
+    return {
+        "POST /bookings": create_booking,
+        "GET /bookings[limit=100]": lambda i: get(
+            "/bookings", params={"limit": 100, "after": rng.randrange(size)}
+        ).raise_for_status(),
+        "GET /properties/{id}/rooms": lambda i: get(
+            f"/properties/{rng.randrange(max(1, size // 10)) + 1}/rooms"
+        ).raise_for_status(),
+        "GET /rooms/search": lambda i: get(
+            "/rooms/search", params={"max_price": 100, "min_beds": 2}
+        ).raise_for_status(),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def uvicorn_cases(size: int, stays: _Stays, run) -> dict[str, dict]:
+    """Start Uvicorn on the seeded database and run the HTTP cases on it."""
+    import httpx
+
+    port = _free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "smart_host.interface.api:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        env=os.environ.copy(),
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"{base_url}/properties", params={"limit": 1})
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError("uvicorn did not start")
+                time.sleep(0.1)
+        with httpx.Client(base_url=base_url) as client:
+            cases = http_cases(client.get, client.post, size, stays)
+            return {name: run(op) for name, op in cases.items()}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def worker(args: argparse.Namespace) -> None:
+    """Seed one database and print the results of every requested level."""
+    size = args.size
+    seed(size)
+    stays = _Stays(size)
+    results: dict[str, dict] = {}
+
+    def run(op, concurrency: int = 1) -> dict:
+        return measure(op, args.iterations, args.warmup, concurrency)
+
+    if "repository" in args.levels:
+        for name, op in repository_cases(size, stays).items():
+            results[f"repository/{name}@{size}"] = run(op)
+    if "service" in args.levels:
+        for name, op in service_cases().items():
+            results[f"service/{name}@{size}"] = run(op)
+    if "api" in args.levels:
+        from fastapi.testclient import TestClient
+
+        from smart_host.interface.api import create_app
+
+        with TestClient(create_app()) as client:
+            for name, op in http_cases(client.get, client.post, size, stays).items():
+                results[f"api/{name}@{size}"] = run(op)
+    if "uvicorn" in args.levels:
+        measured = uvicorn_cases(size, stays, lambda op: run(op, args.concurrency))
+        for name, result in measured.items():
+            results[f"uvicorn/{name}@{size}"] = result
+    print(json.dumps(results))
+
+
+def run_suite(args: argparse.Namespace) -> None:
+    """Run every size in its own process and save the combined results."""
+    results: dict[str, dict] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            print(f"size {size}: seeding and measuring ...", file=sys.stderr)
+            env = dict(os.environ, PYTHONPATH=str(args.src))
+            env["DATABASE_URL"] = f"sqlite:///{tmp}/bench_{size}.db"
+            env.pop("DATABASE_READ_URL", None)
+            out = subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "worker",
+                    "--size",
+                    str(size),
+                    "--levels",
+                    ",".join(args.levels),
+                    "--iterations",
+                    str(args.iterations),
+                    "--warmup",
+                    str(args.warmup),
+                    "--concurrency",
+                    str(args.concurrency),
+                ],
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            results.update(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "src": str(args.src),
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    for name, result in results.items():
+        print(
+            f"{name:<48} {result['ops_per_sec']:>10.1f} ops/s"
+            f"  p50 {result['p50_ms']:8.3f}  p95 {result['p95_ms']:8.3f}"
+            f"  p99 {result['p99_ms']:8.3f} ms"
+        )
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"results written to {args.output}")
+
+
+def compare(args: argparse.Namespace) -> int:
+    """Print the change per case; return 1 if any case regressed."""
+    old_report = json.loads(args.baseline.read_text())
+    new_report = json.loads(args.current.read_text())
+    for key in ("iterations", "concurrency"):
+        if old_report["meta"][key] != new_report["meta"][key]:
+            print(f"warning: runs differ in {key}; figures may not be comparable")
+    baseline, current = old_report["results"], new_report["results"]
+    regressions = []
+    for name in sorted(baseline.keys() & current.keys()):
+        old, new = baseline[name], current[name]
+        throughput = new["ops_per_sec"] / old["ops_per_sec"] - 1
+        latency = new["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] else 0.0
+        regressed = throughput < -args.threshold or latency > args.threshold
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{'REGRESSED' if regressed else 'ok':<9} {name:<48}"
+            f" ops/s {throughput:+7.1%}  p95 {latency:+7.1%}"
+        )
+    for name in sorted(baseline.keys() - current.keys()):
+        print(f"{'missing':<9} {name}")
+    if regressions:
+        print(f"{len(regressions)} case(s) beyond the {args.threshold:.0%} threshold")
+        return 1
+    return 0
+
+
+def _csv(convert):
+    return lambda value: [convert(item) for item in value.split(",") if item]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_run_options(sub: argparse.ArgumentParser) -> None:
+        sub.add_argument(
+            "--levels",
+            type=_csv(str),
+            default=list(LEVELS),
+            help=f"comma separated subset of {', '.join(LEVELS)}",
+        )
+        sub.add_argument(
+            "--iterations", type=int, default=200, help="timed calls per case"
+        )
+        sub.add_argument(
+            "--warmup", type=int, default=20, help="untimed calls per case"
+        )
+        sub.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="parallel clients for the uvicorn level",
+        )
+
+    run = commands.add_parser("run", help="run the benchmarks")
+    add_run_options(run)
+    run.add_argument(
+        "--sizes",
+        type=_csv(int),
+        default=[1_000, 100_000],
+        help="comma separated row counts, e.g. 1000,100000,1000000",
+    )
+    run.add_argument("--output", type=Path, help="write the results as JSON")
+    run.add_argument(
+        "--src", type=Path, default=SRC, help="source directory to benchmark"
+    )
+
+    work = commands.add_parser("worker", help=argparse.SUPPRESS)
+    add_run_options(work)
+    work.add_argument("--size", type=int, required=True)
+
+    cmp = commands.add_parser("compare", help="compare two saved runs")
+    cmp.add_argument("baseline", type=Path)
+    cmp.add_argument("current", type=Path)
+    cmp.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="allowed relative slowdown in ops/s or p95, e.g. 0.10 for 10%%",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        run_suite(args)
+    elif args.command == "worker":
+        worker(args)
+    else:
+        return compare(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Measure import-to-first-request latency of the Smart Host API.
+
+Each run starts a fresh interpreter in a scratch directory, imports
+``smart_host.interface.api``, starts the app (running its startup hooks) and
+times the first ``GET /properties``. Third-party libraries are imported
+before the clock starts, so the figures cover the application's own cold
+start: its modules, building the app, schema bootstrap and the request. Point ``--src`` at another checkout's
+``src`` directory to compare two versions, e.g. before and after a change::
+
+    python scripts/bench_startup.py
+    git worktree add /tmp/old <rev> && python scripts/bench_startup.py --src /tmp/old/src
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+CHILD = """
+from fastapi.testclient import TestClient
+import fastapi.templating, pydantic, sqlalchemy.orm  # noqa: F401
+import time
+
+start = time.perf_counter()
+from smart_host.interface.api import app
+
+with TestClient(app) as client:
+    client.get("/properties").raise_for_status()
+print(time.perf_counter() - start)
+"""
+
+
+def measure(src: Path, workdir: Path) -> float:
+    """Return the seconds one cold process needed to answer its first request."""
+    env = dict(os.environ, PYTHONPATH=str(src))
+    env.pop("DATABASE_URL", None)
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=workdir,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--src",
+        type=Path,
+        default=Path(__file__).resolve().parents[1] / "src",
+        help="source directory to benchmark",
+    )
+    parser.add_argument("--runs", type=int, default=10, help="processes per scenario")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # "new database" removes the file before every run, "existing
+        # database" reuses the one created by the first run.
+        scenarios = {"new database": [], "existing database": []}
+        for _ in range(args.runs):
+            fresh = Path(tmp) / "fresh"
+            fresh.mkdir()
+            scenarios["new database"].append(measure(args.src, fresh))
+            for path in fresh.iterdir():
+                path.unlink()
+            fresh.rmdir()
+        for _ in range(args.runs):
+            scenarios["existing database"].append(measure(args.src, Path(tmp)))
+
+    for name, samples in scenarios.items():
+        print(
+            f"{name:>18}: median {statistics.median(samples) * 1000:7.1f} ms"
+            f"  min {min(samples) * 1000:7.1f} ms  ({len(samples)} runs)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,292 @@
-"""Script to generate sample data for Smart Host."""
+"""Generate a reproducible synthetic dataset for Smart Host.
 
+Rows are written with explicit ids in chunks, one transaction per chunk.
+Every chunk draws from its own random generator seeded with ``--seed``, the
+table and the chunk's first row, so the same arguments always produce the
+same data and ``--resume`` can continue an interrupted run where its last
+committed chunk ended::
+
+    python scripts/generate_test_data.py --properties 100000 \\
+        --rooms-per-property 5 --bookings 10000000 --seed 7
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
 import sys
+import time
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from datetime import date
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
 
-from smart_host.infrastructure import PropertyRepository, init_db
+from sqlalchemy import Engine, func, insert, select, update
+
+from smart_host.infrastructure.sql.migrations import migrate
+from smart_host.infrastructure.sql.models import (
+    BookingTable,
+    ChangeVersionTable,
+    HostTable,
+    PropertyTable,
+    RoomTable,
+)
+
+FIRST_NAMES = "Ana Bob Carla Daan Eva Finn Gaby Hugo Ines Joris Kim Luis".split()
+LAST_NAMES = "Croes,de Vries,Garcia,Jansen,Kock,Lopez,Maduro,Ras,Tromp".split(",")
+LOCATIONS = (
+    "Paradera,Noord,Oranjestad,Santa Cruz,Savaneta,San Nicolas,Palm Beach,"
+    "Eagle Beach,Malmok,Pos Chiquito"
+).split(",")
+PROPERTY_KINDS = "House Villa Cottage Apartments Lodge Suites".split()
+FEATURES = (
+    "WiFi,Sea view,Garden access,Kitchen,Balcony,Air conditioning,Pool,Parking"
+).split(",")
+
+
+def _weighted(values: list, weights: list[int]) -> list:
+    """Repeat each value by its weight; a uniform pick is then weighted."""
+    return [value for value, weight in zip(values, weights) for _ in range(weight)]
+
+
+GUEST_NAMES = [f"{first} {last}" for first in FIRST_NAMES for last in LAST_NAMES]
+LANGUAGE_POOL = _weighted(["en", "nl", "es", "pap", "de"], [8, 5, 3, 3, 1])
+NIGHT_POOL = _weighted(
+    list(range(1, 15)), [8, 14, 16, 14, 10, 8, 12, 4, 3, 3, 2, 2, 1, 3]
+)
+BEDS_POOL = _weighted([1, 2, 3, 4, 6], [4, 9, 3, 3, 1])
+
+STAY_WINDOW_DAYS = 21
+"""Each booking of a room owns one window this long, so stays never overlap."""
+
+
+@dataclass(frozen=True)
+class Plan:
+    """Row counts and options of one generator run."""
+
+    hosts: int
+    properties: int
+    rooms_per_property: int
+    bookings: int
+    start: date
+
+    @property
+    def rooms(self) -> int:
+        return self.properties * self.rooms_per_property
+
+    @property
+    def stays_per_room(self) -> int:
+        return -(-self.bookings // self.rooms) if self.rooms else 0
+
+
+def host_rows(plan: Plan, rng: random.Random, ids: range) -> Iterator[dict]:
+    for i in ids:
+        yield {
+            "id": i + 1,
+            "name": rng.choice(GUEST_NAMES),
+            "rating": round(rng.triangular(2.5, 5.0, 4.6), 1),
+        }
+
+
+def property_rows(plan: Plan, rng: random.Random, ids: range) -> Iterator[dict]:
+    for i in ids:
+        location = rng.choice(LOCATIONS)
+        yield {
+            "id": i + 1,
+            "name": f"{location} {rng.choice(PROPERTY_KINDS)} {i + 1}",
+            "location": location,
+        }
+
+
+def room_rows(plan: Plan, rng: random.Random, ids: range) -> Iterator[dict]:
+    for i in ids:
+        beds = rng.choice(BEDS_POOL)
+        yield {
+            "id": i + 1,
+            "property_id": i // plan.rooms_per_property + 1,
+            "beds": beds,
+            "features": ", ".join(rng.sample(FEATURES, rng.randint(1, 4))),
+            "price": round(40 + 35 * beds + rng.gauss(0, 20), 2),
+        }
+
+
+def booking_rows(plan: Plan, rng: random.Random, ids: range) -> Iterator[dict]:
+    # Bookings are laid out room by room so the stay index is appended to
+    # in order; the k-th stay of a room falls somewhere in its k-th window.
+    # This loop dominates large runs, hence ``random()`` indexing instead of
+    # the slower ``choice``/``randrange`` helpers.
+    per_room = plan.stays_per_room
+    random_ = rng.random
+    first_day = plan.start.toordinal()
+    for i in ids:
+        room, stay = divmod(i, per_room)
+        nights = NIGHT_POOL[int(random_() * len(NIGHT_POOL))]
+        offset = int(random_() * (STAY_WINDOW_DAYS - nights + 1))
+        check_in = first_day + stay * STAY_WINDOW_DAYS + offset
+        yield {
+            "id": i + 1,
+            "room_id": room + 1,
+            "guest_name": GUEST_NAMES[int(random_() * len(GUEST_NAMES))],
+            "language": LANGUAGE_POOL[int(random_() * len(LANGUAGE_POOL))],
+            "check_in": date.fromordinal(check_in),
+            "check_out": date.fromordinal(check_in + nights),
+        }
+
+
+RowFactory = Callable[[Plan, random.Random, range], Iterator[dict]]
+
+
+class Progress:
+    """Report the rows written to one table, at most once per second."""
+
+    def __init__(self, name: str, total: int, done: int, quiet: bool) -> None:
+        self._name = name
+        self._total = total
+        self._start_done = done
+        self._quiet = quiet
+        self._shown_done = None
+        self._started = self._shown = time.monotonic()
+
+    def update(self, done: int, *, final: bool = False) -> None:
+        now = time.monotonic()
+        if self._quiet or done == self._shown_done:
+            return
+        if not final and now - self._shown < 1.0:
+            return
+        self._shown, self._shown_done = now, done
+        rate = (done - self._start_done) / max(now - self._started, 1e-9)
+        percent = done / self._total if self._total else 1.0
+        print(
+            f"{self._name:>10}: {done:>12,}/{self._total:,} ({percent:6.1%})"
+            f"  {rate:>10,.0f} rows/s",
+            file=sys.stderr,
+        )
+
+
+def fill(
+    engine: Engine,
+    name: str,
+    table,
+    total: int,
+    rows: RowFactory,
+    plan: Plan,
+    *,
+    seed: int,
+    chunk_size: int,
+    resume: bool,
+    quiet: bool,
+) -> None:
+    """Insert rows ``0..total`` of ``table`` in chunked transactions."""
+    with engine.connect() as conn:
+        done = conn.scalar(select(func.count()).select_from(table))
+    if done and not resume:
+        sys.exit(f"{name} already holds {done} rows; use --resume or an empty database")
+    if done > total:
+        sys.exit(f"{name} holds {done} rows, more than the requested {total}")
+
+    progress = Progress(name, total, done, quiet)
+    stmt = insert(table)
+    versioned = "version" in table.__table__.c
+    for start in range(done, total, chunk_size):
+        ids = range(start, min(start + chunk_size, total))
+        rng = random.Random(f"{seed}:{name}:{start}")
+        batch = list(rows(plan, rng, ids))
+        if versioned:
+            # Like migrated rows, generated rows take their id as version.
+            for row in batch:
+                row["version"] = row["id"]
+        with engine.begin() as conn:
+            conn.execute(stmt, batch)
+        progress.update(ids.stop)
+    progress.update(total, final=True)
+
+    if versioned:
+        counter = ChangeVersionTable
+        with engine.begin() as conn:
+            conn.execute(
+                update(counter)
+                .where(counter.name == table.__tablename__, counter.version < total)
+                .values(version=total)
+            )
+
+    if engine.dialect.name == "postgresql":
+        # Explicit ids do not advance the serial sequence.
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                f"SELECT setval(pg_get_serial_sequence('{table.__tablename__}', 'id'),"
+                f" (SELECT coalesce(max(id), 1) FROM {table.__tablename__}))"
+            )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hosts", type=int, default=10)
+    parser.add_argument("--properties", type=int, default=10)
+    parser.add_argument("--rooms-per-property", type=int, default=3)
+    parser.add_argument("--bookings", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--start-date",
+        type=date.fromisoformat,
+        default=date(2024, 1, 1),
+        help="first day stays may begin (default 2024-01-01)",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=50_000, help="rows per transaction"
+    )
+    parser.add_argument("--url", help="database URL (defaults to DATABASE_URL)")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue an interrupted run with the same arguments",
+    )
+    parser.add_argument("--quiet", action="store_true", help="no progress output")
+    args = parser.parse_args(argv)
+
+    plan = Plan(
+        hosts=args.hosts,
+        properties=args.properties,
+        rooms_per_property=args.rooms_per_property,
+        bookings=args.bookings,
+        start=args.start_date,
+    )
+    if plan.bookings and not plan.rooms:
+        parser.error("bookings need at least one property with rooms")
+
+    if args.url:
+        from smart_host.infrastructure.sql.engine import create_db_engine
 
+        engine = create_db_engine(args.url)
+    else:
+        from smart_host.infrastructure.sql import engine
+    migrate(engine)
 
-def main() -> None:
-    init_db()
-    repo = PropertyRepository()
-    aruba = repo.add_property(name="Aruba House", location="Paradera")
-    repo.add_room(property_id=aruba.id, beds=2, features="Sea view", price=100.0)
-    repo.add_room(property_id=aruba.id, beds=1, features="Garden access", price=80.0)
-    for prop in repo.list_properties():
-        print(prop)
-    for room in repo.list_rooms(aruba.id):
-        print(room)
+    started = time.monotonic()
+    for name, table, total, rows in [
+        ("hosts", HostTable, plan.hosts, host_rows),
+        ("properties", PropertyTable, plan.properties, property_rows),
+        ("rooms", RoomTable, plan.rooms, room_rows),
+        ("bookings", BookingTable, plan.bookings, booking_rows),
+    ]:
+        fill(
+            engine,
+            name,
+            table,
+            total,
+            rows,
+            plan,
+            seed=args.seed,
+            chunk_size=args.chunk_size,
+            resume=args.resume,
+            quiet=args.quiet,
+        )
+    print(
+        f"generated {plan.hosts} hosts, {plan.properties} properties,"
+        f" {plan.rooms} rooms and {plan.bookings} bookings"
+        f" in {time.monotonic() - started:.1f}s"
+    )
 
 
 if __name__ == "__main__":
@@ -1,9 +1,8 @@
-"""Entry point for running the Smart Host API using Uvicorn."""
+"""Entry point for running the Smart Host API; see :mod:`smart_host.server`."""
 
-from .config import HOST, PORT
-from .interface.api import app
+import sys
 
-import uvicorn
+from .server import main
 
 if __name__ == "__main__":
-    uvicorn.run(app, host=HOST, port=PORT)
+    sys.exit(main())
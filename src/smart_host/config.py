@@ -2,8 +2,136 @@ import os
 
 """Configuration for the Smart Host application."""
 
+
+def _flag(name: str, default: bool = False) -> bool:
+    """Read a boolean environment variable such as ``1``/``true``/``yes``."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 HOST: str = os.environ.get("HOST", "127.0.0.1")
 """Host interface to bind the web server to."""
 
 PORT: int = int(os.environ.get("PORT", 8000))
 """Port the web server listens on."""
+
+WORKERS: int = int(os.environ.get("WORKERS", 1))
+"""Worker processes ``python -m smart_host`` serves requests with."""
+
+PRELOAD: bool = _flag("PRELOAD", True)
+"""Build the app once before forking workers; off lets a reload pick up new code."""
+
+WARMUP: bool = _flag("WARMUP", True)
+"""Request ``WARMUP_PATHS`` in every worker before it accepts traffic."""
+
+WARMUP_PATHS: tuple[str, ...] = tuple(
+    path.strip()
+    for path in os.environ.get(
+        "WARMUP_PATHS",
+        "/hosts?limit=1,/properties?limit=100,/bookings?limit=1,"
+        "/rooms/search?limit=1",
+    ).split(",")
+    if path.strip()
+)
+"""Comma separated ``GET`` targets used to warm up a worker."""
+
+GRACEFUL_TIMEOUT: int = int(os.environ.get("GRACEFUL_TIMEOUT", 30))
+"""Seconds a stopping worker may finish open requests before it is killed."""
+
+DATABASE_URL: str = os.environ.get("DATABASE_URL", "sqlite:///smart_host.db")
+"""SQLAlchemy URL of the primary (write) database."""
+
+DATABASE_READ_URL: str = os.environ.get("DATABASE_READ_URL", DATABASE_URL)
+"""SQLAlchemy URL used for reads, e.g. a replica. Defaults to ``DATABASE_URL``."""
+
+REPOSITORY_BACKEND: str = os.environ.get("REPOSITORY_BACKEND", "sql")
+"""Where data is kept: ``sql`` databases, or ``memory`` until the process exits."""
+
+BOOKING_SHARDS: tuple[str, ...] = tuple(
+    url.strip()
+    for url in os.environ.get("BOOKING_SHARDS", "").split(",")
+    if url.strip()
+)
+"""URLs of the databases bookings are sharded over; empty keeps them all in one."""
+
+DB_POOL_SIZE: int = int(os.environ.get("DB_POOL_SIZE", 5))
+"""Connections kept open per engine pool."""
+
+DB_MAX_OVERFLOW: int = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+"""Extra connections a pool may open beyond ``DB_POOL_SIZE`` under load."""
+
+DB_POOL_TIMEOUT: float = float(os.environ.get("DB_POOL_TIMEOUT", 30))
+"""Seconds to wait for a pooled connection before giving up."""
+
+DB_BUSY_TIMEOUT_MS: int = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000))
+"""Milliseconds SQLite waits on a locked database before failing."""
+
+SQLITE_MMAP_SIZE: int = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+"""Bytes of the SQLite file mapped into memory (``PRAGMA mmap_size``)."""
+
+SQLITE_CACHE_SIZE: int = int(os.environ.get("SQLITE_CACHE_SIZE", -64000))
+"""SQLite page cache size; negative values are KiB (``PRAGMA cache_size``)."""
+
+ASYNC_DB: bool = _flag("ASYNC_DB")
+"""Serve the resource routes from ``async def`` handlers on ``AsyncSession``."""
+
+AUTO_MIGRATE: bool = _flag("AUTO_MIGRATE", True)
+"""Apply pending schema migrations when the application starts."""
+
+BOOKING_LOCK_STRIPES: int = int(os.environ.get("BOOKING_LOCK_STRIPES", 64))
+"""In-process locks bookings are spread over by room id."""
+
+ARCHIVE_AFTER_DAYS: int = int(os.environ.get("ARCHIVE_AFTER_DAYS", 0))
+"""Archive bookings this many days after check-out; ``0`` disables archiving."""
+
+ARCHIVE_INTERVAL: float = float(os.environ.get("ARCHIVE_INTERVAL", 3600))
+"""Seconds between two archive passes of the running application."""
+
+ARCHIVE_BATCH_SIZE: int = int(os.environ.get("ARCHIVE_BATCH_SIZE", 500))
+"""Bookings moved to the archive per transaction."""
+
+IMPORT_BATCH_SIZE: int = int(os.environ.get("IMPORT_BATCH_SIZE", 1000))
+"""Records validated and stored per transaction of a bulk import."""
+
+AVAILABILITY_DAYS: int = int(os.environ.get("AVAILABILITY_DAYS", 730))
+"""Nights from today on that ``GET /availability`` can search."""
+
+GROUP_COMMIT: bool = _flag("GROUP_COMMIT")
+"""Store concurrent single bookings together in shared transactions."""
+
+GROUP_COMMIT_INTERVAL_MS: float = float(os.environ.get("GROUP_COMMIT_INTERVAL_MS", 2))
+"""Milliseconds a group commit waits for more bookings after the first."""
+
+GROUP_COMMIT_BATCH_SIZE: int = int(os.environ.get("GROUP_COMMIT_BATCH_SIZE", 256))
+"""Bookings after which a group commit is written without waiting longer."""
+
+PROPERTY_CACHE_SIZE: int = int(os.environ.get("PROPERTY_CACHE_SIZE", 1024))
+"""Cached property and room listings kept per process; ``0`` disables the cache."""
+
+PROPERTY_CACHE_TTL: float = float(os.environ.get("PROPERTY_CACHE_TTL", 60))
+"""Seconds a cached listing is served before it is read again."""
+
+PROPERTY_CACHE_VERSION_TTL: float = float(
+    os.environ.get("PROPERTY_CACHE_VERSION_TTL", 1)
+)
+"""Seconds the property cache trusts a change version before reading it again."""
+
+QUOTE_CACHE_SIZE: int = int(os.environ.get("QUOTE_CACHE_SIZE", 4096))
+"""Room price calendars cached per process; ``0`` disables the cache."""
+
+METRICS_ENABLED: bool = _flag("METRICS_ENABLED", True)
+"""Record request and SQL metrics and serve them on ``/metrics``."""
+
+SLOW_REQUEST_MS: float = float(os.environ.get("SLOW_REQUEST_MS", 500))
+"""Requests taking at least this many milliseconds are logged with their SQL."""
+
+CHAT_QUEUE_SIZE: int = int(os.environ.get("CHAT_QUEUE_SIZE", 64))
+"""Chat messages buffered per connection before it is dropped as too slow."""
+
+CHAT_HEARTBEAT_SECONDS: float = float(os.environ.get("CHAT_HEARTBEAT_SECONDS", 25))
+"""Seconds of silence after which a chat connection is pinged."""
+
+CHAT_IDLE_TIMEOUT: float = float(os.environ.get("CHAT_IDLE_TIMEOUT", 75))
+"""Seconds without any frame, pongs included, before a chat connection is closed."""
@@ -1,5 +1,13 @@
 """Domain entities and logic."""
 
-from .models import Host, Property, Room, Booking
+from .exceptions import BookingConflictError
+from .models import Host, Property, Room, RoomRate, Booking
 
-__all__ = ["Host", "Property", "Room", "Booking"]
+__all__ = [
+    "Host",
+    "Property",
+    "Room",
+    "RoomRate",
+    "Booking",
+    "BookingConflictError",
+]
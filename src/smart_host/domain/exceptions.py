@@ -0,0 +1,5 @@
+"""Domain level errors."""
+
+
+class BookingConflictError(ValueError):
+    """Raised when a booking overlaps an existing stay in the same room."""
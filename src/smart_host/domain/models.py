@@ -5,15 +5,16 @@ from datetime import date
 from typing import Optional
 
 
-@dataclass
+@dataclass(slots=True)
 class Host:
     """Represents a host entity."""
 
     name: str
     rating: float = 0.0
+    id: Optional[int] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Property:
     """Rental property that may contain multiple rooms."""
 
@@ -22,7 +23,7 @@ class Property:
     location: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Room:
     """Individual room within a property."""
 
@@ -33,7 +34,26 @@ class Room:
     price: float = 0.0
 
 
-@dataclass
+@dataclass(slots=True)
+class RoomRate:
+    """Nightly price or minimum stay of a room on some nights.
+
+    A rate covers the nights from ``start`` up to but excluding ``end``,
+    either bound left open, that fall on one of ``weekdays`` (``0`` is
+    Monday; all days when ``None``). It sets their ``price`` and the
+    ``min_nights`` of stays checking in on them, whichever is given.
+    """
+
+    id: int
+    room_id: int
+    price: Optional[float] = None
+    min_nights: Optional[int] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
+    weekdays: Optional[list[int]] = None
+
+
+@dataclass(slots=True)
 class Booking:
     """Booking for a room by a travel group."""
 
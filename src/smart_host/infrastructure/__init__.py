@@ -1,11 +1,42 @@
-"""Infrastructure layer using SQLAlchemy-backed repositories."""
+"""Infrastructure layer using SQLAlchemy-backed or in-memory repositories."""
 
 from .repository import HostRepository, PropertyRepository, BookingRepository
+from .analytics import AnalyticsRepository
+from .availability import AvailabilityIndex
+from .group_commit import (
+    AsyncGroupCommitBookingRepository,
+    GroupCommitBookingRepository,
+)
+from .archive import PeriodicArchiver
+from .shards import IdAllocator, ShardedBookingRepository, ShardRouter
+from .memory import (
+    MemoryBookingRepository,
+    MemoryHostRepository,
+    MemoryPropertyRepository,
+    MemoryStore,
+)
+from .cache import MISSING, CacheBackend, CachedPropertyRepository, LRUCache
 from .sql import init_db
 
 __all__ = [
     "HostRepository",
     "PropertyRepository",
     "BookingRepository",
+    "AnalyticsRepository",
+    "AvailabilityIndex",
+    "MemoryStore",
+    "MemoryHostRepository",
+    "MemoryPropertyRepository",
+    "MemoryBookingRepository",
+    "CacheBackend",
+    "CachedPropertyRepository",
+    "LRUCache",
+    "MISSING",
+    "GroupCommitBookingRepository",
+    "AsyncGroupCommitBookingRepository",
+    "PeriodicArchiver",
+    "IdAllocator",
+    "ShardRouter",
+    "ShardedBookingRepository",
     "init_db",
 ]
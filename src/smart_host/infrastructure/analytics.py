@@ -0,0 +1,282 @@
+"""Columnar snapshots of bookings and rooms for the analytics service.
+
+Reports scan every stay of a date range, which is too many rows to hydrate
+into domain objects per request. :class:`AnalyticsRepository` instead keeps
+the booking and room columns as NumPy arrays in memory. Each report only
+fetches the rooms and bookings stamped since the previous change versions
+and writes them over their old entries, so upserts are picked up like new
+rows. Archiving deletes bookings without stamping any; when the live
+stays no longer add up to the live row count they are reloaded. Archived
+bookings are read as a source of their own, keyed by archive order.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy import Integer, Select, func, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+from .repository import _SqlRepository, _version_stmt
+from .sql.models import BookingArchiveTable, BookingTable, RoomTable
+
+
+class epoch_day(FunctionElement):
+    """Days since 1970-01-01 of a ``DATE`` column, computed by the database."""
+
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(epoch_day)
+def _epoch_day(element, compiler, **kw) -> str:
+    return f"({compiler.process(element.clauses, **kw)} - DATE '1970-01-01')"
+
+
+@compiles(epoch_day, "sqlite")
+def _epoch_day_sqlite(element, compiler, **kw) -> str:
+    return f"(unixepoch({compiler.process(element.clauses, **kw)}) / 86400)"
+
+
+@compiles(epoch_day, "mysql")
+def _epoch_day_mysql(element, compiler, **kw) -> str:
+    return f"(TO_DAYS({compiler.process(element.clauses, **kw)}) - 719528)"
+
+
+@dataclass(frozen=True)
+class StayColumns:
+    """One entry per booking; days are counted from 1970-01-01.
+
+    ``language`` holds indexes into ``languages``.
+    """
+
+    check_in: np.ndarray
+    check_out: np.ndarray
+    room_id: np.ndarray
+    language: np.ndarray
+    languages: tuple[str, ...]
+
+    def __len__(self) -> int:
+        return len(self.room_id)
+
+
+@dataclass(frozen=True)
+class RoomColumns:
+    """Room attributes indexed by room id; ids without a room hold ``-1``."""
+
+    property_id: np.ndarray
+    price: np.ndarray
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.property_id >= 0))
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Stays and rooms as of one refresh."""
+
+    stays: StayColumns
+    rooms: RoomColumns
+
+
+def _stays_stmt(key, table) -> Select:
+    return select(
+        key,
+        epoch_day(table.check_in),
+        epoch_day(table.check_out),
+        table.room_id,
+        table.language,
+    )
+
+
+def _changed(stmt: Select, table, since: int, current: int) -> Select:
+    return stmt.where(table.version > since, table.version <= current)
+
+
+_ROOM_COLUMNS = select(RoomTable.id, RoomTable.property_id, RoomTable.price)
+
+_NO_STAYS = StayColumns(
+    check_in=np.empty(0, np.int32),
+    check_out=np.empty(0, np.int32),
+    room_id=np.empty(0, np.int64),
+    language=np.empty(0, np.int16),
+    languages=(),
+)
+_NO_ROOMS = RoomColumns(property_id=np.full(1, -1, np.int64), price=np.zeros(1))
+
+
+class AnalyticsRepository(_SqlRepository):
+    """Read bookings and rooms as NumPy columns instead of domain objects.
+
+    Bookings are read through ``stay_session_factories``, e.g. the read
+    factories of every booking shard, and from the rooms' database when it
+    is not given.
+    """
+
+    def __init__(self, *args, stay_session_factories=None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._stay_sources = list(
+            stay_session_factories or [self._read_session_factory]
+        )
+        self._lock = threading.Lock()
+        self._snapshot = Snapshot(_NO_STAYS, _NO_ROOMS)
+        sources = len(self._stay_sources)
+        self._live = [_NO_STAYS] * sources
+        self._live_ids = [np.empty(0, np.int64)] * sources
+        self._booking_versions = [0] * sources
+        self._archived = [_NO_STAYS] * sources
+        self._last_archive_seqs = [0] * sources
+        self._languages: dict[str, int] = {}
+        self._room_version = 0
+
+    def snapshot(self) -> Snapshot:
+        """Return the columns of all bookings and rooms stored so far."""
+        with self._lock:
+            with self._read_session_factory() as session:
+                rooms = self._refresh_rooms(session)
+            for source, session_factory in enumerate(self._stay_sources):
+                with session_factory() as session:
+                    self._live[source] = self._refresh_live(session, source)
+                    self._archived[source] = self._refresh_archived(
+                        session, source
+                    )
+            stays = _concat(self._live + self._archived)
+            self._snapshot = Snapshot(stays, rooms)
+            return self._snapshot
+
+    def _refresh_live(self, session: Session, source: int) -> StayColumns:
+        """Catch the live stays of ``source`` up with its ``bookings`` version.
+
+        Changed rows replace the stays of their ids. Archiving deletes rows
+        without stamping any, so the columns are reloaded when they do not
+        add up to the rows stored at the new version.
+        """
+        current = self._live[source]
+        since = self._booking_versions[source]
+        version = session.scalar(_version_stmt("bookings")) or 0
+        if version == since:
+            return current
+        stays = _stays_stmt(BookingTable.id, BookingTable)
+        rows = _fetch(
+            session, _changed(stays, BookingTable, since, version), BookingTable.id
+        )
+        ids = self._live_ids[source]
+        changed = np.fromiter((row[0] for row in rows), np.int64, len(rows))
+        if len(ids) and len(changed) and changed.min() <= ids.max():
+            kept = ~np.isin(ids, changed)
+            current, ids = _take(current, kept), ids[kept]
+        ids = np.concatenate([ids, changed])
+        count = session.scalar(
+            select(func.count())
+            .select_from(BookingTable)
+            .where(BookingTable.version <= version)
+        )
+        if len(ids) != count:
+            current = _NO_STAYS
+            rows = _fetch(
+                session, stays.where(BookingTable.version <= version), BookingTable.id
+            )
+            ids = np.fromiter((row[0] for row in rows), np.int64, len(rows))
+        self._live_ids[source] = ids
+        self._booking_versions[source] = version
+        return self._extend(current, rows)
+
+    def _refresh_archived(self, session: Session, source: int) -> StayColumns:
+        """Append the stays archived by ``source`` since the last refresh.
+
+        Archived rows are never rewritten and ascend in ``seq``.
+        """
+        current = self._archived[source]
+        table, seq = BookingArchiveTable, BookingArchiveTable.seq
+        count = session.scalar(select(func.count()).select_from(table))
+        if count < len(current):
+            current, self._last_archive_seqs[source] = _NO_STAYS, 0
+        if count == len(current):
+            return current
+        stays = _stays_stmt(seq, table)
+        last = self._last_archive_seqs[source]
+        rows = _fetch(session, stays.where(seq > last), seq)
+        if len(current) + len(rows) != count:
+            # A row below the watermark committed late; start over.
+            current, self._last_archive_seqs[source] = _NO_STAYS, 0
+            rows = _fetch(session, stays, seq)
+        if rows:
+            self._last_archive_seqs[source] = rows[-1][0]
+        return self._extend(current, rows)
+
+    def _extend(self, current: StayColumns, rows: list) -> StayColumns:
+        """Return ``current`` with the stays of ``rows`` appended."""
+        if not rows:
+            return current
+        _, check_in, check_out, room_id, language = zip(*rows)
+        # Codes are shared by all sources so their columns can be joined.
+        codes = self._languages
+        for name in sorted(set(language).difference(codes)):
+            codes[name] = len(codes)
+        return StayColumns(
+            check_in=_append(current.check_in, check_in),
+            check_out=_append(current.check_out, check_out),
+            room_id=_append(current.room_id, room_id),
+            language=_append(current.language, map(codes.__getitem__, language)),
+            languages=tuple(codes),
+        )
+
+    def _refresh_rooms(self, session: Session) -> RoomColumns:
+        """Write the rooms changed since the last ``rooms`` version over theirs."""
+        current = self._snapshot.rooms
+        since = self._room_version
+        version = session.scalar(_version_stmt("rooms")) or 0
+        if version == since:
+            return current
+        rows = _fetch(
+            session, _changed(_ROOM_COLUMNS, RoomTable, since, version), RoomTable.id
+        )
+        self._room_version = version
+        if not rows:
+            return current
+        ids, property_id, price = (np.array(c) for c in zip(*rows))
+        size = max(len(current.property_id), int(ids[-1]) + 1)
+        property_ids = np.full(size, -1, np.int64)
+        prices = np.zeros(size)
+        property_ids[: len(current.property_id)] = current.property_id
+        prices[: len(current.price)] = current.price
+        property_ids[ids] = property_id
+        prices[ids] = price
+        return RoomColumns(property_id=property_ids, price=prices)
+
+
+def _fetch(session: Session, stmt: Select, order_by) -> list:
+    # Core execution on the session's connection skips the ORM result
+    # wrapping, which costs more than the fetch itself at these row counts.
+    return session.connection().execute(stmt.order_by(order_by)).all()
+
+
+def _concat(parts: list[StayColumns]) -> StayColumns:
+    if len(parts) == 1:
+        return parts[0]
+    return StayColumns(
+        check_in=np.concatenate([p.check_in for p in parts]),
+        check_out=np.concatenate([p.check_out for p in parts]),
+        room_id=np.concatenate([p.room_id for p in parts]),
+        language=np.concatenate([p.language for p in parts]),
+        languages=max((p.languages for p in parts), key=len),
+    )
+
+
+def _take(columns: StayColumns, mask: np.ndarray) -> StayColumns:
+    return StayColumns(
+        check_in=columns.check_in[mask],
+        check_out=columns.check_out[mask],
+        room_id=columns.room_id[mask],
+        language=columns.language[mask],
+        languages=columns.languages,
+    )
+
+
+def _append(array: np.ndarray, values: Iterable) -> np.ndarray:
+    return np.concatenate([array, np.fromiter(values, dtype=array.dtype)])
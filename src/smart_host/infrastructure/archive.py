@@ -0,0 +1,134 @@
+"""Archival of finished stays.
+
+Bookings are never deleted, so the ``bookings`` table keeps growing with
+stays that ended long ago, and every listing and overlap check pays for
+them. An archive pass moves the bookings that checked out before a cutoff
+into ``bookings_archive``, at most ``ARCHIVE_BATCH_SIZE`` per transaction,
+so bookings never wait long behind it. Archived bookings are listed with
+``include_archived`` and still block overlapping stays.
+
+:class:`PeriodicArchiver` runs a pass every ``ARCHIVE_INTERVAL`` seconds in
+the application. A pass can also be run from the command line::
+
+    python -m smart_host.infrastructure.archive --after-days 90
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import threading
+from datetime import date, timedelta
+from typing import Protocol
+
+from ..config import (
+    ARCHIVE_AFTER_DAYS,
+    ARCHIVE_BATCH_SIZE,
+    ARCHIVE_INTERVAL,
+    BOOKING_SHARDS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Archivable(Protocol):
+    """A booking repository that can archive, sharded or not."""
+
+    def archive(self, before: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+        ...
+
+
+def archive_cutoff(after_days: int, today: date | None = None) -> date:
+    """Return the check-out date before which stays are archived."""
+    return (today or date.today()) - timedelta(days=after_days)
+
+
+class PeriodicArchiver:
+    """Archive stays older than ``after_days`` every ``interval`` seconds.
+
+    Passes run on a daemon thread started by :meth:`start`; a failing pass
+    is logged and retried with the next one. ``archived`` counts the
+    bookings moved so far.
+    """
+
+    def __init__(
+        self,
+        repository: Archivable,
+        after_days: int = ARCHIVE_AFTER_DAYS,
+        interval: float = ARCHIVE_INTERVAL,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+    ) -> None:
+        if after_days < 1:
+            raise ValueError("after_days must be at least 1")
+        self._repository = repository
+        self._after_days = after_days
+        self._interval = interval
+        self._batch_size = batch_size
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.archived = 0
+
+    def run_once(self) -> int:
+        """Run one archive pass now and return the bookings it moved."""
+        before = archive_cutoff(self._after_days)
+        moved = self._repository.archive(before, self._batch_size)
+        self.archived += moved
+        if moved:
+            logger.info("Archived %d bookings that ended before %s", moved, before)
+        return moved
+
+    def start(self) -> None:
+        """Start the archiving thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="booking-archiver", daemon=True
+            )
+            self._thread.start()
+
+    def close(self) -> None:
+        """Stop the archiving thread once its current batch is committed."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Archive pass failed")
+            self._stopped.wait(self._interval)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command line entry point running one archive pass."""
+    parser = argparse.ArgumentParser(
+        description="Move finished Smart Host bookings to the archive."
+    )
+    cutoff = parser.add_mutually_exclusive_group(required=True)
+    cutoff.add_argument(
+        "--before", type=date.fromisoformat, help="archive stays ending before DATE"
+    )
+    cutoff.add_argument(
+        "--after-days",
+        type=int,
+        help="archive stays that ended at least N days ago",
+    )
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    before = args.before or archive_cutoff(args.after_days)
+
+    if BOOKING_SHARDS:
+        from .shards import ShardedBookingRepository, ShardRouter
+
+        repository = ShardedBookingRepository(ShardRouter(BOOKING_SHARDS))
+    else:
+        from .repository import BookingRepository
+
+        repository = BookingRepository()
+    moved = repository.archive(before, args.batch_size)
+    print(f"archived {moved} bookings that ended before {before}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""Asyncio repository implementations on SQLAlchemy's ``AsyncSession``.
+
+They mirror :mod:`.repository` method for method, awaiting the database
+instead of blocking a worker thread.
+"""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator, Iterable
+from contextlib import asynccontextmanager
+from functools import cached_property
+from datetime import date
+import heapq
+from itertools import islice, starmap
+
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from ..domain import Host, Property, Room, Booking, BookingConflictError
+from .locks import AsyncStripedLock
+from .repository import (
+    BEGIN_IMMEDIATE,
+    STREAM_CHUNK_SIZE,
+    _STORED_STAYS,
+    _ARCHIVED_BOOKINGS,
+    _BOOKINGS,
+    _HOSTS,
+    _PROPERTIES,
+    _BatchStays,
+    _booking_id,
+    _booking_row,
+    _bump_stmt,
+    _changes_stmt,
+    _clash,
+    _conflict,
+    _dialect_of,
+    _host_row,
+    _insert_returning_ids,
+    _keyset,
+    _overlap_stmt,
+    _property_row,
+    _room_lock_stmt,
+    _room_row,
+    _rooms_stmt,
+    _rooms_version_stmt,
+    _search_stmt,
+    _stamp,
+    _stored_stays_params,
+    _version_stmt,
+)
+from .sql.migrations import migrate_connection
+from .sql.models import (
+    HostTable,
+    PropertyTable,
+    RoomTable,
+    BookingTable,
+    BookingArchiveTable,
+    ChangeVersionTable,
+)
+
+
+def async_session_factories(
+    write_engine: AsyncEngine, read_engine: AsyncEngine
+) -> tuple[async_sessionmaker, async_sessionmaker]:
+    """Return ``(write, read)`` session factories for the given engines."""
+    return (
+        async_sessionmaker(bind=write_engine, expire_on_commit=False),
+        async_sessionmaker(bind=read_engine, expire_on_commit=False),
+    )
+
+
+async def async_init_db(engine: AsyncEngine) -> None:
+    """Apply pending schema migrations through ``engine``."""
+    async with engine.connect() as conn:
+        await conn.run_sync(migrate_connection)
+
+
+async def _reserve_versions(session: AsyncSession, name: str, count: int = 1) -> int:
+    """Bump the change version of table ``name`` by ``count``; return the first."""
+    stmt = _bump_stmt(name, count)
+    if session.get_bind().dialect.update_returning:
+        last = await session.scalar(stmt.returning(ChangeVersionTable.version))
+    else:
+        await session.execute(stmt)
+        last = await session.scalar(_version_stmt(name))
+    return last - count + 1
+
+
+async def _stamp_versions(session: AsyncSession, table, rows: list[dict]) -> None:
+    """Stamp ``rows`` about to be written to ``table`` if it is versioned."""
+    if rows and "version" in table.__table__.c:
+        _stamp(rows, await _reserve_versions(session, table.__tablename__, len(rows)))
+
+
+class _AsyncSqlRepository:
+    """Shared session handling of the asyncio repositories.
+
+    Reads use ``read_session_factory`` when given and ``session_factory``
+    otherwise.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        read_session_factory: async_sessionmaker | None = None,
+    ) -> None:
+        self._session_factory = session_factory
+        self._read_session_factory = read_session_factory or session_factory
+
+    @cached_property
+    def _dialect(self) -> str:
+        return _dialect_of(self._read_session_factory)
+
+    async def _add_many(self, table, rows: list[dict]) -> list[int]:
+        """Insert ``rows`` in one transaction and return their ids in order."""
+        if not rows:
+            return []
+        async with self._session_factory() as session:
+            await _stamp_versions(session, table, rows)
+            ids = list(await session.scalars(_insert_returning_ids(table), rows))
+            await session.commit()
+        return ids
+
+    async def _add_one(self, table, row: dict) -> int:
+        (row_id,) = await self._add_many(table, [row])
+        return row_id
+
+    async def _list(self, stmt: Select, model: type) -> list:
+        async with self._read_session_factory() as session:
+            return list(starmap(model, await session.execute(stmt)))
+
+    async def _iter(self, stmt: Select, model: type) -> AsyncIterator:
+        """Yield ``model`` instances from a server-side cursor."""
+        stmt = stmt.execution_options(yield_per=STREAM_CHUNK_SIZE)
+        async with self._read_session_factory() as session:
+            async for row in await session.stream(stmt):
+                yield model(*row)
+
+    async def _version(self, name: str) -> int:
+        async with self._read_session_factory() as session:
+            return await session.scalar(_version_stmt(name)) or 0
+
+    async def _changes(
+        self, stmt: Select, table, model: type, since: int, limit: int | None
+    ) -> tuple[list, int]:
+        async with self._read_session_factory() as session:
+            current = await session.scalar(_version_stmt(table.__tablename__)) or 0
+            rows = (
+                await session.execute(_changes_stmt(stmt, table, since, current, limit))
+            ).all()
+        if limit is not None and len(rows) == limit:
+            current = rows[-1][-1]
+        return [model(*row[:-1]) for row in rows], current
+
+
+class AsyncHostRepository(_AsyncSqlRepository):
+    """Host persistence using an ``AsyncSession``."""
+
+    async def add(self, host: Host) -> None:
+        """Persist a host and assign its ``id``."""
+        host.id = await self._add_one(HostTable, _host_row(host))
+
+    async def add_many(self, hosts: list[Host]) -> list[Host]:
+        """Persist ``hosts`` in one transaction and assign their ids."""
+        ids = await self._add_many(HostTable, [_host_row(h) for h in hosts])
+        for host, host_id in zip(hosts, ids):
+            host.id = host_id
+        return hosts
+
+    async def list_hosts(
+        self, limit: int | None = None, after: int | None = None
+    ) -> list[Host]:
+        stmt = _keyset(_HOSTS, HostTable.id, limit, after)
+        return await self._list(stmt, Host)
+
+    def iter_hosts(self, after: int | None = None) -> AsyncIterator[Host]:
+        stmt = _keyset(_HOSTS, HostTable.id, None, after)
+        return self._iter(stmt, Host)
+
+
+class AsyncPropertyRepository(_AsyncSqlRepository):
+    """Property and room storage using an ``AsyncSession``."""
+
+    async def add_property(self, name: str, location: str) -> Property:
+        prop = Property(id=0, name=name, location=location)
+        prop.id = await self._add_one(PropertyTable, _property_row(prop))
+        return prop
+
+    async def add_properties(self, props: list[Property]) -> list[Property]:
+        ids = await self._add_many(PropertyTable, [_property_row(p) for p in props])
+        for prop, prop_id in zip(props, ids):
+            prop.id = prop_id
+        return props
+
+    async def list_properties(
+        self, limit: int | None = None, after: int | None = None
+    ) -> list[Property]:
+        stmt = _keyset(_PROPERTIES, PropertyTable.id, limit, after)
+        return await self._list(stmt, Property)
+
+    def iter_properties(self, after: int | None = None) -> AsyncIterator[Property]:
+        stmt = _keyset(_PROPERTIES, PropertyTable.id, None, after)
+        return self._iter(stmt, Property)
+
+    async def properties_version(self) -> int:
+        return await self._version("properties")
+
+    async def properties_since(
+        self, since: int, limit: int | None = None
+    ) -> tuple[list[Property], int]:
+        return await self._changes(_PROPERTIES, PropertyTable, Property, since, limit)
+
+    async def add_room(
+        self,
+        property_id: int,
+        beds: int = 1,
+        *,
+        features: str | None = None,
+        price: float = 0.0,
+    ) -> Room:
+        room = Room(
+            id=0, property_id=property_id, beds=beds, features=features, price=price
+        )
+        room.id = await self._add_one(RoomTable, _room_row(room))
+        return room
+
+    async def add_rooms(self, rooms: list[Room]) -> list[Room]:
+        ids = await self._add_many(RoomTable, [_room_row(r) for r in rooms])
+        for room, room_id in zip(rooms, ids):
+            room.id = room_id
+        return rooms
+
+    async def list_rooms(
+        self,
+        property_id: int | None = None,
+        limit: int | None = None,
+        after: int | None = None,
+        features_query: str | None = None,
+    ) -> list[Room]:
+        stmt = _rooms_stmt(property_id, features_query, self._dialect)
+        return await self._list(_keyset(stmt, RoomTable.id, limit, after), Room)
+
+    def iter_rooms(
+        self,
+        property_id: int | None = None,
+        after: int | None = None,
+        features_query: str | None = None,
+    ) -> AsyncIterator[Room]:
+        stmt = _rooms_stmt(property_id, features_query, self._dialect)
+        return self._iter(_keyset(stmt, RoomTable.id, None, after), Room)
+
+    async def rooms_version(self, property_id: int | None = None) -> tuple[int, int]:
+        if property_id is None:
+            return await self._version("rooms"), 0
+        async with self._read_session_factory() as session:
+            result = await session.execute(_rooms_version_stmt(property_id))
+        highest, count = result.one()
+        return highest or 0, count
+
+    async def rooms_since(
+        self,
+        since: int,
+        property_id: int | None = None,
+        limit: int | None = None,
+    ) -> tuple[list[Room], int]:
+        stmt = _rooms_stmt(property_id)
+        return await self._changes(stmt, RoomTable, Room, since, limit)
+
+    async def search_rooms(
+        self,
+        location: str | None = None,
+        min_beds: int | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        features: Iterable[str] = (),
+        sort: str = "price",
+        limit: int = 50,
+        features_query: str | None = None,
+    ) -> list[Room]:
+        stmt = _search_stmt(
+            location,
+            min_beds,
+            min_price,
+            max_price,
+            features,
+            sort,
+            limit,
+            features_query,
+            self._dialect,
+        )
+        return await self._list(stmt, Room)
+
+
+class AsyncBookingRepository(_AsyncSqlRepository):
+    """Booking persistence using an ``AsyncSession``.
+
+    Locks like :class:`.repository.BookingRepository`, with the in-process
+    stripes taken on the event loop.
+    """
+
+    def __init__(
+        self, *args, room_locks: AsyncStripedLock | None = None, **kwargs
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self._room_locks = room_locks or AsyncStripedLock()
+
+    @asynccontextmanager
+    async def room_transaction(
+        self, room_ids: Iterable[int]
+    ) -> AsyncIterator[AsyncSession]:
+        """Yield a write session holding the booking locks of ``room_ids``."""
+        room_ids = sorted(set(room_ids))
+        async with self._room_locks.hold(room_ids), self._session_factory() as session:
+            if session.get_bind().dialect.name == "sqlite":
+                conn = await session.connection()
+                await conn.exec_driver_sql(BEGIN_IMMEDIATE)
+            else:
+                await session.execute(_room_lock_stmt(room_ids))
+            yield session
+
+    async def add_booking(self, booking: Booking) -> Booking:
+        """Persist ``booking`` unless it overlaps an existing stay.
+
+        The overlap check and the insert share one room transaction.
+        """
+        async with self.room_transaction([booking.room_id]) as session:
+            clash = await self._find_overlap(
+                session, booking.room_id, booking.check_in, booking.check_out
+            )
+            if clash is not None:
+                raise _conflict(booking.room_id, clash)
+            row = _booking_row(booking)
+            await _stamp_versions(session, BookingTable, [row])
+            booking.id = await session.scalar(
+                _insert_returning_ids(BookingTable).values(row)
+            )
+            await session.commit()
+        return booking
+
+    async def add_bookings(
+        self, bookings: list[Booking]
+    ) -> dict[int, BookingConflictError]:
+        """Persist the non-conflicting ``bookings`` in one transaction.
+
+        Same contract as :meth:`BookingRepository.add_bookings`.
+        """
+        conflicts: dict[int, BookingConflictError] = {}
+        accepted: list[Booking] = []
+        batch = _BatchStays()
+        async with self.room_transaction(b.room_id for b in bookings) as session:
+            for params in _stored_stays_params(bookings):
+                for stay in await session.execute(_STORED_STAYS, params):
+                    batch.add_stay(*stay)
+            for index, booking in enumerate(bookings):
+                clash = batch.find_clash(booking)
+                if clash is not None:
+                    conflicts[index] = _conflict(booking.room_id, clash)
+                    continue
+                batch.add(booking)
+                accepted.append(booking)
+            if accepted:
+                rows = [_booking_row(b) for b in accepted]
+                await _stamp_versions(session, BookingTable, rows)
+                ids = list(
+                    await session.scalars(_insert_returning_ids(BookingTable), rows)
+                )
+                await session.commit()
+                for booking, booking_id in zip(accepted, ids):
+                    booking.id = booking_id
+        return conflicts
+
+    @staticmethod
+    async def _find_overlap(
+        session: AsyncSession, room_id: int, check_in: date, check_out: date
+    ) -> tuple[date, date] | None:
+        result = await session.execute(_overlap_stmt(room_id, check_out))
+        return _clash(result, check_in)
+
+    async def list_bookings(
+        self,
+        limit: int | None = None,
+        after: int | None = None,
+        include_archived: bool = False,
+    ) -> list[Booking]:
+        stmt = _keyset(_BOOKINGS, BookingTable.id, limit, after)
+        if not include_archived:
+            return await self._list(stmt, Booking)
+        archived = _keyset(_ARCHIVED_BOOKINGS, BookingArchiveTable.id, limit, after)
+        pages = (await self._list(stmt, Booking), await self._list(archived, Booking))
+        return list(islice(heapq.merge(*pages, key=_booking_id), limit))
+
+    def iter_bookings(
+        self, after: int | None = None, include_archived: bool = False
+    ) -> AsyncIterator[Booking]:
+        stmt = _keyset(_BOOKINGS, BookingTable.id, None, after)
+        if not include_archived:
+            return self._iter(stmt, Booking)
+        archived = _keyset(_ARCHIVED_BOOKINGS, BookingArchiveTable.id, None, after)
+        return _merge_by_id(self._iter(stmt, Booking), self._iter(archived, Booking))
+
+    async def bookings_version(self) -> int:
+        return await self._version("bookings")
+
+    async def bookings_since(
+        self, since: int, limit: int | None = None
+    ) -> tuple[list[Booking], int]:
+        return await self._changes(_BOOKINGS, BookingTable, Booking, since, limit)
+
+
+async def _merge_by_id(
+    first: AsyncIterator[Booking], second: AsyncIterator[Booking]
+) -> AsyncIterator[Booking]:
+    """Merge two id-ordered streams of bookings into one."""
+    left, right = await anext(first, None), await anext(second, None)
+    while left is not None and right is not None:
+        if left.id < right.id:
+            yield left
+            left = await anext(first, None)
+        else:
+            yield right
+            right = await anext(second, None)
+    rest, head = (first, left) if left is not None else (second, right)
+    if head is not None:
+        yield head
+        async for booking in rest:
+            yield booking
@@ -0,0 +1,273 @@
+"""Night bitmaps answering which rooms are free for a stay.
+
+:class:`AvailabilityIndex` keeps one bit per room and night for the
+``AVAILABILITY_DAYS`` nights starting today, eight nights to a byte, in a
+NumPy matrix with one row per room id. A search ANDs the bytes covering the
+stay's nights with a mask and keeps the rooms whose bits are all clear, so
+it reads a byte or two per room however many bookings there are.
+
+Every search first catches up with the writes made since the previous one,
+by any worker, through the change versions of the tables: the rows of the
+rooms with newly written bookings are recomputed from their stored stays,
+along with the rooms those bookings were last seen in, and new or changed
+rooms and properties are updated in place. The first search of a day
+rebuilds the index for the new window.
+"""
+
+from __future__ import annotations
+
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import Select, select
+from sqlalchemy.orm import Session
+
+from ..config import AVAILABILITY_DAYS
+from .analytics import _changed, _fetch, epoch_day
+from .repository import (
+    STAY_ROOMS_PER_QUERY,
+    _SqlRepository,
+    _version_stmt,
+)
+from .sql.models import BookingArchiveTable, BookingTable, PropertyTable, RoomTable
+
+_EPOCH = date(1970, 1, 1)
+
+_ROOM_ATTRIBUTES = select(RoomTable.id, RoomTable.property_id, RoomTable.beds)
+_PROPERTY_LOCATIONS = select(PropertyTable.id, PropertyTable.location)
+
+
+def _window_stays_stmt(table, start: date, end: date) -> Select:
+    """Select the stays of ``table`` with a night in ``[start, end)``.
+
+    Live stays come with their booking id as a fourth column.
+    """
+    stmt = select(
+        table.room_id, epoch_day(table.check_in), epoch_day(table.check_out)
+    ).where(table.check_out > start, table.check_in < end)
+    if table is BookingTable:
+        stmt = stmt.add_columns(BookingTable.id)
+    return stmt
+
+
+class AvailabilityIndex(_SqlRepository):
+    """Per-room night bitmaps of the next ``days`` nights.
+
+    Rooms and properties are read from the repository's database, stays
+    from ``stay_session_factories``, e.g. the read factories of every
+    booking shard, or from the same database when not given. Searches are
+    serialized by a lock; they are short. The room of every live booking in
+    the window is remembered, so a booking upserted onto another room frees
+    its old room's nights too.
+    """
+
+    def __init__(
+        self,
+        *args,
+        stay_session_factories=None,
+        days: int = AVAILABILITY_DAYS,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        if days < 1:
+            raise ValueError("days must be at least 1")
+        self._stay_sources = list(
+            stay_session_factories or [self._read_session_factory]
+        )
+        self._days = days
+        self._lock = threading.Lock()
+        self._start: int | None = None
+        self._bits = np.zeros((1, -(-days // 8)), np.uint8)
+        # Room attributes by room id; ids without a room hold property -1.
+        self._property = np.full(1, -1, np.int64)
+        self._beds = np.zeros(1, np.int64)
+        # Location codes by property id.
+        self._location = np.full(1, -1, np.int32)
+        self._locations: dict[str, int] = {}
+        self._room_version = self._property_version = 0
+        self._booking_versions = [0] * len(self._stay_sources)
+        # Room of each live booking read into the window, by booking id.
+        self._booking_rooms: dict[int, int] = {}
+
+    def available_rooms(
+        self,
+        check_in: date,
+        check_out: date,
+        beds: int | None = None,
+        location: str | None = None,
+        after: int | None = None,
+        limit: int | None = None,
+        today: date | None = None,
+    ) -> list[int]:
+        """Return the ids of the rooms free every night of the stay.
+
+        Only rooms with at least ``beds`` beds and, if given, of a property
+        in ``location`` are returned; up to ``limit`` of them in id order
+        after ``after``. Raises ``ValueError`` for an empty stay or one that
+        leaves the window of the next ``days`` nights from ``today``.
+        """
+        if check_out <= check_in:
+            raise ValueError("check_out must occur after check_in")
+        with self._lock:
+            self._refresh(today or date.today())
+            first = (check_in - _EPOCH).days - self._start
+            last = (check_out - _EPOCH).days - self._start
+            if first < 0 or last > self._days:
+                start = _EPOCH + timedelta(days=self._start)
+                raise ValueError(
+                    "availability is only known for stays from "
+                    f"{start} to {start + timedelta(days=self._days)}"
+                )
+            low, high = first >> 3, ((last - 1) >> 3) + 1
+            nights = np.zeros((high - low) * 8, bool)
+            nights[first - low * 8 : last - low * 8] = True
+            mask = np.packbits(nights, bitorder="little")
+            skip = 0 if after is None else max(after + 1, 0)
+            rooms = slice(skip, None)
+            free = ~np.bitwise_and(self._bits[rooms, low:high], mask).any(axis=1)
+            free &= self._property[rooms] >= 0
+            if beds is not None:
+                free &= self._beds[rooms] >= beds
+            if location is not None:
+                code = self._locations.get(location)
+                if code is None:
+                    return []
+                free &= self._location[self._property[rooms]] == code
+            ids = np.flatnonzero(free)[:limit] + skip
+        return ids.tolist()
+
+    def _refresh(self, today: date) -> None:
+        start = (today - _EPOCH).days
+        if start != self._start:
+            self._rebuild(start)
+            return
+        with self._read_session_factory() as session:
+            self._property_version = self._catch_up(
+                session, _PROPERTY_LOCATIONS, PropertyTable, self._property_version
+            )
+            self._room_version = self._catch_up(
+                session, _ROOM_ATTRIBUTES, RoomTable, self._room_version
+            )
+        rooms: set[int] = set()
+        for source, session_factory in enumerate(self._stay_sources):
+            with session_factory() as session:
+                current = session.scalar(_version_stmt("bookings")) or 0
+                since = self._booking_versions[source]
+                if current != since:
+                    booked = select(BookingTable.id, BookingTable.room_id)
+                    stmt = _changed(booked, BookingTable, since, current)
+                    for booking_id, room_id in session.execute(stmt):
+                        rooms.add(room_id)
+                        # A booking moved to another room frees its old one.
+                        rooms.add(self._booking_rooms.get(booking_id, room_id))
+                self._booking_versions[source] = current
+        if rooms:
+            self._redo_rooms(sorted(rooms))
+
+    def _catch_up(self, session: Session, stmt: Select, table, since: int) -> int:
+        """Apply the rows of ``table`` changed after ``since``; return the version."""
+        current = session.scalar(_version_stmt(table.__tablename__)) or 0
+        if current != since:
+            rows = _fetch(session, _changed(stmt, table, since, current), table.id)
+            self._apply(table, rows)
+        return current
+
+    def _apply(self, table, rows: list) -> None:
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        ids = np.array(columns[0], np.int64)
+        if table is PropertyTable:
+            codes = self._locations
+            for name in columns[1]:
+                codes.setdefault(name, len(codes))
+            self._location = _grown(self._location, ids.max() + 1, -1)
+            self._location[ids] = [codes[name] for name in columns[1]]
+            return
+        property_ids = np.array(columns[1], np.int64)
+        self._grow(ids.max() + 1)
+        self._property[ids] = property_ids
+        self._beds[ids] = columns[2]
+        self._location = _grown(self._location, property_ids.max() + 1, -1)
+
+    def _rebuild(self, start: int) -> None:
+        width = self._bits.shape[1]
+        self._bits = np.zeros((1, width), np.uint8)
+        self._property = np.full(1, -1, np.int64)
+        self._beds = np.zeros(1, np.int64)
+        self._location = np.full(1, -1, np.int32)
+        self._locations = {}
+        self._booking_rooms = {}
+        self._start = start
+        with self._read_session_factory() as session:
+            self._property_version = session.scalar(_version_stmt("properties")) or 0
+            self._room_version = session.scalar(_version_stmt("rooms")) or 0
+            locations = _fetch(session, _PROPERTY_LOCATIONS, PropertyTable.id)
+            self._apply(PropertyTable, locations)
+            self._apply(RoomTable, _fetch(session, _ROOM_ATTRIBUTES, RoomTable.id))
+        first = _EPOCH + timedelta(days=start)
+        last = first + timedelta(days=self._days)
+        for source, session_factory in enumerate(self._stay_sources):
+            with session_factory() as session:
+                self._booking_versions[source] = (
+                    session.scalar(_version_stmt("bookings")) or 0
+                )
+                for table in (BookingTable, BookingArchiveTable):
+                    stays = _window_stays_stmt(table, first, last)
+                    self._mark(session.connection().execute(stays).all())
+
+    def _redo_rooms(self, room_ids: list[int]) -> None:
+        """Recompute the rows of ``room_ids`` from their stored stays."""
+        self._grow(max(room_ids) + 1)
+        self._bits[room_ids] = 0
+        first = _EPOCH + timedelta(days=self._start)
+        last = first + timedelta(days=self._days)
+        for session_factory in self._stay_sources:
+            with session_factory() as session:
+                conn = session.connection()
+                for i in range(0, len(room_ids), STAY_ROOMS_PER_QUERY):
+                    chunk = room_ids[i : i + STAY_ROOMS_PER_QUERY]
+                    for table in (BookingTable, BookingArchiveTable):
+                        stays = _window_stays_stmt(table, first, last)
+                        stays = stays.where(table.room_id.in_(chunk))
+                        self._mark(conn.execute(stays).all())
+
+    def _mark(self, stays: list) -> None:
+        """Set the bits of the nights of ``stays`` inside the window.
+
+        Remembers the room of the stays that come with a booking id.
+        """
+        if not stays:
+            return
+        columns = list(zip(*stays))
+        if len(columns) > 3:
+            self._booking_rooms.update(zip(columns[3], columns[0]))
+        room, check_in, check_out = (np.array(c, np.int64) for c in columns[:3])
+        begin = np.maximum(check_in - self._start, 0)
+        nights = np.minimum(check_out - self._start, self._days) - begin
+        self._grow(room.max() + 1)
+        # One entry per booked night: its room and its offset in the window.
+        offsets = np.cumsum(nights) - nights
+        night = np.arange(nights.sum()) - np.repeat(offsets - begin, nights)
+        bit = np.left_shift(1, night & 7).astype(np.uint8)
+        np.bitwise_or.at(self._bits, (np.repeat(room, nights), night >> 3), bit)
+
+    def _grow(self, size: int) -> None:
+        """Make room for room ids below ``size``, with some headroom."""
+        if size <= len(self._property):
+            return
+        size = max(size, len(self._property) * 5 // 4)
+        self._property = _grown(self._property, size, -1)
+        self._beds = _grown(self._beds, size, 0)
+        bits = np.zeros((size, self._bits.shape[1]), np.uint8)
+        bits[: len(self._bits)] = self._bits
+        self._bits = bits
+
+
+def _grown(array: np.ndarray, size: int, fill: int) -> np.ndarray:
+    if size <= len(array):
+        return array
+    grown = np.full(size, fill, array.dtype)
+    grown[: len(array)] = array
+    return grown
@@ -0,0 +1,219 @@
+"""Read-through caching in front of :class:`PropertyRepository`.
+
+Entries are keyed by tuples whose leading items name a *scope*, e.g.
+``("properties", version, limit, after)`` or
+``("rooms", property_id, version, limit, after)``. Writes invalidate exactly
+the scopes they affect, so adding a room to one property leaves every other
+property's cached rooms in place. Keys include the change version of what
+they list, looked up at most once per short interval, so a listing written
+to by another worker is served from an older entry for that long at most.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable
+from typing import Any, Protocol
+
+from ..domain import Property, Room
+
+MISSING = object()
+"""Sentinel returned by :meth:`CacheBackend.get` for absent entries."""
+
+
+class CacheBackend(Protocol):
+    """Storage used by :class:`CachedPropertyRepository`.
+
+    The in-process :class:`LRUCache` is the default; a shared store only has
+    to provide these methods.
+    """
+
+    def get(self, key: tuple) -> Any:
+        """Return the value stored for ``key`` or :data:`MISSING`."""
+
+    def set(self, key: tuple, value: Any) -> None:
+        """Store ``value`` for ``key``."""
+
+    def invalidate(self, scope: tuple) -> None:
+        """Drop every entry whose key starts with ``scope``."""
+
+    def stats(self) -> dict[str, int]:
+        """Return counters such as ``hits`` and ``misses``."""
+
+
+class LRUCache:
+    """Thread-safe in-process cache bounded by entry count and age."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0) -> None:
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._entries: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: tuple, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, scope: tuple) -> None:
+        size = len(scope)
+        with self._lock:
+            for key in [k for k in self._entries if k[:size] == scope]:
+                del self._entries[key]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
+
+
+class CachedPropertyRepository:
+    """Serve ``list_properties`` and ``list_rooms`` from a cache.
+
+    Cached lists are shared between callers and must be treated as
+    read-only. The change versions of the listings are remembered for
+    ``version_ttl`` seconds and returned by ``properties_version`` and
+    ``rooms_version`` too, so entity tags match the cached lists. Writes go
+    to the wrapped repository and then invalidate the affected scopes and
+    versions; writes made by other workers show once the remembered version
+    expires. Methods that are not cached, such as the ``iter_*`` streams,
+    are passed through unchanged.
+    """
+
+    def __init__(
+        self,
+        repository,
+        backend: CacheBackend | None = None,
+        version_ttl: float = 1.0,
+    ) -> None:
+        self._repository = repository
+        self._backend = backend if backend is not None else LRUCache()
+        self._version_ttl = version_ttl
+        self._versions: dict[tuple, tuple[float, Any]] = {}
+
+    def __getattr__(self, name: str):
+        return getattr(self._repository, name)
+
+    def _cached(self, key: tuple[Hashable, ...], load):
+        value = self._backend.get(key)
+        if value is MISSING:
+            value = load()
+            self._backend.set(key, value)
+        return value
+
+    def _version(self, scope: tuple, load):
+        """Return the change version of ``scope``, read at most every interval."""
+        now = time.monotonic()
+        entry = self._versions.get(scope)
+        if entry is None or entry[0] <= now:
+            entry = self._versions[scope] = (now + self._version_ttl, load())
+        return entry[1]
+
+    def _invalidate_properties(self) -> None:
+        self._versions.pop(("properties",), None)
+        self._backend.invalidate(("properties",))
+
+    def _invalidate_rooms(self, property_ids: Iterable[int]) -> None:
+        # Listings across all properties included.
+        for property_id in {*property_ids, None}:
+            self._versions.pop(("rooms", property_id), None)
+            self._backend.invalidate(("rooms", property_id))
+
+    def stats(self) -> dict[str, int]:
+        """Return the cache hit/miss counters."""
+        return self._backend.stats()
+
+    def properties_version(self) -> int:
+        return self._version(("properties",), self._repository.properties_version)
+
+    def rooms_version(self, property_id: int | None = None) -> tuple[int, int]:
+        return self._version(
+            ("rooms", property_id),
+            lambda: self._repository.rooms_version(property_id),
+        )
+
+    def list_properties(
+        self, limit: int | None = None, after: int | None = None
+    ) -> list[Property]:
+        return self._cached(
+            ("properties", self.properties_version(), limit, after),
+            lambda: self._repository.list_properties(limit=limit, after=after),
+        )
+
+    def list_rooms(
+        self,
+        property_id: int | None = None,
+        limit: int | None = None,
+        after: int | None = None,
+        features_query: str | None = None,
+    ) -> list[Room]:
+        version = self.rooms_version(property_id)
+        return self._cached(
+            ("rooms", property_id, version, limit, after, features_query),
+            lambda: self._repository.list_rooms(
+                property_id, limit=limit, after=after, features_query=features_query
+            ),
+        )
+
+    def add_property(self, name: str, location: str) -> Property:
+        prop = self._repository.add_property(name=name, location=location)
+        self._invalidate_properties()
+        return prop
+
+    def add_properties(self, props: list[Property]) -> list[Property]:
+        props = self._repository.add_properties(props)
+        self._invalidate_properties()
+        return props
+
+    def upsert_properties(self, props: list[Property]) -> list[Property]:
+        props = self._repository.upsert_properties(props)
+        self._invalidate_properties()
+        return props
+
+    def add_room(
+        self,
+        property_id: int,
+        beds: int = 1,
+        *,
+        features: str | None = None,
+        price: float = 0.0,
+    ) -> Room:
+        room = self._repository.add_room(
+            property_id, beds, features=features, price=price
+        )
+        self._invalidate_rooms([property_id])
+        return room
+
+    def add_rooms(self, rooms: list[Room]) -> list[Room]:
+        rooms = self._repository.add_rooms(rooms)
+        self._invalidate_rooms(r.property_id for r in rooms)
+        return rooms
+
+    def upsert_rooms(self, rooms: list[Room]) -> list[Room]:
+        rooms = self._repository.upsert_rooms(rooms)
+        self._invalidate_rooms(r.property_id for r in rooms)
+        return rooms
@@ -0,0 +1,188 @@
+"""Group commit of bookings.
+
+Every ``add_booking`` transaction ends in its own commit, and on SQLite each
+commit waits for the disk, so concurrent bookings are capped by commits per
+second however many workers accept them. :class:`GroupCommitBookingRepository`
+queues the bookings of concurrent callers instead. One writer thread stores
+everything queued within ``interval_ms`` of the first row, up to
+``batch_size`` rows, with a single :meth:`BookingRepository.add_bookings`
+transaction, and hands every caller its own booking or error.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import TYPE_CHECKING
+
+from ..config import GROUP_COMMIT_BATCH_SIZE, GROUP_COMMIT_INTERVAL_MS
+from ..domain import Booking
+from .repository import BookingRepository
+
+if TYPE_CHECKING:
+    from .async_repository import AsyncBookingRepository
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class GroupCommitBookingRepository:
+    """Batch ``add_booking`` calls of concurrent callers into shared commits.
+
+    Other methods are delegated to the wrapped repository. ``on_flush`` is
+    called with the size of every batch, e.g. to feed a histogram. The writer
+    thread starts with the first booking, so a repository built before the
+    server forks its workers gets one writer per worker.
+    """
+
+    def __init__(
+        self,
+        repository: BookingRepository,
+        interval_ms: float = GROUP_COMMIT_INTERVAL_MS,
+        batch_size: int = GROUP_COMMIT_BATCH_SIZE,
+        on_flush: Callable[[int], None] | None = None,
+    ) -> None:
+        self._repository = repository
+        self._interval = interval_ms / 1000
+        self._batch_size = batch_size
+        self._on_flush = on_flush
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._closed = False
+        self._writer: threading.Thread | None = None
+        # Guards starting the writer, and closing against queueing, so no
+        # booking is queued behind the writer's stop marker.
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        return getattr(self._repository, name)
+
+    def submit(self, booking: Booking) -> Future:
+        """Queue ``booking``; the future resolves to it once it is stored."""
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("group commit writer is closed")
+            if self._writer is None:
+                self._start()
+            self._queue.put((booking, future))
+        return future
+
+    def add_booking(self, booking: Booking) -> Booking:
+        """Persist ``booking`` with the next group commit."""
+        return self.submit(booking).result()
+
+    def close(self) -> None:
+        """Flush the queued bookings and stop the writer."""
+        with self._lock:
+            writer = None if self._closed else self._writer
+            self._closed = True
+            if writer is not None:
+                self._queue.put(_STOP)
+        if writer is not None:
+            writer.join()
+
+    def _start(self) -> None:
+        """Start the writer thread; called holding ``_lock``."""
+        writer = threading.Thread(
+            target=self._run, name="booking-group-commit", daemon=True
+        )
+        writer.start()
+        self._writer = writer
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self._interval
+            while len(batch) < self._batch_size:
+                try:
+                    timeout = max(deadline - time.monotonic(), 0)
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch: list[tuple[Booking, Future]]) -> None:
+        if self._on_flush is not None:
+            self._on_flush(len(batch))
+        error = self._store(batch)
+        # One bad row must not fail its neighbours: store the halves of a
+        # failed batch apart and keep halving the failing one until the bad
+        # row is alone. A fault that fails both halves is not one row's,
+        # e.g. a lost connection, and fails all their callers, so a batch
+        # costs at most 1 + 2 * log2(len(batch)) transactions.
+        while error is not None and len(batch) > 1:
+            middle = len(batch) // 2
+            halves = batch[:middle], batch[middle:]
+            errors = [self._store(half) for half in halves]
+            failed = [index for index, exc in enumerate(errors) if exc is not None]
+            if len(failed) == 2:
+                for half, exc in zip(halves, errors):
+                    _fail(half, exc)
+                return
+            if not failed:
+                return
+            batch, error = halves[failed[0]], errors[failed[0]]
+        if error is not None:
+            _fail(batch, error)
+
+    def _store(self, batch: list[tuple[Booking, Future]]) -> Exception | None:
+        """Store ``batch`` in one transaction and resolve its futures.
+
+        A failed transaction leaves the futures pending and returns its error.
+        """
+        bookings = [booking for booking, _ in batch]
+        try:
+            conflicts = self._repository.add_bookings(bookings)
+        except Exception as exc:
+            logger.warning(
+                "group commit of %d bookings failed", len(batch), exc_info=True
+            )
+            return exc
+        for index, (booking, future) in enumerate(batch):
+            if index in conflicts:
+                future.set_exception(conflicts[index])
+            else:
+                future.set_result(booking)
+        return None
+
+
+def _fail(batch: list[tuple[Booking, Future]], error: Exception) -> None:
+    for _, future in batch:
+        future.set_exception(error)
+
+
+class AsyncGroupCommitBookingRepository:
+    """Await a :class:`GroupCommitBookingRepository` from asyncio handlers.
+
+    Bookings are written by the blocking writer thread; other methods are
+    delegated to the wrapped asyncio repository.
+    """
+
+    def __init__(
+        self,
+        repository: AsyncBookingRepository,
+        writer: GroupCommitBookingRepository,
+    ) -> None:
+        self._repository = repository
+        self._writer = writer
+
+    def __getattr__(self, name: str):
+        return getattr(self._repository, name)
+
+    async def add_booking(self, booking: Booking) -> Booking:
+        """Persist ``booking`` with the next group commit."""
+        return await asyncio.wrap_future(self._writer.submit(booking))
@@ -0,0 +1,55 @@
+"""Striped in-process locks.
+
+A fixed array of locks is shared by all keys: each key maps to one stripe,
+so work on the same key is serialized while work on other keys only waits
+when it happens to share a stripe. Several keys are locked in stripe order,
+which keeps two holders of overlapping key sets from deadlocking.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections.abc import AsyncIterator, Hashable, Iterable, Iterator
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, contextmanager
+
+from ..config import BOOKING_LOCK_STRIPES
+
+
+class _Stripes:
+    def __init__(self, locks: list) -> None:
+        self._locks = locks
+
+    def _held(self, keys: Iterable[Hashable]) -> list:
+        stripes = sorted({hash(key) % len(self._locks) for key in keys})
+        return [self._locks[stripe] for stripe in stripes]
+
+
+class StripedLock(_Stripes):
+    """Thread locks striped by key."""
+
+    def __init__(self, stripes: int = BOOKING_LOCK_STRIPES) -> None:
+        super().__init__([threading.Lock() for _ in range(stripes)])
+
+    @contextmanager
+    def hold(self, keys: Iterable[Hashable]) -> Iterator[None]:
+        """Hold the locks of every key in ``keys``."""
+        with ExitStack() as stack:
+            for lock in self._held(keys):
+                stack.enter_context(lock)
+            yield
+
+
+class AsyncStripedLock(_Stripes):
+    """:class:`asyncio.Lock` stripes, for use within one event loop."""
+
+    def __init__(self, stripes: int = BOOKING_LOCK_STRIPES) -> None:
+        super().__init__([asyncio.Lock() for _ in range(stripes)])
+
+    @asynccontextmanager
+    async def hold(self, keys: Iterable[Hashable]) -> AsyncIterator[None]:
+        """Hold the locks of every key in ``keys``."""
+        async with AsyncExitStack() as stack:
+            for lock in self._held(keys):
+                await stack.enter_async_context(lock)
+            yield
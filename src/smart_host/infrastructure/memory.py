@@ -0,0 +1,758 @@
+"""Repositories keeping every table in process memory.
+
+A :class:`MemoryStore` holds the rows of one application as domain objects
+in dicts by id, together with the indexes its queries read: the sorted ids
+of every table for keyset pages, the rooms of every property, the
+properties of every location, the words of the room features for features
+queries, the bookings sorted by check-out for archiving and, per room, the
+live and archived stays sorted by check-in for overlap checks. Change
+versions work like the database's, so entity tags, ``since`` listings and
+cache keys behave the same on both backends.
+
+Writes hold the store's lock, which makes every call one transaction;
+reads hold it while they copy their rows out, so callers never share
+objects with the store. Nothing is persisted and every process has its
+own store, which suits tests, demos and single worker deployments.
+"""
+
+from __future__ import annotations
+
+import heapq
+import re
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from copy import copy
+from dataclasses import replace
+from datetime import date
+from itertools import islice
+from operator import attrgetter
+
+from ..config import ARCHIVE_BATCH_SIZE
+from ..domain import Booking, BookingConflictError, Host, Property, Room, RoomRate
+from .repository import STREAM_CHUNK_SIZE, ROOM_SORTS, parse_features_query
+
+_WORD = re.compile(r"[^\W_]+")
+
+_booking_id = attrgetter("id")
+
+
+def _words(text: str | None) -> list[str]:
+    """Return the lowercase words of ``text`` as the features index splits them."""
+    return _WORD.findall(text.lower()) if text else []
+
+
+def _has_phrase(words: list[str], phrase: list[str], prefix: bool) -> bool:
+    """Tell whether ``phrase`` occurs in ``words``, its last word as a prefix."""
+    *head, last = phrase
+    for start in range(len(words) - len(phrase) + 1):
+        end = start + len(head)
+        if words[start:end] == head and (
+            words[end].startswith(last) if prefix else words[end] == last
+        ):
+            return True
+    return False
+
+
+def _conflict(room_id: int, stay: tuple[date, date]) -> BookingConflictError:
+    return BookingConflictError(
+        f"room {room_id} is already booked from {stay[0]} to {stay[1]}"
+    )
+
+
+def _room_moved(room_id: int, property_id: int) -> ValueError:
+    return ValueError(
+        f"room {room_id} belongs to property {property_id} "
+        "and cannot move to another one"
+    )
+
+
+class _Table:
+    """Rows of one table by id, with their sorted ids and change versions.
+
+    ``changes`` maps the ids of a versioned table to the version of their
+    last write and is ordered by it, so the rows changed after a version
+    are found from its end.
+    """
+
+    def __init__(self, versioned: bool = True) -> None:
+        self.rows: dict[int, object] = {}
+        self.ids: list[int] = []
+        self.versioned = versioned
+        self.version = 0
+        self.changes: dict[int, int] = {}
+        self.last_id = 0
+
+    def new_id(self) -> int:
+        self.last_id += 1
+        return self.last_id
+
+    def put(self, row_id: int, row) -> None:
+        """Store ``row`` under ``row_id`` and stamp it with a new version."""
+        if row_id not in self.rows:
+            insort(self.ids, row_id)
+            self.last_id = max(self.last_id, row_id)
+        self.rows[row_id] = row
+        if self.versioned:
+            self.stamp(row_id)
+
+    def stamp(self, row_id: int) -> None:
+        self.version += 1
+        self.changes.pop(row_id, None)
+        self.changes[row_id] = self.version
+
+    def remove(self, row_ids: set[int]) -> None:
+        """Drop the stored rows of ``row_ids``."""
+        for row_id in row_ids:
+            del self.rows[row_id]
+            self.changes.pop(row_id, None)
+        positions = sorted(bisect_left(self.ids, row_id) for row_id in row_ids)
+        # Adjacent ids, such as an archive batch, go as one slice; from the
+        # end, so the positions before it stay valid.
+        while positions:
+            start = positions.pop()
+            stop = start + 1
+            while positions and positions[-1] == start - 1:
+                start = positions.pop()
+            del self.ids[start:stop]
+
+    def page(
+        self,
+        ids: list[int],
+        limit: int | None,
+        after: int | None,
+        keep: set[int] | None = None,
+    ) -> list:
+        """Return copies of up to ``limit`` rows of sorted ``ids`` after ``after``.
+
+        Only ids in ``keep`` are taken when it is given.
+        """
+        start = 0 if after is None else bisect_right(ids, after)
+        selected = (ids[k] for k in range(start, len(ids)))
+        if keep is not None:
+            selected = (i for i in selected if i in keep)
+        return [copy(self.rows[i]) for i in islice(selected, limit)]
+
+    def since(self, since: int, limit: int | None) -> tuple[list, int]:
+        """Return copies of the rows changed after ``since`` and the next version.
+
+        Same contract as the ``*_since`` methods of the SQL repositories.
+        """
+        changed = []
+        for row_id, version in reversed(self.changes.items()):
+            if version <= since:
+                break
+            changed.append((row_id, version))
+        changed.reverse()
+        current = self.version
+        if limit is not None and len(changed) >= limit:
+            changed = changed[:limit]
+            current = changed[-1][1] if changed else since
+        return [copy(self.rows[row_id]) for row_id, _ in changed], current
+
+
+class _RoomStays:
+    """Live and archived stays of one room, sorted by check-in.
+
+    Stays of a room never overlap, so only the latest one starting before
+    a new stay ends can clash with it.
+    """
+
+    __slots__ = ("starts", "stays")
+
+    def __init__(self) -> None:
+        self.starts: list[date] = []
+        self.stays: list[tuple[date, date, int]] = []
+
+    def find_clash(self, check_in: date, check_out: date) -> tuple[date, date] | None:
+        pos = bisect_left(self.starts, check_out) - 1
+        if pos >= 0 and self.stays[pos][1] > check_in:
+            return self.stays[pos][:2]
+        return None
+
+    def add(self, booking: Booking) -> None:
+        stay = (booking.check_in, booking.check_out, booking.id)
+        pos = bisect_left(self.stays, stay)
+        self.starts.insert(pos, booking.check_in)
+        self.stays.insert(pos, stay)
+
+    def remove(self, booking: Booking) -> None:
+        pos = bisect_left(self.stays, (booking.check_in, booking.check_out, booking.id))
+        del self.starts[pos], self.stays[pos]
+
+
+class MemoryStore:
+    """Tables and indexes shared by the memory repositories of one application."""
+
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self.hosts = _Table(versioned=False)
+        self.properties = _Table()
+        self.rooms = _Table()
+        self.bookings = _Table()
+        self.archived = _Table(versioned=False)
+        self.rates: dict[int, list[RoomRate]] = {}
+        self.last_rate_id = 0
+        # Sorted room ids by property id, property ids by location.
+        self.property_rooms: dict[int, list[int]] = defaultdict(list)
+        self.locations: dict[str, set[int]] = defaultdict(set)
+        # Features index: room ids by word and the sorted words for prefixes.
+        self.word_rooms: dict[str, set[int]] = defaultdict(set)
+        self.vocabulary: list[str] = []
+        self.room_words: dict[int, list[str]] = {}
+        # Live bookings as sorted (check_out, id) pairs, stays per room.
+        self.check_outs: list[tuple[date, int]] = []
+        self.stays: dict[int, _RoomStays] = defaultdict(_RoomStays)
+
+    def put_property(self, prop: Property) -> None:
+        old = self.properties.rows.get(prop.id)
+        if old is not None:
+            self.locations[old.location].discard(prop.id)
+        self.locations[prop.location].add(prop.id)
+        self.properties.put(prop.id, copy(prop))
+
+    def put_room(self, room: Room) -> None:
+        old = self.rooms.rows.get(room.id)
+        if old is None or old.property_id != room.property_id:
+            if old is not None:
+                self.property_rooms[old.property_id].remove(room.id)
+            insort(self.property_rooms[room.property_id], room.id)
+        for word in self.room_words.pop(room.id, ()):
+            rooms = self.word_rooms[word]
+            rooms.discard(room.id)
+            if not rooms:
+                del self.word_rooms[word]
+                del self.vocabulary[bisect_left(self.vocabulary, word)]
+        words = self.room_words[room.id] = _words(room.features)
+        for word in words:
+            if word not in self.word_rooms:
+                insort(self.vocabulary, word)
+            self.word_rooms[word].add(room.id)
+        self.rooms.put(room.id, copy(room))
+
+    def put_booking(self, booking: Booking) -> None:
+        """Store ``booking`` live, replacing the live booking of its id."""
+        old = self.bookings.rows.get(booking.id)
+        if old is not None:
+            self.stays[old.room_id].remove(old)
+            del self.check_outs[bisect_left(self.check_outs, (old.check_out, old.id))]
+        self.stays[booking.room_id].add(booking)
+        insort(self.check_outs, (booking.check_out, booking.id))
+        self.bookings.put(booking.id, copy(booking))
+
+    def matching_rooms(self, query: str) -> set[int]:
+        """Return the ids of the rooms whose features match ``query``.
+
+        Raises ``ValueError`` for a malformed query, see
+        :func:`~.repository.parse_features_query`.
+        """
+        matches: set[int] = set()
+        for terms in parse_features_query(query):
+            rooms: set[int] | None = None
+            for term, prefix in terms:
+                found = self._term_rooms(_words(term), prefix)
+                rooms = found if rooms is None else rooms & found
+            matches |= rooms
+        return matches
+
+    def _term_rooms(self, phrase: list[str], prefix: bool) -> set[int]:
+        *head, last = phrase
+        if prefix:
+            start = bisect_left(self.vocabulary, last)
+            words = []
+            for word in islice(self.vocabulary, start, None):
+                if not word.startswith(last):
+                    break
+                words.append(word)
+            rooms = set().union(*(self.word_rooms[word] for word in words))
+        else:
+            rooms = set(self.word_rooms.get(last, ()))
+        for word in head:
+            rooms &= self.word_rooms.get(word, set())
+        if head:
+            rooms = {
+                r for r in rooms if _has_phrase(self.room_words[r], phrase, prefix)
+            }
+        return rooms
+
+
+class _MemoryRepository:
+    """Shared store handling of the memory repositories.
+
+    Repositories built on the same ``store`` see each other's writes; each
+    gets a store of its own by default.
+    """
+
+    def __init__(self, store: MemoryStore | None = None) -> None:
+        self._store = store or MemoryStore()
+
+    def _iter(
+        self,
+        table: _Table,
+        ids: Iterable[int] | None = None,
+        after: int | None = None,
+        keep: set[int] | None = None,
+    ) -> Iterator:
+        """Yield copies of the rows of ``table`` in id order, a chunk at a time.
+
+        The sorted ``ids`` default to all of the table's. Rows written while
+        iterating are seen if their id comes later.
+        """
+        while True:
+            with self._store.lock:
+                chunk = table.page(
+                    table.ids if ids is None else ids, STREAM_CHUNK_SIZE, after, keep
+                )
+            yield from chunk
+            if len(chunk) < STREAM_CHUNK_SIZE:
+                return
+            after = chunk[-1].id
+
+
+class MemoryHostRepository(_MemoryRepository):
+    """Host storage in a :class:`MemoryStore`."""
+
+    def add(self, host: Host) -> None:
+        """Store a host and assign its ``id``."""
+        self.add_many([host])
+
+    def add_many(self, hosts: list[Host]) -> list[Host]:
+        """Store ``hosts`` at once and assign their ids."""
+        table = self._store.hosts
+        with self._store.lock:
+            for host in hosts:
+                host.id = table.new_id()
+                table.put(host.id, copy(host))
+        return hosts
+
+    def upsert_many(self, hosts: list[Host]) -> list[Host]:
+        """Store ``hosts`` at once, replacing those with a stored id.
+
+        Hosts without an ``id`` are added and get one assigned.
+        """
+        table = self._store.hosts
+        with self._store.lock:
+            for host in hosts:
+                host.id = host.id or table.new_id()
+                table.put(host.id, copy(host))
+        return hosts
+
+    def list_hosts(
+        self, limit: int | None = None, after: int | None = None
+    ) -> list[Host]:
+        """Return up to ``limit`` hosts with an id greater than ``after``."""
+        table = self._store.hosts
+        with self._store.lock:
+            return table.page(table.ids, limit, after)
+
+    def iter_hosts(self, after: int | None = None) -> Iterator[Host]:
+        """Yield hosts in id order."""
+        return self._iter(self._store.hosts, after=after)
+
+
+class MemoryPropertyRepository(_MemoryRepository):
+    """Property, room and rate storage in a :class:`MemoryStore`."""
+
+    def add_property(self, name: str, location: str) -> Property:
+        prop = Property(id=0, name=name, location=location)
+        self.add_properties([prop])
+        return prop
+
+    def add_properties(self, props: list[Property]) -> list[Property]:
+        """Store ``props`` at once and assign their ids."""
+        with self._store.lock:
+            for prop in props:
+                prop.id = self._store.properties.new_id()
+                self._store.put_property(prop)
+        return props
+
+    def upsert_properties(self, props: list[Property]) -> list[Property]:
+        """Store ``props`` at once, replacing those with a stored id.
+
+        Properties with an ``id`` of ``0`` are added and get one assigned.
+        """
+        with self._store.lock:
+            for prop in props:
+                prop.id = prop.id or self._store.properties.new_id()
+                self._store.put_property(prop)
+        return props
+
+    def list_properties(
+        self, limit: int | None = None, after: int | None = None
+    ) -> list[Property]:
+        table = self._store.properties
+        with self._store.lock:
+            return table.page(table.ids, limit, after)
+
+    def iter_properties(self, after: int | None = None) -> Iterator[Property]:
+        """Yield properties in id order."""
+        return self._iter(self._store.properties, after=after)
+
+    def properties_by_id(self, property_ids: list[int]) -> list[Property]:
+        """Return the stored properties among ``property_ids`` in id order."""
+        rows = self._store.properties.rows
+        with self._store.lock:
+            return [copy(rows[i]) for i in sorted(set(property_ids)) if i in rows]
+
+    def properties_version(self) -> int:
+        """Return the change version of the properties, bumped by every write."""
+        return self._store.properties.version
+
+    def properties_since(
+        self, since: int, limit: int | None = None
+    ) -> tuple[list[Property], int]:
+        """Return up to ``limit`` properties changed after version ``since``.
+
+        They come in the order they changed, followed by the version to pass
+        as ``since`` next.
+        """
+        with self._store.lock:
+            return self._store.properties.since(since, limit)
+
+    def add_room(
+        self,
+        property_id: int,
+        beds: int = 1,
+        *,
+        features: str | None = None,
+        price: float = 0.0,
+    ) -> Room:
+        room = Room(
+            id=0, property_id=property_id, beds=beds, features=features, price=price
+        )
+        self.add_rooms([room])
+        return room
+
+    def add_rooms(self, rooms: list[Room]) -> list[Room]:
+        """Store ``rooms`` at once and assign their ids."""
+        with self._store.lock:
+            for room in rooms:
+                room.id = self._store.rooms.new_id()
+                self._store.put_room(room)
+        return rooms
+
+    def upsert_rooms(self, rooms: list[Room]) -> list[Room]:
+        """Store ``rooms`` at once, replacing those with a stored id.
+
+        Rooms with an ``id`` of ``0`` are added and get one assigned. A
+        stored room keeps its property: moving one raises ``ValueError``
+        and stores none of ``rooms``.
+        """
+        with self._store.lock:
+            for room in rooms:
+                old = self._store.rooms.rows.get(room.id)
+                if old is not None and old.property_id != room.property_id:
+                    raise _room_moved(room.id, old.property_id)
+            for room in rooms:
+                room.id = room.id or self._store.rooms.new_id()
+                self._store.put_room(room)
+        return rooms
+
+    def _room_ids(self, property_id: int | None) -> list[int]:
+        if property_id is None:
+            return self._store.rooms.ids
+        return self._store.property_rooms.get(property_id, [])
+
+    def list_rooms(
+        self,
+        property_id: int | None = None,
+        limit: int | None = None,
+        after: int | None = None,
+        features_query: str | None = None,
+    ) -> list[Room]:
+        with self._store.lock:
+            keep = None
+            if features_query is not None:
+                keep = self._store.matching_rooms(features_query)
+            return self._store.rooms.page(
+                self._room_ids(property_id), limit, after, keep
+            )
+
+    def iter_rooms(
+        self,
+        property_id: int | None = None,
+        after: int | None = None,
+        features_query: str | None = None,
+    ) -> Iterator[Room]:
+        """Yield rooms in id order."""
+        keep = None
+        with self._store.lock:
+            ids = list(self._room_ids(property_id))
+            if features_query is not None:
+                keep = self._store.matching_rooms(features_query)
+        return self._iter(self._store.rooms, ids, after, keep)
+
+    def rooms_by_id(self, room_ids: list[int]) -> list[Room]:
+        """Return the stored rooms among ``room_ids`` in id order."""
+        rows = self._store.rooms.rows
+        with self._store.lock:
+            return [copy(rows[i]) for i in sorted(set(room_ids)) if i in rows]
+
+    def room_prices(self, room_ids: list[int]) -> list[tuple[int, float, int]]:
+        """Return the id, base price and change version of the stored rooms.
+
+        Only rooms among ``room_ids`` that exist are returned, in id order.
+        """
+        table = self._store.rooms
+        with self._store.lock:
+            return [
+                (i, table.rows[i].price, table.changes[i])
+                for i in sorted(set(room_ids))
+                if i in table.rows
+            ]
+
+    def list_rates(self, room_ids: Iterable[int]) -> list[RoomRate]:
+        """Return the rates of ``room_ids`` by room, in the order they were set."""
+        with self._store.lock:
+            return [
+                replace(rate, weekdays=copy(rate.weekdays))
+                for room_id in sorted(set(room_ids))
+                for rate in self._store.rates.get(room_id, ())
+            ]
+
+    def set_rates(self, room_id: int, rates: list[RoomRate]) -> list[RoomRate]:
+        """Replace the rates of room ``room_id`` with ``rates`` and assign ids.
+
+        The room is stamped with a new change version, so whatever is keyed
+        by it, such as a cached price calendar, sees the change. Raises
+        ``ValueError`` for an unknown room.
+        """
+        store = self._store
+        with store.lock:
+            if room_id not in store.rooms.rows:
+                raise ValueError(f"room {room_id} does not exist")
+            stored = []
+            for rate in rates:
+                store.last_rate_id += 1
+                rate.id, rate.room_id = store.last_rate_id, room_id
+                weekdays = None if rate.weekdays is None else sorted(set(rate.weekdays))
+                stored.append(replace(rate, weekdays=weekdays))
+            store.rates[room_id] = stored
+            store.rooms.stamp(room_id)
+        return rates
+
+    def rooms_version(self, property_id: int | None = None) -> tuple[int, int]:
+        """Return a token that changes with every write to the rooms.
+
+        Same contract as :meth:`~.repository.PropertyRepository.rooms_version`.
+        """
+        table = self._store.rooms
+        if property_id is None:
+            return table.version, 0
+        with self._store.lock:
+            ids = self._room_ids(property_id)
+            return max((table.changes[i] for i in ids), default=0), len(ids)
+
+    def rooms_since(
+        self,
+        since: int,
+        property_id: int | None = None,
+        limit: int | None = None,
+    ) -> tuple[list[Room], int]:
+        """Return up to ``limit`` rooms changed after version ``since``.
+
+        Same contract as :meth:`properties_since`.
+        """
+        with self._store.lock:
+            if property_id is None:
+                return self._store.rooms.since(since, limit)
+            rooms, current = self._store.rooms.since(since, None)
+        rooms = [room for room in rooms if room.property_id == property_id]
+        if limit is not None and len(rooms) >= limit:
+            rooms = rooms[:limit]
+            current = self._store.rooms.changes.get(rooms[-1].id, current)
+        return rooms, current
+
+    def search_rooms(
+        self,
+        location: str | None = None,
+        min_beds: int | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        features: Iterable[str] = (),
+        sort: str = "price",
+        limit: int = 50,
+        features_query: str | None = None,
+    ) -> list[Room]:
+        """Return up to ``limit`` rooms across all properties matching the filters.
+
+        Same filters and errors as
+        :meth:`~.repository.PropertyRepository.search_rooms`. The candidates
+        come from the location and features indexes; the others are checked
+        per candidate while the best ``limit`` are kept in a heap.
+        """
+        field = sort.removeprefix("-")
+        if field not in ROOM_SORTS:
+            raise ValueError(f"sort must be one of {', '.join(ROOM_SORTS)}")
+        features = [feature.lower() for feature in features]
+        store = self._store
+        with store.lock:
+            if location is None:
+                candidates: Iterable[int] = store.rooms.ids
+            else:
+                candidates = [
+                    room_id
+                    for prop_id in store.locations.get(location, ())
+                    for room_id in store.property_rooms.get(prop_id, ())
+                ]
+            if features_query is not None:
+                matches = store.matching_rooms(features_query)
+                candidates = [i for i in candidates if i in matches]
+            rooms = (store.rooms.rows[i] for i in candidates)
+            found = (
+                room
+                for room in rooms
+                if (min_beds is None or room.beds >= min_beds)
+                and (min_price is None or room.price >= min_price)
+                and (max_price is None or room.price <= max_price)
+                and all(f in (room.features or "").lower() for f in features)
+            )
+            key = attrgetter(field, "id")
+            best = heapq.nlargest if sort.startswith("-") else heapq.nsmallest
+            return [copy(room) for room in best(limit, found, key=key)]
+
+
+class MemoryBookingRepository(_MemoryRepository):
+    """Booking storage in a :class:`MemoryStore`.
+
+    Every stay is checked against the stays of its room, kept sorted by
+    check-in, so an overlap check is a binary search however many bookings
+    the room has.
+    """
+
+    def add_booking(self, booking: Booking) -> Booking:
+        """Store ``booking`` unless it overlaps an existing stay."""
+        conflicts = self.add_bookings([booking])
+        if conflicts:
+            raise conflicts[0]
+        return booking
+
+    def add_bookings(self, bookings: list[Booking]) -> dict[int, BookingConflictError]:
+        """Store the non-conflicting ``bookings`` at once.
+
+        Each booking is checked against stored stays and against the earlier
+        bookings of the same batch. Stored bookings get their ``id`` assigned;
+        the rejected ones are returned keyed by their position in ``bookings``.
+        """
+        conflicts: dict[int, BookingConflictError] = {}
+        store = self._store
+        with store.lock:
+            for index, booking in enumerate(bookings):
+                clash = store.stays[booking.room_id].find_clash(
+                    booking.check_in, booking.check_out
+                )
+                if clash is not None:
+                    conflicts[index] = _conflict(booking.room_id, clash)
+                    continue
+                booking.id = store.bookings.new_id()
+                store.put_booking(booking)
+        return conflicts
+
+    def upsert_bookings(self, bookings: list[Booking]) -> dict[int, Exception]:
+        """Store ``bookings`` at once, replacing those with a stored id.
+
+        Bookings with an ``id`` of ``0`` are added and get one assigned; the
+        others overwrite the live booking of that id or are stored under it.
+        A replaced booking's own stay does not clash with its new one.
+        Archived and repeated ids are rejected with ``ValueError``. Returns
+        the rejected bookings keyed by their position in ``bookings``.
+        """
+        rejected: dict[int, Exception] = {}
+        keyed: set[int] = set()
+        store = self._store
+        with store.lock:
+            for index, booking in enumerate(bookings):
+                if booking.id in keyed:
+                    rejected[index] = ValueError(f"booking {booking.id} is repeated")
+                    continue
+                if booking.id in store.archived.rows:
+                    rejected[index] = ValueError(f"booking {booking.id} is archived")
+                    continue
+                if booking.id:
+                    keyed.add(booking.id)
+                old = store.bookings.rows.get(booking.id)
+                if old is not None:
+                    store.stays[old.room_id].remove(old)
+                clash = store.stays[booking.room_id].find_clash(
+                    booking.check_in, booking.check_out
+                )
+                if old is not None:
+                    store.stays[old.room_id].add(old)
+                if clash is not None:
+                    rejected[index] = _conflict(booking.room_id, clash)
+                    continue
+                booking.id = booking.id or store.bookings.new_id()
+                store.put_booking(booking)
+        return rejected
+
+    def list_bookings(
+        self,
+        limit: int | None = None,
+        after: int | None = None,
+        include_archived: bool = False,
+    ) -> list[Booking]:
+        """Return up to ``limit`` bookings with an id greater than ``after``.
+
+        Archived bookings are left out unless ``include_archived`` is set.
+        """
+        live, archived = self._store.bookings, self._store.archived
+        with self._store.lock:
+            page = live.page(live.ids, limit, after)
+            if not include_archived:
+                return page
+            pages = (page, archived.page(archived.ids, limit, after))
+        return list(islice(heapq.merge(*pages, key=_booking_id), limit))
+
+    def iter_bookings(
+        self, after: int | None = None, include_archived: bool = False
+    ) -> Iterator[Booking]:
+        """Yield bookings in id order."""
+        live = self._iter(self._store.bookings, after=after)
+        if not include_archived:
+            return live
+        archived = self._iter(self._store.archived, after=after)
+        return heapq.merge(live, archived, key=_booking_id)
+
+    def bookings_version(self) -> int:
+        """Return the change version of the live bookings.
+
+        Every write bumps it, archiving included.
+        """
+        return self._store.bookings.version
+
+    def bookings_since(
+        self, since: int, limit: int | None = None
+    ) -> tuple[list[Booking], int]:
+        """Return up to ``limit`` live bookings changed after version ``since``.
+
+        Same contract as :meth:`MemoryPropertyRepository.properties_since`.
+        """
+        with self._store.lock:
+            return self._store.bookings.since(since, limit)
+
+    def archive(self, before: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+        """Move the bookings that checked out before ``before`` to the archive.
+
+        They are the front of the check-out index, taken ``batch_size`` at a
+        time so bookings never wait long for the lock. Archived stays still
+        block overlapping bookings. Returns the number of bookings archived.
+        """
+        store = self._store
+        archived = 0
+        while True:
+            with store.lock:
+                check_outs = store.check_outs
+                end = bisect_left(
+                    check_outs, (before,), hi=min(batch_size, len(check_outs))
+                )
+                if not end:
+                    return archived
+                moving = {booking_id for _, booking_id in check_outs[:end]}
+                del check_outs[:end]
+                for booking_id in sorted(moving):
+                    store.archived.put(booking_id, store.bookings.rows[booking_id])
+                store.bookings.remove(moving)
+                # Live listings shrink, so their entity tags must change.
+                store.bookings.version += 1
+                archived += end
@@ -2,56 +2,753 @@
 
 from __future__ import annotations
 
+import heapq
+import shlex
+from bisect import bisect_left, insort
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from functools import cached_property
+from datetime import date
+from itertools import islice, starmap
+from operator import attrgetter
+from typing import TYPE_CHECKING
 
-from ..domain import Host, Property, Room, Booking
-from .sql import SessionLocal, init_db
+from sqlalchemy import (
+    CompoundSelect,
+    Insert,
+    Select,
+    Update,
+    and_,
+    bindparam,
+    column,
+    delete,
+    func,
+    insert,
+    literal_column,
+    or_,
+    select,
+    table,
+    text,
+    union_all,
+    update,
+)
+from sqlalchemy.orm import Session
+
+from ..config import ARCHIVE_BATCH_SIZE
+
+from ..domain import Host, Property, Room, RoomRate, Booking, BookingConflictError
+from .locks import StripedLock
+from .sql import ReadSessionLocal, SessionLocal
 from .sql.models import (
     HostTable,
     PropertyTable,
     RoomTable,
+    RoomRateTable,
     BookingTable,
+    BookingArchiveTable,
+    ChangeVersionTable,
 )
 
+if TYPE_CHECKING:
+    from .shards import IdAllocator
 
-class HostRepository:
-    """Host persistence using the database."""
+STREAM_CHUNK_SIZE = 1000
+"""Rows fetched per round trip when streaming from a server-side cursor."""
+
+
+def _keyset(stmt: Select, id_column, limit: int | None, after: int | None) -> Select:
+    """Order ``stmt`` by ``id_column`` and return the page after ``after``."""
+    if after is not None:
+        stmt = stmt.where(id_column > after)
+    stmt = stmt.order_by(id_column)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def _insert_returning_ids(table) -> Insert:
+    """Return a multi-row ``INSERT .. RETURNING id`` statement for ``table``.
+
+    Executed with a list of rows, the ids come back in the order of the rows.
+    """
+    return insert(table).returning(table.id, sort_by_parameter_order=True)
+
+
+def _upsert_stmt(table, dialect: str) -> Insert:
+    """Return an ``INSERT`` of ``table`` that overwrites rows with the same id."""
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        stmt = mysql_insert(table)
+        return stmt.on_duplicate_key_update(
+            {c.name: stmt.inserted[c.name] for c in table.__table__.columns}
+        )
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.id],
+        set_={
+            c.name: stmt.excluded[c.name]
+            for c in table.__table__.columns
+            if c.name != "id"
+        },
+    )
+
+
+def _upsert(session: Session, table, rows: list[dict]) -> None:
+    """Insert ``rows`` with explicit ids, replacing stored rows of those ids."""
+    dialect = session.get_bind().dialect.name
+    session.execute(_upsert_stmt(table, dialect), rows)
+    if dialect == "postgresql":
+        # Explicit ids bypass the sequence; move it past them, never back, as
+        # ids above the highest stored one may have been archived.
+        name = table.__tablename__
+        sequence = f"pg_get_serial_sequence('{name}', 'id')"
+        session.execute(
+            text(
+                f"SELECT setval({sequence}, GREATEST((SELECT max(id) FROM {name}), "
+                f"pg_sequence_last_value({sequence}::regclass)))"
+            )
+        )
+
+
+def _bump_stmt(name: str, count: int) -> Update:
+    return (
+        update(ChangeVersionTable)
+        .where(ChangeVersionTable.name == name)
+        .values(version=ChangeVersionTable.version + count)
+    )
+
+
+def _version_stmt(name: str) -> Select:
+    return select(ChangeVersionTable.version).where(ChangeVersionTable.name == name)
+
+
+def _reserve_versions(session: Session, name: str, count: int = 1) -> int:
+    """Bump the change version of table ``name`` by ``count``; return the first.
+
+    The counter row stays locked until the session commits, so writers of a
+    table commit in version order: a reader seeing version ``v`` also sees
+    every row stamped with ``v`` or less.
+    """
+    stmt = _bump_stmt(name, count)
+    if session.get_bind().dialect.update_returning:
+        last = session.scalar(stmt.returning(ChangeVersionTable.version))
+    else:
+        session.execute(stmt)
+        last = session.scalar(_version_stmt(name))
+    return last - count + 1
+
+
+def _stamp(rows: list[dict], first: int) -> None:
+    """Give ``rows`` consecutive change versions starting at ``first``."""
+    for version, row in enumerate(rows, first):
+        row["version"] = version
+
+
+def _stamp_versions(session: Session, table, rows: list[dict]) -> None:
+    """Stamp ``rows`` about to be written to ``table`` if it is versioned."""
+    if rows and "version" in table.__table__.c:
+        _stamp(rows, _reserve_versions(session, table.__tablename__, len(rows)))
+
+
+def _changes_stmt(stmt: Select, table, since: int, current: int, limit) -> Select:
+    """Select the rows of ``stmt`` changed in versions ``(since, current]``.
+
+    Rows come in version order with their version as an extra last column.
+    """
+    return (
+        stmt.add_columns(table.version)
+        .where(table.version > since, table.version <= current)
+        .order_by(table.version)
+        .limit(limit)
+    )
+
+
+def parse_features_query(query: str) -> list[list[tuple[str, bool]]]:
+    """Parse a features query into alternatives of terms that must all match.
+
+    Terms are separated by spaces and all have to match, unless ``OR``
+    stands between them; ``AND`` may be written out. A term ending in ``*``
+    matches words starting with it and a quoted term matches as a phrase.
+    Each term comes with whether it is such a prefix. Raises ``ValueError``
+    for an empty or malformed query.
+    """
+    groups: list[list[tuple[str, bool]]] = [[]]
+    for word in shlex.split(query):
+        if word == "OR":
+            if not groups[-1]:
+                raise ValueError("OR must stand between two terms")
+            groups.append([])
+        elif word != "AND":
+            term = word.removesuffix("*")
+            if not any(c.isalnum() for c in term):
+                raise ValueError(f"{word!r} is not a search term")
+            groups[-1].append((term, term != word))
+    if not groups[-1]:
+        raise ValueError("features query must end with a term")
+    return groups
+
+
+_ROOMS_FTS = table("rooms_fts", column("rowid"))
+
+
+def _fts_query(groups: list[list[tuple[str, bool]]]) -> str:
+    """Return the FTS5 query of parsed ``groups`` with every term quoted."""
+
+    def quoted(term: str, prefix: bool) -> str:
+        return '"' + term.replace('"', '""') + '"' + ("*" if prefix else "")
+
+    return " OR ".join(
+        "(" + " AND ".join(quoted(*term) for term in terms) + ")"
+        for terms in groups
+    )
+
+
+def _features_clause(query: str, dialect: str, candidates: str = "all"):
+    """Filter rooms on a features query, see :func:`parse_features_query`.
+
+    SQLite answers it from the ``rooms_fts`` full-text index; elsewhere
+    every term is matched as a case-insensitive substring. ``candidates``
+    says how many rooms the other filters leave by index: ``"all"``,
+    ``"many"`` such as a location's or ``"few"`` such as a property's.
+    """
+    groups = parse_features_query(query)
+    if dialect == "sqlite":
+        match = literal_column("rooms_fts").op("MATCH")(_fts_query(groups))
+        matches = select(_ROOMS_FTS.c.rowid).where(match)
+        if candidates == "few":
+            # The index looks up a single room's match cheaply.
+            return matches.where(_ROOMS_FTS.c.rowid == RoomTable.id).exists()
+        if candidates == "many":
+            # Left to itself SQLite walks the matches and seeks every one in
+            # the other filter's index. ``id + 0`` cannot use an index, so
+            # the matches are collected once and probed per candidate room.
+            return (RoomTable.id + 0).in_(matches)
+        return RoomTable.id.in_(matches)
+    features = RoomTable.features
+    return or_(
+        *(
+            and_(*(features.icontains(term, autoescape=True) for term, _ in terms))
+            for terms in groups
+        )
+    )
+
+
+def _dialect_of(session_factory) -> str:
+    """Return the name of the dialect ``session_factory`` connects with."""
+    return session_factory.kw["bind"].dialect.name
+
+
+def _rooms_stmt(
+    property_id: int | None, features_query: str | None = None, dialect: str = ""
+) -> Select:
+    stmt = _ROOMS
+    if property_id is not None:
+        stmt = stmt.where(RoomTable.property_id == property_id)
+    if features_query is not None:
+        candidates = "all" if property_id is None else "few"
+        stmt = stmt.where(_features_clause(features_query, dialect, candidates))
+    return stmt
+
+
+def _rooms_version_stmt(property_id: int) -> Select:
+    return select(func.max(RoomTable.version), func.count()).where(
+        RoomTable.property_id == property_id
+    )
+
+
+ROOM_SORTS = {"id": RoomTable.id, "price": RoomTable.price, "beds": RoomTable.beds}
+"""Sort keys accepted by ``search_rooms``; prefix with ``-`` for descending."""
+
+
+def _search_stmt(
+    location: str | None,
+    min_beds: int | None,
+    min_price: float | None,
+    max_price: float | None,
+    features: Iterable[str],
+    sort: str,
+    limit: int,
+    features_query: str | None = None,
+    dialect: str = "",
+) -> Select:
+    """Select rooms matching every given filter, ordered by ``sort``.
 
-    def __init__(self, session_factory: type[SessionLocal] = SessionLocal) -> None:
-        init_db()
+    Location, beds and price use the search indexes; ``features`` are
+    matched as case-insensitive substrings of the remaining candidates and
+    a ``features_query`` by :func:`_features_clause`.
+    """
+    column = ROOM_SORTS.get(sort.removeprefix("-"))
+    if column is None:
+        raise ValueError(f"sort must be one of {', '.join(ROOM_SORTS)}")
+    stmt = _ROOMS
+    if location is not None:
+        stmt = stmt.join(PropertyTable, PropertyTable.id == RoomTable.property_id)
+        stmt = stmt.where(PropertyTable.location == location)
+    if min_beds is not None:
+        stmt = stmt.where(RoomTable.beds >= min_beds)
+    if min_price is not None:
+        stmt = stmt.where(RoomTable.price >= min_price)
+    if max_price is not None:
+        stmt = stmt.where(RoomTable.price <= max_price)
+    for feature in features:
+        stmt = stmt.where(RoomTable.features.icontains(feature, autoescape=True))
+    if features_query is not None:
+        candidates = "all" if location is None else "many"
+        stmt = stmt.where(_features_clause(features_query, dialect, candidates))
+    # Breaking ties by id in the same direction lets the single-column
+    # indexes, which end in the rowid, serve the whole ORDER BY.
+    if sort.startswith("-"):
+        return stmt.order_by(column.desc(), RoomTable.id.desc()).limit(limit)
+    return stmt.order_by(column, RoomTable.id).limit(limit)
+
+
+def _latest_stay_stmt(table, room_id: int, check_out: date) -> Select:
+    return (
+        select(table.check_in, table.check_out)
+        .where(table.room_id == room_id, table.check_in < check_out)
+        .order_by(table.check_in.desc())
+        .limit(1)
+    )
+
+
+def _overlap_stmt(room_id: int, check_out: date) -> CompoundSelect:
+    """Select the latest stays of ``room_id`` starting before ``check_out``.
+
+    Stays of a room never overlap each other, so the latest live and the
+    latest archived one are the only stays that can clash with a new stay
+    ending at ``check_out``. Each is a single seek on the
+    ``(room_id, check_in, check_out)`` index of its table.
+    """
+    live = _latest_stay_stmt(BookingTable, room_id, check_out).subquery()
+    archived = _latest_stay_stmt(BookingArchiveTable, room_id, check_out).subquery()
+    return union_all(select(live), select(archived))
+
+
+def _room_lock_stmt(room_ids: list[int]) -> Select:
+    """Lock the rows of ``room_ids``, in id order so lockers never deadlock."""
+    return (
+        select(RoomTable.id)
+        .where(RoomTable.id.in_(room_ids))
+        .order_by(RoomTable.id)
+        .with_for_update()
+    )
+
+
+BEGIN_IMMEDIATE = "BEGIN IMMEDIATE"
+"""Starts a SQLite transaction holding the write lock from its first statement.
+
+A deferred transaction would read the stays under a snapshot another
+process may commit past before the insert, and then fail when upgrading
+to a write lock instead of waiting for it.
+"""
+
+
+def _clash(candidates: Iterable, check_in: date) -> tuple[date, date] | None:
+    """Return the first of ``candidates`` ending after ``check_in``, if any."""
+    for candidate in candidates:
+        if candidate.check_out > check_in:
+            return (candidate.check_in, candidate.check_out)
+    return None
+
+
+def _conflict(room_id: int, stay: tuple[date, date]) -> BookingConflictError:
+    return BookingConflictError(
+        f"room {room_id} is already booked from {stay[0]} to {stay[1]}"
+    )
+
+
+def _stays_stmt(table) -> Select:
+    return select(table.room_id, table.check_in, table.check_out).where(
+        table.room_id.in_(bindparam("room_ids", expanding=True)),
+        table.check_in < bindparam("end"),
+        table.check_out > bindparam("start"),
+    )
+
+
+_STORED_STAYS = union_all(_stays_stmt(BookingTable), _stays_stmt(BookingArchiveTable))
+"""Live and archived stays of some rooms overlapping ``[start, end)``."""
+
+_STORED_STAY_IDS = union_all(
+    _stays_stmt(BookingTable).add_columns(BookingTable.id),
+    _stays_stmt(BookingArchiveTable).add_columns(BookingArchiveTable.id),
+)
+"""Like ``_STORED_STAYS`` with the booking id as a fourth column."""
+
+STAY_ROOMS_PER_QUERY = 500
+"""Rooms whose stored stays are fetched per ``_STORED_STAYS`` query."""
+
+
+def _stored_stays_params(bookings: list[Booking]) -> Iterator[dict]:
+    """Yield ``_STORED_STAYS`` parameters covering the stays of ``bookings``."""
+    windows: dict[int, tuple[date, date]] = {}
+    for b in bookings:
+        start, end = windows.get(b.room_id, (b.check_in, b.check_out))
+        windows[b.room_id] = (min(start, b.check_in), max(end, b.check_out))
+    rooms = sorted(windows)
+    for i in range(0, len(rooms), STAY_ROOMS_PER_QUERY):
+        chunk = rooms[i : i + STAY_ROOMS_PER_QUERY]
+        yield {
+            "room_ids": chunk,
+            "start": min(windows[r][0] for r in chunk),
+            "end": max(windows[r][1] for r in chunk),
+        }
+
+
+class _BatchStays:
+    """Stays of a batch's rooms, per room and sorted by check-in.
+
+    Holds the stored stays the batch could clash with and the bookings of
+    the batch accepted so far; none of them overlap each other.
+    """
+
+    def __init__(self) -> None:
+        self._starts: dict[int, list[date]] = defaultdict(list)
+        self._stays: dict[int, list[tuple[date, date]]] = defaultdict(list)
+
+    def find_clash(self, booking: Booking) -> tuple[date, date] | None:
+        stays = self._stays[booking.room_id]
+        pos = bisect_left(self._starts[booking.room_id], booking.check_out) - 1
+        if pos >= 0 and stays[pos][1] > booking.check_in:
+            return stays[pos]
+        return None
+
+    def add_stay(self, room_id: int, check_in: date, check_out: date) -> None:
+        insort(self._starts[room_id], check_in)
+        insort(self._stays[room_id], (check_in, check_out))
+
+    def add(self, booking: Booking) -> None:
+        self.add_stay(booking.room_id, booking.check_in, booking.check_out)
+
+    def remove_stay(self, room_id: int, check_in: date, check_out: date) -> None:
+        pos = bisect_left(self._stays[room_id], (check_in, check_out))
+        del self._stays[room_id][pos]
+        del self._starts[room_id][pos]
+
+
+def _check_room_properties(session: Session, rows: list[dict]) -> None:
+    """Raise ``ValueError`` if a row moves a stored room to another property."""
+    properties = {row["id"]: row["property_id"] for row in rows if row.get("id")}
+    keyed = sorted(properties)
+    for i in range(0, len(keyed), STAY_ROOMS_PER_QUERY):
+        stmt = select(RoomTable.id, RoomTable.property_id).where(
+            RoomTable.id.in_(keyed[i : i + STAY_ROOMS_PER_QUERY])
+        )
+        for room_id, property_id in session.execute(stmt):
+            if properties[room_id] != property_id:
+                raise _room_moved(room_id, property_id)
+
+
+def _room_moved(room_id: int, property_id: int) -> ValueError:
+    return ValueError(
+        f"room {room_id} belongs to property {property_id} "
+        "and cannot move to another one"
+    )
+
+
+def _host_row(host: Host) -> dict:
+    return {"name": host.name, "rating": host.rating}
+
+
+def _property_row(prop: Property) -> dict:
+    return {"name": prop.name, "location": prop.location}
+
+
+def _room_row(room: Room) -> dict:
+    return {
+        "property_id": room.property_id,
+        "beds": room.beds,
+        "features": room.features,
+        "price": room.price,
+    }
+
+
+def _rate_row(room_id: int, rate: RoomRate) -> dict:
+    weekdays = None
+    if rate.weekdays is not None:
+        weekdays = sum(1 << day for day in set(rate.weekdays))
+    return {
+        "room_id": room_id,
+        "price": rate.price,
+        "min_nights": rate.min_nights,
+        "start": rate.start,
+        "end": rate.end,
+        "weekdays": weekdays,
+    }
+
+
+def _rate(row) -> RoomRate:
+    *fields, weekdays = row
+    if weekdays is not None:
+        weekdays = [day for day in range(7) if weekdays >> day & 1]
+    return RoomRate(*fields, weekdays)
+
+
+def _booking_row(booking: Booking) -> dict:
+    return {
+        "room_id": booking.room_id,
+        "guest_name": booking.guest_name,
+        "language": booking.language,
+        "check_in": booking.check_in,
+        "check_out": booking.check_out,
+    }
+
+
+# Columns in the field order of the matching domain dataclass, so result
+# rows hydrate with ``Model(*row)`` without building ORM instances.
+_HOSTS = select(HostTable.name, HostTable.rating, HostTable.id)
+_PROPERTIES = select(PropertyTable.id, PropertyTable.name, PropertyTable.location)
+_ROOMS = select(
+    RoomTable.id,
+    RoomTable.property_id,
+    RoomTable.beds,
+    RoomTable.features,
+    RoomTable.price,
+)
+_RATES = select(
+    RoomRateTable.id,
+    RoomRateTable.room_id,
+    RoomRateTable.price,
+    RoomRateTable.min_nights,
+    RoomRateTable.start,
+    RoomRateTable.end,
+    RoomRateTable.weekdays,
+)
+_BOOKINGS = select(
+    BookingTable.id,
+    BookingTable.room_id,
+    BookingTable.guest_name,
+    BookingTable.language,
+    BookingTable.check_in,
+    BookingTable.check_out,
+)
+_ARCHIVED_BOOKINGS = select(
+    BookingArchiveTable.id,
+    BookingArchiveTable.room_id,
+    BookingArchiveTable.guest_name,
+    BookingArchiveTable.language,
+    BookingArchiveTable.check_in,
+    BookingArchiveTable.check_out,
+)
+
+_booking_id = attrgetter("id")
+
+
+def _archivable_stmt(before: date, after: int, limit: int) -> Select:
+    """Select ``limit`` bookings past id ``after`` that ended before ``before``."""
+    return (
+        select(BookingTable.id, BookingTable.room_id)
+        .where(BookingTable.id > after, BookingTable.check_out < before)
+        .order_by(BookingTable.id)
+        .limit(limit)
+    )
+
+
+class _SqlRepository:
+    """Shared session handling of the SQLAlchemy repositories.
+
+    Writes go through ``session_factory``. Reads use ``read_session_factory``
+    so they never queue behind the single SQLite writer; it defaults to the
+    read engine when the default write factory is used and to
+    ``session_factory`` otherwise. The schema is expected to exist already,
+    see :func:`smart_host.infrastructure.init_db`.
+    """
+
+    def __init__(
+        self,
+        session_factory: type[SessionLocal] = SessionLocal,
+        read_session_factory: type[SessionLocal] | None = None,
+    ) -> None:
+        if read_session_factory is None:
+            read_session_factory = (
+                ReadSessionLocal if session_factory is SessionLocal else session_factory
+            )
         self._session_factory = session_factory
+        self._read_session_factory = read_session_factory
 
-    def add(self, host: Host) -> None:
-        """Persist a host."""
+    @cached_property
+    def _dialect(self) -> str:
+        return _dialect_of(self._read_session_factory)
+
+    def _add_many(self, table, rows: list[dict]) -> list[int]:
+        """Insert ``rows`` in one transaction and return their ids in order."""
+        if not rows:
+            return []
         with self._session_factory() as session:
-            db_host = HostTable(name=host.name, rating=host.rating)
-            session.add(db_host)
+            _stamp_versions(session, table, rows)
+            ids = list(session.scalars(_insert_returning_ids(table), rows))
             session.commit()
+        return ids
 
-    def list_hosts(self) -> list[Host]:
+    def _add_one(self, table, row: dict) -> int:
+        (row_id,) = self._add_many(table, [row])
+        return row_id
+
+    def _upsert_many(
+        self,
+        table,
+        rows: list[dict],
+        check: Callable[[Session, list[dict]], None] | None = None,
+    ) -> list[int]:
+        """Store ``rows`` in one transaction and return their ids in order.
+
+        Rows with an ``id`` replace the stored row of that id or are inserted
+        under it; the others are inserted with new ids. ``check`` is called
+        with the session and the rows before they are written and may raise
+        to store none of them.
+        """
+        new_ids: list[int] = []
         with self._session_factory() as session:
-            hosts = session.query(HostTable).all()
-            return [Host(name=h.name, rating=h.rating) for h in hosts]
+            _stamp_versions(session, table, rows)
+            if check is not None:
+                check(session, rows)
+            keyed = [row for row in rows if row.get("id")]
+            new = [
+                {name: value for name, value in row.items() if name != "id"}
+                for row in rows
+                if not row.get("id")
+            ]
+            if keyed:
+                _upsert(session, table, keyed)
+            if new:
+                new_ids = session.scalars(_insert_returning_ids(table), new).all()
+            session.commit()
+        assigned = iter(new_ids)
+        return [row.get("id") or next(assigned) for row in rows]
 
+    def _list(self, stmt: Select, model: type) -> list:
+        with self._read_session_factory() as session:
+            return list(starmap(model, session.execute(stmt)))
 
-class PropertyRepository:
-    """Property and room storage using SQLAlchemy."""
+    def _iter(self, stmt: Select, model: type) -> Iterator:
+        """Yield ``model`` instances from a server-side cursor."""
+        stmt = stmt.execution_options(yield_per=STREAM_CHUNK_SIZE)
+        with self._read_session_factory() as session:
+            # Core execution skips the ORM result wrapping of every chunk.
+            yield from starmap(model, session.connection().execute(stmt))
 
-    def __init__(self, session_factory: type[SessionLocal] = SessionLocal) -> None:
-        init_db()
-        self._session_factory = session_factory
+    def _version(self, name: str) -> int:
+        with self._read_session_factory() as session:
+            return session.scalar(_version_stmt(name)) or 0
+
+    def _changes(
+        self, stmt: Select, table, model: type, since: int, limit: int | None
+    ) -> tuple[list, int]:
+        """Return ``model`` rows of ``stmt`` changed after version ``since``.
+
+        Also returns the version to pass as ``since`` next: the current one,
+        or that of the last row when ``limit`` cut the changes short. Rows
+        up to the current version read first are all committed, so none is
+        skipped by a later call.
+        """
+        with self._read_session_factory() as session:
+            current = session.scalar(_version_stmt(table.__tablename__)) or 0
+            rows = session.execute(
+                _changes_stmt(stmt, table, since, current, limit)
+            ).all()
+        if limit is not None and len(rows) == limit:
+            current = rows[-1][-1]
+        return [model(*row[:-1]) for row in rows], current
+
+
+class HostRepository(_SqlRepository):
+    """Host persistence using the database."""
+
+    def add(self, host: Host) -> None:
+        """Persist a host and assign its ``id``."""
+        host.id = self._add_one(HostTable, _host_row(host))
+
+    def add_many(self, hosts: list[Host]) -> list[Host]:
+        """Persist ``hosts`` in one transaction and assign their ids."""
+        ids = self._add_many(HostTable, [_host_row(h) for h in hosts])
+        for host, host_id in zip(hosts, ids):
+            host.id = host_id
+        return hosts
+
+    def upsert_many(self, hosts: list[Host]) -> list[Host]:
+        """Store ``hosts`` in one transaction, replacing those with a stored id.
+
+        Hosts without an ``id`` are added and get one assigned.
+        """
+        rows = [{"id": h.id, **_host_row(h)} for h in hosts]
+        for host, host_id in zip(hosts, self._upsert_many(HostTable, rows)):
+            host.id = host_id
+        return hosts
+
+    def list_hosts(
+        self, limit: int | None = None, after: int | None = None
+    ) -> list[Host]:
+        """Return up to ``limit`` hosts with an id greater than ``after``."""
+        stmt = _keyset(_HOSTS, HostTable.id, limit, after)
+        return self._list(stmt, Host)
+
+    def iter_hosts(self, after: int | None = None) -> Iterator[Host]:
+        """Yield hosts in id order from a server-side cursor."""
+        stmt = _keyset(_HOSTS, HostTable.id, None, after)
+        return self._iter(stmt, Host)
+
+
+class PropertyRepository(_SqlRepository):
+    """Property and room storage using SQLAlchemy."""
 
     def add_property(self, name: str, location: str) -> Property:
-        with self._session_factory() as session:
-            prop = PropertyTable(name=name, location=location)
-            session.add(prop)
-            session.commit()
-            session.refresh(prop)
-            return Property(id=prop.id, name=prop.name, location=prop.location)
+        prop = Property(id=0, name=name, location=location)
+        prop.id = self._add_one(PropertyTable, _property_row(prop))
+        return prop
 
-    def list_properties(self) -> list[Property]:
-        with self._session_factory() as session:
-            props = session.query(PropertyTable).all()
-            return [Property(id=p.id, name=p.name, location=p.location) for p in props]
+    def add_properties(self, props: list[Property]) -> list[Property]:
+        """Persist ``props`` in one transaction and assign their ids."""
+        ids = self._add_many(PropertyTable, [_property_row(p) for p in props])
+        for prop, prop_id in zip(props, ids):
+            prop.id = prop_id
+        return props
+
+    def upsert_properties(self, props: list[Property]) -> list[Property]:
+        """Store ``props`` in one transaction, replacing those with a stored id.
+
+        Properties with an ``id`` of ``0`` are added and get one assigned.
+        """
+        rows = [{"id": p.id, **_property_row(p)} for p in props]
+        for prop, prop_id in zip(props, self._upsert_many(PropertyTable, rows)):
+            prop.id = prop_id
+        return props
+
+    def list_properties(
+        self, limit: int | None = None, after: int | None = None
+    ) -> list[Property]:
+        stmt = _keyset(_PROPERTIES, PropertyTable.id, limit, after)
+        return self._list(stmt, Property)
+
+    def iter_properties(self, after: int | None = None) -> Iterator[Property]:
+        """Yield properties in id order from a server-side cursor."""
+        stmt = _keyset(_PROPERTIES, PropertyTable.id, None, after)
+        return self._iter(stmt, Property)
+
+    def properties_by_id(self, property_ids: list[int]) -> list[Property]:
+        """Return the stored properties among ``property_ids`` in id order."""
+        stmt = _PROPERTIES.where(PropertyTable.id.in_(property_ids)).order_by(
+            PropertyTable.id
+        )
+        return self._list(stmt, Property)
+
+    def properties_version(self) -> int:
+        """Return the change version of the properties, bumped by every write."""
+        return self._version("properties")
+
+    def properties_since(
+        self, since: int, limit: int | None = None
+    ) -> tuple[list[Property], int]:
+        """Return up to ``limit`` properties changed after version ``since``.
+
+        They come in the order they changed, followed by the version to pass
+        as ``since`` next.
+        """
+        return self._changes(_PROPERTIES, PropertyTable, Property, since, limit)
 
     def add_room(
         self,
@@ -61,75 +758,431 @@ class PropertyRepository:
         features: str | None = None,
         price: float = 0.0,
     ) -> Room:
+        room = Room(
+            id=0, property_id=property_id, beds=beds, features=features, price=price
+        )
+        room.id = self._add_one(RoomTable, _room_row(room))
+        return room
+
+    def add_rooms(self, rooms: list[Room]) -> list[Room]:
+        """Persist ``rooms`` in one transaction and assign their ids."""
+        ids = self._add_many(RoomTable, [_room_row(r) for r in rooms])
+        for room, room_id in zip(rooms, ids):
+            room.id = room_id
+        return rooms
+
+    def upsert_rooms(self, rooms: list[Room]) -> list[Room]:
+        """Store ``rooms`` in one transaction, replacing those with a stored id.
+
+        Rooms with an ``id`` of ``0`` are added and get one assigned. A
+        stored room keeps its property, which picks the shard of its
+        bookings: moving one raises ``ValueError`` and stores none of
+        ``rooms``.
+        """
+        rows = [{"id": r.id, **_room_row(r)} for r in rooms]
+        ids = self._upsert_many(RoomTable, rows, _check_room_properties)
+        for room, room_id in zip(rooms, ids):
+            room.id = room_id
+        return rooms
+
+    def list_rooms(
+        self,
+        property_id: int | None = None,
+        limit: int | None = None,
+        after: int | None = None,
+        features_query: str | None = None,
+    ) -> list[Room]:
+        stmt = _rooms_stmt(property_id, features_query, self._dialect)
+        return self._list(_keyset(stmt, RoomTable.id, limit, after), Room)
+
+    def iter_rooms(
+        self,
+        property_id: int | None = None,
+        after: int | None = None,
+        features_query: str | None = None,
+    ) -> Iterator[Room]:
+        """Yield rooms in id order from a server-side cursor."""
+        stmt = _rooms_stmt(property_id, features_query, self._dialect)
+        return self._iter(_keyset(stmt, RoomTable.id, None, after), Room)
+
+    def rooms_by_id(self, room_ids: list[int]) -> list[Room]:
+        """Return the stored rooms among ``room_ids`` in id order."""
+        stmt = _ROOMS.where(RoomTable.id.in_(room_ids)).order_by(RoomTable.id)
+        return self._list(stmt, Room)
+
+    def room_prices(self, room_ids: list[int]) -> list[tuple[int, float, int]]:
+        """Return the id, base price and change version of the stored rooms.
+
+        Only rooms among ``room_ids`` that exist are returned, in id order.
+        """
+        stmt = (
+            select(RoomTable.id, RoomTable.price, RoomTable.version)
+            .where(RoomTable.id.in_(room_ids))
+            .order_by(RoomTable.id)
+        )
+        with self._read_session_factory() as session:
+            return [tuple(row) for row in session.execute(stmt)]
+
+    def list_rates(self, room_ids: Iterable[int]) -> list[RoomRate]:
+        """Return the rates of ``room_ids`` by room, in the order they were set."""
+        stmt = _RATES.where(RoomRateTable.room_id.in_(list(room_ids))).order_by(
+            RoomRateTable.room_id, RoomRateTable.id
+        )
+        with self._read_session_factory() as session:
+            return [_rate(row) for row in session.execute(stmt)]
+
+    def set_rates(self, room_id: int, rates: list[RoomRate]) -> list[RoomRate]:
+        """Replace the rates of room ``room_id`` with ``rates`` and assign ids.
+
+        The room is stamped with a new change version in the same
+        transaction, so whatever is keyed by it, such as a cached price
+        calendar, sees the change. Raises ``ValueError`` for an unknown room.
+        """
+        rows = [_rate_row(room_id, rate) for rate in rates]
         with self._session_factory() as session:
-            room = RoomTable(
-                property_id=property_id,
-                beds=beds,
-                features=features,
-                price=price,
+            version = _reserve_versions(session, "rooms")
+            stamped = session.execute(
+                update(RoomTable)
+                .where(RoomTable.id == room_id)
+                .values(version=version)
+            ).rowcount
+            if not stamped:
+                raise ValueError(f"room {room_id} does not exist")
+            session.execute(
+                delete(RoomRateTable).where(RoomRateTable.room_id == room_id)
             )
-            session.add(room)
+            ids = []
+            if rows:
+                ids = session.scalars(_insert_returning_ids(RoomRateTable), rows).all()
             session.commit()
-            session.refresh(room)
-            return Room(
-                id=room.id,
-                property_id=room.property_id,
-                beds=room.beds,
-                features=room.features,
-                price=room.price,
-            )
+        for rate, rate_id in zip(rates, ids):
+            rate.id, rate.room_id = rate_id, room_id
+        return rates
 
-    def list_rooms(self, property_id: int | None = None) -> list[Room]:
-        with self._session_factory() as session:
-            query = session.query(RoomTable)
-            if property_id is not None:
-                query = query.filter_by(property_id=property_id)
-            rooms = query.all()
-            return [
-                Room(
-                    id=r.id,
-                    property_id=r.property_id,
-                    beds=r.beds,
-                    features=r.features,
-                    price=r.price,
-                )
-                for r in rooms
-            ]
+    def rooms_version(self, property_id: int | None = None) -> tuple[int, int]:
+        """Return a token that changes with every write to the rooms.
 
+        For a ``property_id`` it is the highest change version of its rooms
+        and their number, so adding or changing one of its rooms changes it
+        while writes to other properties' rooms do not.
+        Otherwise it is the change version of the whole table and ``0``.
+        """
+        if property_id is None:
+            return self._version("rooms"), 0
+        with self._read_session_factory() as session:
+            highest, count = session.execute(_rooms_version_stmt(property_id)).one()
+        return highest or 0, count
 
-class BookingRepository:
-    """Booking persistence using SQLAlchemy."""
+    def rooms_since(
+        self,
+        since: int,
+        property_id: int | None = None,
+        limit: int | None = None,
+    ) -> tuple[list[Room], int]:
+        """Return up to ``limit`` rooms changed after version ``since``.
 
-    def __init__(self, session_factory: type[SessionLocal] = SessionLocal) -> None:
-        init_db()
-        self._session_factory = session_factory
+        Same contract as :meth:`properties_since`.
+        """
+        return self._changes(_rooms_stmt(property_id), RoomTable, Room, since, limit)
+
+    def search_rooms(
+        self,
+        location: str | None = None,
+        min_beds: int | None = None,
+        min_price: float | None = None,
+        max_price: float | None = None,
+        features: Iterable[str] = (),
+        sort: str = "price",
+        limit: int = 50,
+        features_query: str | None = None,
+    ) -> list[Room]:
+        """Return up to ``limit`` rooms across all properties matching the filters.
+
+        ``features_query`` is a full-text query over the room features, see
+        :func:`parse_features_query`. Raises ``ValueError`` for a ``sort`` key
+        not in :data:`ROOM_SORTS` or a malformed ``features_query``.
+        """
+        stmt = _search_stmt(
+            location,
+            min_beds,
+            min_price,
+            max_price,
+            features,
+            sort,
+            limit,
+            features_query,
+            self._dialect,
+        )
+        return self._list(stmt, Room)
+
+
+class BookingRepository(_SqlRepository):
+    """Booking persistence using SQLAlchemy.
+
+    Bookings of the same room are serialized twice: by a striped lock within
+    the process, and by the database across processes, with ``BEGIN
+    IMMEDIATE`` on SQLite and row locks on the booked rooms elsewhere.
+    Bookings of other rooms only wait where the database itself serializes
+    writers, as SQLite does. With an ``id_allocator`` booking ids are taken
+    from it instead of the table's own sequence, which keeps them unique
+    across the shards of :class:`~.shards.ShardedBookingRepository`.
+    """
+
+    def __init__(
+        self,
+        *args,
+        room_locks: StripedLock | None = None,
+        id_allocator: IdAllocator | None = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self._room_locks = room_locks or StripedLock()
+        self._id_allocator = id_allocator
+
+    @contextmanager
+    def room_transaction(self, room_ids: Iterable[int]) -> Iterator[Session]:
+        """Yield a write session holding the booking locks of ``room_ids``.
+
+        Checks made in the session stay valid until it commits.
+        """
+        room_ids = sorted(set(room_ids))
+        with self._room_locks.hold(room_ids), self._session_factory() as session:
+            if session.get_bind().dialect.name == "sqlite":
+                session.connection().exec_driver_sql(BEGIN_IMMEDIATE)
+            else:
+                session.execute(_room_lock_stmt(room_ids))
+            yield session
 
     def add_booking(self, booking: Booking) -> Booking:
-        with self._session_factory() as session:
-            db_booking = BookingTable(
-                room_id=booking.room_id,
-                guest_name=booking.guest_name,
-                language=booking.language,
-                check_in=booking.check_in,
-                check_out=booking.check_out,
+        """Persist ``booking`` unless it overlaps an existing stay.
+
+        The overlap check and the insert share one room transaction.
+        """
+        ids = self._take_ids(1)
+        with self.room_transaction([booking.room_id]) as session:
+            clash = self._find_overlap(
+                session, booking.room_id, booking.check_in, booking.check_out
+            )
+            if clash is not None:
+                raise _conflict(booking.room_id, clash)
+            rows = self._rows([booking], ids)
+            _stamp_versions(session, BookingTable, rows)
+            booking.id = session.scalar(
+                _insert_returning_ids(BookingTable).values(rows[0])
             )
-            session.add(db_booking)
             session.commit()
-            session.refresh(db_booking)
-            booking.id = db_booking.id
-            return booking
+        return booking
 
-    def list_bookings(self) -> list[Booking]:
-        with self._session_factory() as session:
-            bookings = session.query(BookingTable).all()
-            return [
-                Booking(
-                    id=b.id,
-                    room_id=b.room_id,
-                    guest_name=b.guest_name,
-                    language=b.language,
-                    check_in=b.check_in,
-                    check_out=b.check_out,
+    def add_bookings(self, bookings: list[Booking]) -> dict[int, BookingConflictError]:
+        """Persist the non-conflicting ``bookings`` in one transaction.
+
+        Each booking is checked against stored stays and against the earlier
+        bookings of the same batch. Stored bookings get their ``id`` assigned;
+        the rejected ones are returned keyed by their position in ``bookings``.
+        The stored stays of the batch's rooms are read up front, a few hundred
+        rooms per query, rather than with one query per booking.
+        """
+        conflicts: dict[int, BookingConflictError] = {}
+        accepted: list[Booking] = []
+        batch = _BatchStays()
+        ids = self._take_ids(len(bookings))
+        with self.room_transaction(b.room_id for b in bookings) as session:
+            for params in _stored_stays_params(bookings):
+                for stay in session.execute(_STORED_STAYS, params):
+                    batch.add_stay(*stay)
+            for index, booking in enumerate(bookings):
+                clash = batch.find_clash(booking)
+                if clash is not None:
+                    conflicts[index] = _conflict(booking.room_id, clash)
+                    continue
+                batch.add(booking)
+                accepted.append(booking)
+            if accepted:
+                rows = self._rows(accepted, ids)
+                _stamp_versions(session, BookingTable, rows)
+                ids = list(session.scalars(_insert_returning_ids(BookingTable), rows))
+                session.commit()
+                for booking, booking_id in zip(accepted, ids):
+                    booking.id = booking_id
+        return conflicts
+
+    def upsert_bookings(self, bookings: list[Booking]) -> dict[int, Exception]:
+        """Store ``bookings`` in one transaction, replacing those with a stored id.
+
+        Bookings with an ``id`` of ``0`` are added and get one assigned; the
+        others overwrite the live booking of that id or are stored under it.
+        Stays are checked like in :meth:`add_bookings`, in order; a replaced
+        booking's stored stay only makes way for its new one once that is
+        accepted. Archived and repeated ids are
+        rejected with ``ValueError``. Returns the rejected bookings keyed by
+        their position in ``bookings``.
+        """
+        rejected: dict[int, Exception] = {}
+        keyed: set[int] = set()
+        for index, booking in enumerate(bookings):
+            if booking.id in keyed:
+                rejected[index] = ValueError(f"booking {booking.id} is repeated")
+            elif booking.id:
+                keyed.add(booking.id)
+        if keyed and self._id_allocator is not None:
+            self._id_allocator.reserve_above(max(keyed))
+        reserved = self._take_ids(sum(1 for b in bookings if not b.id))
+        accepted: list[Booking] = []
+        batch = _BatchStays()
+        with self.room_transaction(b.room_id for b in bookings) as session:
+            archived = set(
+                session.scalars(
+                    select(BookingArchiveTable.id).where(
+                        BookingArchiveTable.id.in_(keyed)
+                    )
                 )
-                for b in bookings
-            ]
+            )
+            replaced = keyed - archived
+            stored: dict[int, tuple[int, date, date]] = {}
+            for params in _stored_stays_params(bookings):
+                for room_id, check_in, check_out, booking_id in session.execute(
+                    _STORED_STAY_IDS, params
+                ):
+                    batch.add_stay(room_id, check_in, check_out)
+                    if booking_id in replaced:
+                        stored[booking_id] = (room_id, check_in, check_out)
+            for index, booking in enumerate(bookings):
+                if index in rejected:
+                    continue
+                if booking.id in archived:
+                    rejected[index] = ValueError(f"booking {booking.id} is archived")
+                    continue
+                old = stored.get(booking.id)
+                if old is not None:
+                    batch.remove_stay(*old)
+                clash = batch.find_clash(booking)
+                if clash is not None:
+                    if old is not None:
+                        batch.add_stay(*old)
+                    rejected[index] = _conflict(booking.room_id, clash)
+                    continue
+                batch.add(booking)
+                accepted.append(booking)
+            rows = [{"id": b.id, **_booking_row(b)} for b in accepted if b.id]
+            new = [b for b in accepted if not b.id]
+            new_rows = self._rows(new, reserved)
+            _stamp_versions(session, BookingTable, rows + new_rows)
+            if rows:
+                _upsert(session, BookingTable, rows)
+            ids = []
+            if new:
+                insert_stmt = _insert_returning_ids(BookingTable)
+                ids = session.scalars(insert_stmt, new_rows).all()
+            session.commit()
+        for booking, booking_id in zip(new, ids):
+            booking.id = booking_id
+        return dict(sorted(rejected.items()))
+
+    def _take_ids(self, count: int) -> list[int] | None:
+        """Take ``count`` booking ids from the id allocator, if there is one.
+
+        Called before the room transaction: refilling the allocator writes
+        to the main database, which must not happen while this database's
+        write lock is held, as it may be the same database. Ids left over
+        by rejected bookings are never used.
+        """
+        if self._id_allocator is None or not count:
+            return None
+        return self._id_allocator.take(count)
+
+    @staticmethod
+    def _rows(bookings: list[Booking], ids: list[int] | None = None) -> list[dict]:
+        """Return the rows of ``bookings``, with the leading ``ids`` if given."""
+        rows = [_booking_row(b) for b in bookings]
+        if ids is not None:
+            for row, booking_id in zip(rows, ids):
+                row["id"] = booking_id
+        return rows
+
+    @staticmethod
+    def _find_overlap(
+        session: Session, room_id: int, check_in: date, check_out: date
+    ) -> tuple[date, date] | None:
+        """Return the ``(check_in, check_out)`` of a clashing stay, if any."""
+        return _clash(session.execute(_overlap_stmt(room_id, check_out)), check_in)
+
+    def list_bookings(
+        self,
+        limit: int | None = None,
+        after: int | None = None,
+        include_archived: bool = False,
+    ) -> list[Booking]:
+        """Return up to ``limit`` bookings with an id greater than ``after``.
+
+        Archived bookings are left out unless ``include_archived`` is set.
+        """
+        stmt = _keyset(_BOOKINGS, BookingTable.id, limit, after)
+        if not include_archived:
+            return self._list(stmt, Booking)
+        archived = _keyset(_ARCHIVED_BOOKINGS, BookingArchiveTable.id, limit, after)
+        pages = (self._list(stmt, Booking), self._list(archived, Booking))
+        return list(islice(heapq.merge(*pages, key=_booking_id), limit))
+
+    def iter_bookings(
+        self, after: int | None = None, include_archived: bool = False
+    ) -> Iterator[Booking]:
+        """Yield bookings in id order from a server-side cursor."""
+        stmt = _keyset(_BOOKINGS, BookingTable.id, None, after)
+        if not include_archived:
+            return self._iter(stmt, Booking)
+        archived = _keyset(_ARCHIVED_BOOKINGS, BookingArchiveTable.id, None, after)
+        return heapq.merge(
+            self._iter(stmt, Booking), self._iter(archived, Booking), key=_booking_id
+        )
+
+    def bookings_version(self) -> int:
+        """Return the change version of the live bookings.
+
+        Every write bumps it, archiving included.
+        """
+        return self._version("bookings")
+
+    def bookings_since(
+        self, since: int, limit: int | None = None
+    ) -> tuple[list[Booking], int]:
+        """Return up to ``limit`` live bookings changed after version ``since``.
+
+        Same contract as :meth:`PropertyRepository.properties_since`.
+        Archiving a booking does not change it, so it is not listed again.
+        """
+        return self._changes(_BOOKINGS, BookingTable, Booking, since, limit)
+
+    def archive(self, before: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+        """Move the bookings that checked out before ``before`` to the archive.
+
+        Works through the table in id order, moving at most ``batch_size``
+        bookings per room transaction so bookings never wait long for it.
+        Archived stays still block overlapping bookings. Returns the number
+        of bookings archived.
+        """
+        archived = after = 0
+        while True:
+            with self._read_session_factory() as session:
+                rows = session.execute(
+                    _archivable_stmt(before, after, batch_size)
+                ).all()
+            if not rows:
+                return archived
+            after = rows[-1].id
+            moving = (
+                BookingTable.id.in_([row.id for row in rows]),
+                BookingTable.check_out < before,
+            )
+            with self.room_transaction(row.room_id for row in rows) as session:
+                session.execute(
+                    insert(BookingArchiveTable).from_select(
+                        [column.name for column in _BOOKINGS.selected_columns],
+                        _BOOKINGS.where(*moving),
+                    )
+                )
+                removed = session.execute(delete(BookingTable).where(*moving)).rowcount
+                if removed:
+                    # Live listings shrink, so their entity tags must change.
+                    _reserve_versions(session, "bookings")
+                archived += removed
+                session.commit()
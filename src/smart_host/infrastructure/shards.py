@@ -0,0 +1,484 @@
+"""Booking storage sharded by property.
+
+Hosts, properties and rooms stay in the main database. Bookings are spread
+over the shard databases listed in ``BOOKING_SHARDS``: a booking lives on
+the shard of its room's property, chosen by :func:`jump_hash` so that
+appending a shard only moves the bookings the new shard takes over. Every
+shard is its own SQLite file or server database, so bookings of properties
+on different shards never wait for each other's write lock.
+
+Booking ids come from an :class:`IdAllocator` in the main database and stay
+unique across shards. Changing the shard list calls for a run of
+:func:`rebalance`, see ``python -m smart_host.infrastructure.shards --help``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import logging
+import threading
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import sessionmaker
+
+from ..config import ARCHIVE_BATCH_SIZE, BOOKING_SHARDS, DATABASE_URL
+from ..domain import Booking
+from .locks import StripedLock
+from .repository import (
+    BEGIN_IMMEDIATE,
+    STAY_ROOMS_PER_QUERY,
+    _ARCHIVED_BOOKINGS,
+    _BOOKINGS,
+    BookingRepository,
+    _booking_id,
+    _keyset,
+)
+from .sql import ReadSessionLocal, SessionLocal
+from .sql.engine import create_db_engine, create_engines
+from .sql.migrations import migrate
+from .sql.models import (
+    BookingArchiveTable,
+    BookingTable,
+    IdBlockTable,
+    RoomTable,
+)
+
+logger = logging.getLogger(__name__)
+
+ID_BLOCK_SIZE = 1000
+"""Ids an :class:`IdAllocator` reserves per round trip to the database."""
+
+REBALANCE_BATCH_SIZE = 1000
+"""Bookings read, copied and deleted per step of :func:`rebalance`."""
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Return the bucket in ``range(buckets)`` of ``key``.
+
+    This is the jump consistent hash of Lamping and Veach: going from ``n``
+    to ``n + 1`` buckets moves only the keys the new bucket takes over.
+    """
+    if buckets < 1:
+        raise ValueError("buckets must be at least 1")
+    key &= 0xFFFFFFFFFFFFFFFF
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+class IdAllocator:
+    """Unique ids for the rows of ``table``, reserved a block at a time.
+
+    The next free id is kept in the ``id_blocks`` table of the database
+    behind ``session_factory``. Each process takes ``block_size`` ids per
+    reservation, so ids are unique across processes and shards but only
+    roughly follow insertion order. Reserved ids always lie above the
+    largest id already stored in ``table`` there.
+    """
+
+    def __init__(
+        self,
+        session_factory: type[SessionLocal] = SessionLocal,
+        table=BookingTable,
+        block_size: int = ID_BLOCK_SIZE,
+    ) -> None:
+        self._session_factory = session_factory
+        self._table = table
+        self._block_size = block_size
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+
+    def take(self, count: int) -> list[int]:
+        """Return ``count`` unused ids."""
+        ids: list[int] = []
+        with self._lock:
+            while len(ids) < count:
+                if self._next == self._end:
+                    size = max(self._block_size, count - len(ids))
+                    self._next, self._end = self._reserve(size)
+                taken = min(count - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + taken))
+                self._next += taken
+        return ids
+
+    def reserve_above(self, floor: int) -> None:
+        """Make sure every id handed out from now on is greater than ``floor``."""
+        with self._lock:
+            self._reserve(0, floor)
+            self._next = self._end = 0
+
+    def _reserve(self, size: int, floor: int = 0) -> tuple[int, int]:
+        """Reserve ``size`` ids above ``floor`` and return their range."""
+        name = self._table.__tablename__
+        with self._session_factory() as session:
+            if session.get_bind().dialect.name == "sqlite":
+                session.connection().exec_driver_sql(BEGIN_IMMEDIATE)
+            stored = session.scalar(
+                select(IdBlockTable.next_id)
+                .where(IdBlockTable.name == name)
+                .with_for_update()
+            )
+            highest = session.scalar(select(func.max(self._table.id))) or 0
+            start = max(stored or 1, highest + 1, floor + 1)
+            if stored is None:
+                session.execute(
+                    insert(IdBlockTable).values(name=name, next_id=start + size)
+                )
+            else:
+                session.execute(
+                    update(IdBlockTable)
+                    .where(IdBlockTable.name == name)
+                    .values(next_id=start + size)
+                )
+            session.commit()
+        return start, start + size
+
+
+class ShardRouter:
+    """Map rooms and properties to booking shards.
+
+    Shard ``i`` is the database at ``urls[i]``. Rooms are looked up in the
+    main database through ``catalog_session_factory`` once and then
+    remembered, since ``upsert_rooms`` refuses to move a room to another
+    property. With the default catalog, a shard at ``DATABASE_URL`` shares
+    the main database's engines, so its writers queue on the same single
+    writer connection.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        catalog_session_factory: type[SessionLocal] = ReadSessionLocal,
+    ) -> None:
+        if not urls:
+            raise ValueError("at least one shard URL is required")
+        self.urls = tuple(urls)
+        main = None
+        if catalog_session_factory is ReadSessionLocal:
+            main = (SessionLocal.kw["bind"], ReadSessionLocal.kw["bind"])
+        self._engines = [
+            main if main and url == DATABASE_URL else create_engines(url)
+            for url in self.urls
+        ]
+        self._shared = main
+        self.session_factories = [
+            (sessionmaker(bind=write), sessionmaker(bind=read))
+            for write, read in self._engines
+        ]
+        """``(write, read)`` session factories of each shard."""
+        self._catalog = catalog_session_factory
+        self._room_properties: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def shard_of_property(self, property_id: int) -> int:
+        """Return the index of the shard holding the bookings of ``property_id``."""
+        return jump_hash(property_id, len(self.urls))
+
+    def shards_of_rooms(self, room_ids: Iterable[int]) -> dict[int, int]:
+        """Return the shard of each existing room in ``room_ids``."""
+        room_ids = set(room_ids)
+        missing = sorted(room_ids.difference(self._room_properties))
+        if missing:
+            with self._catalog() as session:
+                for i in range(0, len(missing), STAY_ROOMS_PER_QUERY):
+                    chunk = missing[i : i + STAY_ROOMS_PER_QUERY]
+                    rows = session.execute(
+                        select(RoomTable.id, RoomTable.property_id).where(
+                            RoomTable.id.in_(chunk)
+                        )
+                    )
+                    self._room_properties.update(rows.all())
+        properties = self._room_properties
+        return {
+            room_id: self.shard_of_property(properties[room_id])
+            for room_id in room_ids
+            if room_id in properties
+        }
+
+    def migrate(self) -> None:
+        """Apply pending schema migrations to every shard."""
+        for write_engine, _ in self._engines:
+            migrate(write_engine)
+
+    def dispose(self) -> None:
+        """Close the connections of every shard but the main database."""
+        for engines in self._engines:
+            if engines is self._shared:
+                continue
+            write_engine, read_engine = engines
+            write_engine.dispose()
+            read_engine.dispose()
+
+
+def _unknown_room(room_id: int) -> ValueError:
+    return ValueError(f"room {room_id} does not exist")
+
+
+class ShardedBookingRepository:
+    """Bookings spread over the shards of a :class:`ShardRouter`.
+
+    Offers the interface of :class:`BookingRepository`. Every write goes to
+    the shard owning the booked room and bookings of unknown rooms are
+    rejected with ``ValueError``. A batch is split by shard and each part is
+    stored in its own transaction, all shards at once. ``list_bookings``
+    queries the shards in parallel and merges their pages by id.
+    """
+
+    def __init__(
+        self,
+        router: ShardRouter,
+        id_allocator: IdAllocator | None = None,
+        room_locks: StripedLock | None = None,
+    ) -> None:
+        id_allocator = id_allocator or IdAllocator()
+        room_locks = room_locks or StripedLock()
+        self._router = router
+        self._shards = [
+            BookingRepository(
+                write, read, room_locks=room_locks, id_allocator=id_allocator
+            )
+            for write, read in router.session_factories
+        ]
+        self._executor = ThreadPoolExecutor(
+            max_workers=len(router), thread_name_prefix="booking-shard"
+        )
+
+    def add_booking(self, booking: Booking) -> Booking:
+        """Persist ``booking`` on its shard unless it overlaps a stored stay."""
+        shard = self._router.shards_of_rooms([booking.room_id]).get(booking.room_id)
+        if shard is None:
+            raise _unknown_room(booking.room_id)
+        return self._shards[shard].add_booking(booking)
+
+    def add_bookings(self, bookings: list[Booking]) -> dict[int, Exception]:
+        """Persist the acceptable ``bookings``, one transaction per shard.
+
+        Returns the rejected bookings keyed by position like
+        :meth:`BookingRepository.add_bookings`. Bookings of unknown rooms are
+        rejected with ``ValueError``. When a shard fails, each of its
+        bookings is rejected with that error while other shards commit.
+        """
+        return self._fan_out(BookingRepository.add_bookings, bookings)
+
+    def upsert_bookings(self, bookings: list[Booking]) -> dict[int, Exception]:
+        """Store ``bookings`` like :meth:`BookingRepository.upsert_bookings`.
+
+        Each shard stores its part in its own transaction, as in
+        :meth:`add_bookings`. A booking moved to a room on another shard
+        leaves its old version behind there.
+        """
+        return self._fan_out(BookingRepository.upsert_bookings, bookings)
+
+    def _fan_out(
+        self,
+        method: Callable[[BookingRepository, list[Booking]], dict[int, Exception]],
+        bookings: list[Booking],
+    ) -> dict[int, Exception]:
+        """Call ``method`` with the bookings of every shard, all at once."""
+        shards = self._router.shards_of_rooms(b.room_id for b in bookings)
+        rejected: dict[int, Exception] = {}
+        positions: dict[int, list[int]] = defaultdict(list)
+        for index, booking in enumerate(bookings):
+            shard = shards.get(booking.room_id)
+            if shard is None:
+                rejected[index] = _unknown_room(booking.room_id)
+            else:
+                positions[shard].append(index)
+
+        def store(shard: int) -> dict[int, Exception]:
+            part = [bookings[i] for i in positions[shard]]
+            try:
+                return method(self._shards[shard], part)
+            except Exception as exc:
+                logger.warning("booking shard %d failed", shard, exc_info=True)
+                return dict.fromkeys(range(len(part)), exc)
+
+        for shard, conflicts in zip(positions, self._executor.map(store, positions)):
+            for index, exc in conflicts.items():
+                rejected[positions[shard][index]] = exc
+        return dict(sorted(rejected.items()))
+
+    def list_bookings(
+        self,
+        limit: int | None = None,
+        after: int | None = None,
+        include_archived: bool = False,
+    ) -> list[Booking]:
+        pages = self._executor.map(
+            lambda shard: shard.list_bookings(limit, after, include_archived),
+            self._shards,
+        )
+        return list(islice(heapq.merge(*pages, key=_booking_id), limit))
+
+    def iter_bookings(
+        self, after: int | None = None, include_archived: bool = False
+    ) -> Iterator[Booking]:
+        """Yield bookings in id order, merged from a cursor on every shard."""
+        return heapq.merge(
+            *(shard.iter_bookings(after, include_archived) for shard in self._shards),
+            key=_booking_id,
+        )
+
+    def bookings_version(self) -> int:
+        """Return the sum of the shards' change versions.
+
+        It grows with every write to any shard, which is all an entity tag
+        needs.
+        """
+        return sum(self._executor.map(BookingRepository.bookings_version, self._shards))
+
+    def bookings_since(
+        self, since: int, limit: int | None = None
+    ) -> tuple[list[Booking], int]:
+        """Not supported: every shard counts its own change versions."""
+        raise ValueError("since is not supported with BOOKING_SHARDS")
+
+    def archive(self, before: date, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+        """Archive the stays ending before ``before`` on every shard at once."""
+        return sum(
+            self._executor.map(
+                lambda shard: shard.archive(before, batch_size), self._shards
+            )
+        )
+
+
+def rebalance(
+    sources: Sequence[str],
+    targets: Sequence[str],
+    catalog_url: str | None = None,
+    batch_size: int = REBALANCE_BATCH_SIZE,
+    progress: Callable[[str, int], None] | None = None,
+) -> int:
+    """Move the bookings stored in ``sources`` to their shard in ``targets``.
+
+    ``sources`` are the current shard URLs, or only the main database when
+    bookings are not sharded yet; a database listed on both sides keeps the
+    bookings it still owns. Each batch is copied and committed on its new
+    shard before it is deleted from the old one, and rows already copied
+    are skipped, so an interrupted run can simply be repeated. Writers must
+    be stopped meanwhile. Archived bookings move along into the archive of
+    their new shard. ``progress`` is called with each source URL and the
+    bookings moved so far. Returns the number of bookings moved.
+    """
+    catalog_write, catalog_read = create_engines(catalog_url)
+    migrate(catalog_write)
+    router = ShardRouter(targets, sessionmaker(bind=catalog_read))
+    router.migrate()
+    owned = {url: shard for shard, url in enumerate(router.urls)}
+    moved = highest = 0
+    try:
+        for url in dict.fromkeys(sources):
+            if url in owned:
+                source = router.session_factories[owned[url]][0]
+            else:
+                source = sessionmaker(bind=create_db_engine(url))
+            for table, stmt in (
+                (BookingTable, _BOOKINGS),
+                (BookingArchiveTable, _ARCHIVED_BOOKINGS),
+            ):
+                after = 0
+                while True:
+                    with source() as session:
+                        page = _keyset(stmt, table.id, batch_size, after)
+                        rows = session.execute(page).all()
+                    if not rows:
+                        break
+                    after = rows[-1].id
+                    highest = max(highest, after)
+                    ids = _move_bookings(router, owned.get(url), table, rows, url)
+                    if ids:
+                        with source() as session:
+                            session.execute(delete(table).where(table.id.in_(ids)))
+                            session.commit()
+                    moved += len(ids)
+                    if progress is not None:
+                        progress(url, moved)
+        IdAllocator(sessionmaker(bind=catalog_write)).reserve_above(highest)
+    finally:
+        router.dispose()
+        catalog_write.dispose()
+        catalog_read.dispose()
+    return moved
+
+
+def _move_bookings(
+    router: ShardRouter, owner: int | None, table, rows: list, url: str
+) -> list[int]:
+    """Copy the ``rows`` of ``table`` that shard ``owner`` does not own.
+
+    Each row is copied into ``table`` on its own shard. Returns the ids of
+    the copied rows, which the source may now delete.
+    """
+    shards = router.shards_of_rooms(row.room_id for row in rows)
+    leaving: dict[int, list] = defaultdict(list)
+    for row in rows:
+        shard = shards.get(row.room_id)
+        if shard is None:
+            logger.warning(
+                "booking %d of unknown room %d left in %s", row.id, row.room_id, url
+            )
+        elif shard != owner:
+            leaving[shard].append(row._asdict())
+    for shard, batch in leaving.items():
+        _copy_bookings(router.session_factories[shard][0], table, batch)
+    return [row["id"] for batch in leaving.values() for row in batch]
+
+
+def _copy_bookings(
+    session_factory: type[SessionLocal], table, rows: list[dict]
+) -> None:
+    """Insert the booking ``rows`` that ``table`` of ``session_factory`` lacks."""
+    with session_factory() as session:
+        present = set(
+            session.scalars(
+                select(table.id).where(table.id.in_([row["id"] for row in rows]))
+            )
+        )
+        missing = [row for row in rows if row["id"] not in present]
+        if missing:
+            session.execute(insert(table), missing)
+        session.commit()
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command line entry point moving bookings to a new shard layout."""
+    parser = argparse.ArgumentParser(
+        description="Move bookings between Smart Host booking shards."
+    )
+    parser.add_argument(
+        "--source",
+        nargs="+",
+        default=list(BOOKING_SHARDS) or None,
+        help="current shard URLs (default: BOOKING_SHARDS)",
+    )
+    parser.add_argument(
+        "--target", nargs="+", required=True, help="shard URLs of the new layout"
+    )
+    parser.add_argument("--catalog", help="main database URL (default: DATABASE_URL)")
+    parser.add_argument("--batch-size", type=int, default=REBALANCE_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    if not args.source:
+        parser.error("--source is required when BOOKING_SHARDS is not set")
+
+    def report(url: str, moved: int) -> None:
+        print(f"\r{url}: {moved} bookings moved", end="", flush=True)
+
+    moved = rebalance(
+        args.source, args.target, args.catalog, args.batch_size, progress=report
+    )
+    print(f"\nmoved {moved} bookings to {len(args.target)} shards")
+
+
+if __name__ == "__main__":
+    main()
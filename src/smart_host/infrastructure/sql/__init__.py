@@ -2,25 +2,41 @@ from __future__ import annotations
 
 """SQLAlchemy database setup and initialization."""
 
-from sqlalchemy import create_engine
+from sqlalchemy import Engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
-DATABASE_URL = "sqlite:///smart_host.db"
+from ...config import DATABASE_URL  # noqa: F401 -- kept for compatibility
+from .engine import create_db_engine, create_engines
 
-engine = create_engine(
-    DATABASE_URL,
-    future=True,
-)
+engine, read_engine = create_engines()
+"""Engines for writes and for reads; see :func:`create_engines`."""
 
 SessionLocal = sessionmaker(bind=engine, future=True)
 
+ReadSessionLocal = sessionmaker(bind=read_engine, future=True)
+
 
 class Base(DeclarativeBase):
     """Base declarative class."""
 
 
-def init_db() -> None:
-    """Create database tables if they do not exist."""
-    from . import models  # noqa: F401 -- import models for metadata
+def init_db(bind: Engine | None = None) -> None:
+    """Bring the schema up to date by applying pending migrations.
+
+    ``bind`` defaults to the module level engine. See :mod:`.migrations`.
+    """
+    from .migrations import migrate
+
+    migrate(bind or engine)
+
 
-    Base.metadata.create_all(engine, checkfirst=True)
+__all__ = [
+    "Base",
+    "ReadSessionLocal",
+    "SessionLocal",
+    "create_db_engine",
+    "create_engines",
+    "engine",
+    "init_db",
+    "read_engine",
+]
@@ -0,0 +1,162 @@
+"""Engine factory driven by :mod:`smart_host.config`."""
+
+from __future__ import annotations
+
+import os
+import weakref
+from typing import TYPE_CHECKING
+
+from sqlalchemy import Engine, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ... import config
+
+
+_POOLED_ENGINES: weakref.WeakSet[Engine] = weakref.WeakSet()
+
+
+def _reset_pools_after_fork() -> None:
+    """Give every pooled engine fresh connections in a forked child.
+
+    Connections inherited from the parent would be shared with it, so the
+    child drops its copies without closing them and opens its own.
+    """
+    for engine in list(_POOLED_ENGINES):
+        engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    database = parsed.database or ""
+    return database in ("", ":memory:") or parsed.query.get("mode") == "memory"
+
+
+def _apply_sqlite_pragmas(engine: Engine, *, readonly: bool) -> None:
+    """Tune every new SQLite connection of ``engine``.
+
+    WAL lets readers proceed while the single writer commits, and
+    ``synchronous=NORMAL`` is durable enough in WAL mode while saving an
+    fsync per commit.
+    """
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(config.DB_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA mmap_size={int(config.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA cache_size={int(config.SQLITE_CACHE_SIZE)}")
+        if readonly:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+"""Async driver used for each backend when a URL does not name one."""
+
+
+def to_async_url(url: str) -> str:
+    """Return ``url`` with an asyncio driver, e.g. ``sqlite+aiosqlite``."""
+    parsed = make_url(url)
+    if parsed.drivername in ASYNC_DRIVERS:
+        parsed = parsed.set(drivername=ASYNC_DRIVERS[parsed.drivername])
+    return parsed.render_as_string(hide_password=False)
+
+
+def create_db_engine(
+    url: str, *, readonly: bool = False, use_async: bool = False
+) -> Engine:
+    """Return an engine for ``url`` configured from :mod:`smart_host.config`.
+
+    SQLite only ever has one writer, so the write engine keeps a single
+    pooled connection and callers queue on the pool instead of spinning on
+    "database is locked". Read engines get a regular pool. ``use_async``
+    returns an :class:`~sqlalchemy.ext.asyncio.AsyncEngine` on the driver
+    chosen by :func:`to_async_url`. Pooled engines start over with fresh
+    connections in forked worker processes.
+    """
+    create = create_engine
+    if use_async:
+        # Imported here so blocking deployments skip loading greenlet.
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        create = create_async_engine
+        url = to_async_url(url)
+
+    if not url.startswith("sqlite"):
+        engine = create(
+            url,
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+        )
+        _POOLED_ENGINES.add(getattr(engine, "sync_engine", engine))
+        return engine
+
+    connect_args = {
+        "check_same_thread": False,
+        "timeout": config.DB_BUSY_TIMEOUT_MS / 1000,
+    }
+    if _is_memory_sqlite(url):
+        # Every connection to an in-memory database sees a different
+        # database, so share a single one.
+        return create(url, connect_args=connect_args, poolclass=StaticPool)
+
+    engine = create(
+        url,
+        connect_args=connect_args,
+        poolclass=AsyncAdaptedQueuePool if use_async else QueuePool,
+        pool_size=config.DB_POOL_SIZE if readonly else 1,
+        max_overflow=config.DB_MAX_OVERFLOW if readonly else 0,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+    )
+    sync_engine = getattr(engine, "sync_engine", engine)
+    _apply_sqlite_pragmas(sync_engine, readonly=readonly)
+    _POOLED_ENGINES.add(sync_engine)
+    return engine
+
+
+def create_engines(
+    url: str | None = None, read_url: str | None = None
+) -> tuple[Engine, Engine]:
+    """Return the ``(write, read)`` engine pair.
+
+    ``url`` and ``read_url`` default to ``DATABASE_URL`` and
+    ``DATABASE_READ_URL``. An in-memory SQLite database cannot be shared
+    between engines, so the same engine serves both roles there.
+    """
+    return _engine_pair(url, read_url, use_async=False)
+
+
+def create_async_engines(
+    url: str | None = None, read_url: str | None = None
+) -> tuple[AsyncEngine, AsyncEngine]:
+    """Return the ``(write, read)`` pair of asyncio engines.
+
+    Arguments and defaults are those of :func:`create_engines`.
+    """
+    return _engine_pair(url, read_url, use_async=True)
+
+
+def _engine_pair(url: str | None, read_url: str | None, *, use_async: bool):
+    url = url or config.DATABASE_URL
+    if read_url is None:
+        read_url = config.DATABASE_READ_URL if url == config.DATABASE_URL else url
+    write_engine = create_db_engine(url, use_async=use_async)
+    if url.startswith("sqlite") and _is_memory_sqlite(url):
+        return write_engine, write_engine
+    return write_engine, create_db_engine(read_url, readonly=True, use_async=use_async)
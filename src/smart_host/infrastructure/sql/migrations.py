@@ -0,0 +1,399 @@
+"""Versioned schema migrations.
+
+Applied versions are recorded in the ``schema_version`` table. Pending
+steps of :data:`MIGRATIONS` run in order inside one transaction that holds
+the database write lock, so concurrent workers starting together apply each
+step exactly once. Run them with
+``python -m smart_host.infrastructure.sql.migrations`` or from the
+application startup hook; repositories assume the schema exists.
+
+Each step defines the tables it touches as they were at that version
+instead of importing :mod:`.models`, so old steps keep working when the
+ORM models change.
+"""
+
+from __future__ import annotations
+
+import argparse
+import threading
+from collections.abc import Callable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    Date,
+    DateTime,
+    Engine,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    insert,
+    select,
+    update,
+)
+
+ADVISORY_LOCK_KEY = 0x534D4854  # "SMHT"
+"""Key of the PostgreSQL advisory lock serializing migration runs."""
+
+_schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+_process_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Migration:
+    """One schema change step."""
+
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+def _v1_base_schema(conn: Connection) -> None:
+    # Databases created by the former ``create_all`` bootstrap already have
+    # these tables, hence ``checkfirst``.
+    metadata = MetaData()
+    Table(
+        "hosts",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("name", String, nullable=False),
+        Column("rating", Float, default=0.0),
+    )
+    Table(
+        "properties",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("name", String, nullable=False),
+        Column("location", String, nullable=False),
+    )
+    Table(
+        "rooms",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("property_id", Integer, ForeignKey("properties.id"), nullable=False),
+        Column("beds", Integer, default=1),
+        Column("features", String, nullable=True),
+        Column("price", Float, default=0.0),
+    )
+    Table(
+        "bookings",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("room_id", Integer, ForeignKey("rooms.id"), nullable=False),
+        Column("guest_name", String, nullable=False),
+        Column("language", String, nullable=False),
+        Column("check_in", Date, nullable=False),
+        Column("check_out", Date, nullable=False),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+
+def _v2_booking_stay_index(conn: Connection) -> None:
+    bookings = Table(
+        "bookings",
+        MetaData(),
+        Column("room_id", Integer),
+        Column("check_in", Date),
+        Column("check_out", Date),
+    )
+    Index(
+        "ix_bookings_room_stay",
+        bookings.c.room_id,
+        bookings.c.check_in,
+        bookings.c.check_out,
+    ).create(conn, checkfirst=True)
+
+
+def _v3_room_search_indexes(conn: Connection) -> None:
+    metadata = MetaData()
+    rooms = Table(
+        "rooms",
+        metadata,
+        Column("property_id", Integer),
+        Column("beds", Integer),
+        Column("price", Float),
+    )
+    properties = Table("properties", metadata, Column("location", String))
+    for index in (
+        Index("ix_rooms_property_id", rooms.c.property_id),
+        Index("ix_rooms_price", rooms.c.price),
+        Index("ix_rooms_beds", rooms.c.beds),
+        Index("ix_properties_location", properties.c.location),
+    ):
+        index.create(conn, checkfirst=True)
+
+
+def _v4_id_blocks(conn: Connection) -> None:
+    metadata = MetaData()
+    id_blocks = Table(
+        "id_blocks",
+        metadata,
+        Column("name", String, primary_key=True),
+        Column("next_id", Integer, nullable=False),
+    )
+    bookings = Table("bookings", metadata, Column("id", Integer))
+    id_blocks.create(conn, checkfirst=True)
+    # Seeding the row spares concurrent first reservations an insert race.
+    highest = conn.scalar(select(func.max(bookings.c.id))) or 0
+    conn.execute(insert(id_blocks).values(name="bookings", next_id=highest + 1))
+
+
+def _v5_bookings_archive(conn: Connection) -> None:
+    archive = Table(
+        "bookings_archive",
+        MetaData(),
+        Column("seq", Integer, primary_key=True),
+        Column("id", Integer, nullable=False),
+        Column("room_id", Integer, nullable=False),
+        Column("guest_name", String, nullable=False),
+        Column("language", String, nullable=False),
+        Column("check_in", Date, nullable=False),
+        Column("check_out", Date, nullable=False),
+    )
+    Index("ix_bookings_archive_id", archive.c.id, unique=True)
+    Index(
+        "ix_bookings_archive_room_stay",
+        archive.c.room_id,
+        archive.c.check_in,
+        archive.c.check_out,
+    )
+    archive.create(conn, checkfirst=True)
+
+
+def _v6_change_versions(conn: Connection) -> None:
+    metadata = MetaData()
+    change_versions = Table(
+        "change_versions",
+        metadata,
+        Column("name", String, primary_key=True),
+        Column("version", Integer, nullable=False),
+    )
+    change_versions.create(conn, checkfirst=True)
+    for name in ("properties", "rooms", "bookings"):
+        conn.exec_driver_sql(
+            f"ALTER TABLE {name} ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+        )
+        table = Table(
+            name, metadata, Column("id", Integer), Column("version", Integer)
+        )
+        # Stored rows take their id as version, so ``since=0`` lists them
+        # all and the versions handed out next are above every one of them.
+        conn.execute(update(table).values(version=table.c.id))
+        Index(f"ix_{name}_version", table.c.version).create(conn)
+        highest = conn.scalar(select(func.max(table.c.id))) or 0
+        conn.execute(insert(change_versions).values(name=name, version=highest))
+
+
+def _v7_room_rates(conn: Connection) -> None:
+    metadata = MetaData()
+    Table("rooms", metadata, Column("id", Integer, primary_key=True))
+    room_rates = Table(
+        "room_rates",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("room_id", Integer, ForeignKey("rooms.id"), nullable=False),
+        Column("price", Float, nullable=True),
+        Column("min_nights", Integer, nullable=True),
+        Column("start", Date, nullable=True),
+        Column("end", Date, nullable=True),
+        Column("weekdays", Integer, nullable=True),
+    )
+    Index("ix_room_rates_room_id", room_rates.c.room_id)
+    room_rates.create(conn, checkfirst=True)
+
+
+def _v8_room_features_index(conn: Connection) -> None:
+    # Full-text index over ``rooms.features`` kept in sync by triggers, so
+    # every write path, bulk imports included, updates it. Other databases
+    # match features as substrings instead.
+    if conn.dialect.name != "sqlite":
+        return
+    conn.exec_driver_sql(
+        "CREATE VIRTUAL TABLE rooms_fts USING fts5(features, content='rooms', "
+        "content_rowid='id', tokenize='unicode61 remove_diacritics 2', "
+        "prefix='2 3')"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER rooms_fts_insert AFTER INSERT ON rooms BEGIN "
+        "INSERT INTO rooms_fts(rowid, features) VALUES (new.id, new.features); "
+        "END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER rooms_fts_delete AFTER DELETE ON rooms BEGIN "
+        "INSERT INTO rooms_fts(rooms_fts, rowid, features) "
+        "VALUES ('delete', old.id, old.features); END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER rooms_fts_update AFTER UPDATE OF features ON rooms BEGIN "
+        "INSERT INTO rooms_fts(rooms_fts, rowid, features) "
+        "VALUES ('delete', old.id, old.features); "
+        "INSERT INTO rooms_fts(rowid, features) VALUES (new.id, new.features); "
+        "END"
+    )
+    conn.exec_driver_sql("INSERT INTO rooms_fts(rooms_fts) VALUES ('rebuild')")
+
+
+def _v9_booking_ids_autoincrement(conn: Connection) -> None:
+    # SQLite hands out the id after the highest one still in a table, which
+    # may be an archived booking's. AUTOINCREMENT remembers the highest id
+    # ever used instead; it needs the table rebuilt. Other databases draw
+    # ids from sequences that never go back.
+    if conn.dialect.name != "sqlite":
+        return
+    metadata = MetaData()
+    Table("rooms", metadata, Column("id", Integer, primary_key=True))
+    bookings = Table(
+        "bookings_autoincrement",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("room_id", Integer, ForeignKey("rooms.id"), nullable=False),
+        Column("guest_name", String, nullable=False),
+        Column("language", String, nullable=False),
+        Column("check_in", Date, nullable=False),
+        Column("check_out", Date, nullable=False),
+        Column("version", Integer, nullable=False, server_default="0"),
+        sqlite_autoincrement=True,
+    )
+    bookings.create(conn)
+    columns = ", ".join(column.name for column in bookings.columns)
+    conn.exec_driver_sql(
+        f"INSERT INTO bookings_autoincrement ({columns}) "
+        f"SELECT {columns} FROM bookings"
+    )
+    conn.exec_driver_sql("DROP TABLE bookings")
+    conn.exec_driver_sql("ALTER TABLE bookings_autoincrement RENAME TO bookings")
+
+    metadata = MetaData()
+    renamed = Table(
+        "bookings",
+        metadata,
+        Column("id", Integer),
+        Column("room_id", Integer),
+        Column("check_in", Date),
+        Column("check_out", Date),
+        Column("version", Integer),
+    )
+    archive = Table("bookings_archive", metadata, Column("id", Integer))
+    Index(
+        "ix_bookings_room_stay",
+        renamed.c.room_id,
+        renamed.c.check_in,
+        renamed.c.check_out,
+    ).create(conn)
+    Index("ix_bookings_version", renamed.c.version).create(conn)
+    # Archived ids count as used.
+    highest = max(
+        conn.scalar(select(func.max(renamed.c.id))) or 0,
+        conn.scalar(select(func.max(archive.c.id))) or 0,
+    )
+    conn.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'bookings'")
+    conn.exec_driver_sql(
+        "INSERT INTO sqlite_sequence (name, seq) VALUES ('bookings', ?)", (highest,)
+    )
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "hosts, properties, rooms and bookings", _v1_base_schema),
+    Migration(2, "bookings stay index", _v2_booking_stay_index),
+    Migration(3, "room search indexes", _v3_room_search_indexes),
+    Migration(4, "id blocks", _v4_id_blocks),
+    Migration(5, "bookings archive", _v5_bookings_archive),
+    Migration(6, "change versions", _v6_change_versions),
+    Migration(7, "room rates", _v7_room_rates),
+    Migration(8, "room features index", _v8_room_features_index),
+    Migration(9, "booking ids autoincrement", _v9_booking_ids_autoincrement),
+]
+"""All schema steps in version order."""
+
+
+def current_version(conn: Connection) -> int:
+    """Return the latest applied version, 0 for an empty database.
+
+    Creates the ``schema_version`` table when it is missing.
+    """
+    _schema_version.create(conn, checkfirst=True)
+    return conn.scalar(select(func.max(_schema_version.c.version))) or 0
+
+
+def _apply_pending(conn: Connection) -> list[int]:
+    version = current_version(conn)
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        migration.upgrade(conn)
+        conn.execute(
+            insert(_schema_version).values(
+                version=migration.version,
+                description=migration.description,
+                applied_at=datetime.now(timezone.utc),
+            )
+        )
+        applied.append(migration.version)
+    return applied
+
+
+def migrate_connection(conn: Connection) -> list[int]:
+    """Apply pending migrations on ``conn`` under the database write lock.
+
+    Returns the versions applied. On SQLite the run is a ``BEGIN IMMEDIATE``
+    transaction; on PostgreSQL it takes an advisory transaction lock.
+    """
+    if conn.dialect.name == "sqlite":
+        # Let SQLite see our explicit BEGIN instead of the driver's own.
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            applied = _apply_pending(conn)
+        except BaseException:
+            conn.exec_driver_sql("ROLLBACK")
+            raise
+        conn.exec_driver_sql("COMMIT")
+        return applied
+
+    with conn.begin():
+        if conn.dialect.name == "postgresql":
+            conn.exec_driver_sql(f"SELECT pg_advisory_xact_lock({ADVISORY_LOCK_KEY})")
+        return _apply_pending(conn)
+
+
+def migrate(bind: Engine | None = None) -> list[int]:
+    """Apply pending migrations to ``bind`` (default: the write engine)."""
+    if bind is None:
+        from . import engine as bind
+    with _process_lock, bind.connect() as conn:
+        return migrate_connection(conn)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command line entry point applying pending migrations."""
+    parser = argparse.ArgumentParser(description="Apply Smart Host schema migrations.")
+    parser.add_argument("--url", help="database URL (defaults to DATABASE_URL)")
+    args = parser.parse_args(argv)
+
+    from .engine import create_db_engine
+
+    bind = create_db_engine(args.url) if args.url else None
+    applied = migrate(bind)
+    if applied:
+        print("applied migrations:", ", ".join(map(str, applied)))
+    else:
+        print("schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 """SQLAlchemy ORM models."""
 
 from datetime import date
-from sqlalchemy import Column, Date, Float, ForeignKey, Integer, String
+from sqlalchemy import Column, Date, Float, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import relationship
 
 from . import Base
@@ -20,7 +20,8 @@ class PropertyTable(Base):
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
-    location = Column(String, nullable=False)
+    location = Column(String, nullable=False, index=True)
+    version = Column(Integer, nullable=False, default=0, index=True)
 
     rooms = relationship("RoomTable", back_populates="property", cascade="all, delete-orphan")
 
@@ -29,16 +30,38 @@ class RoomTable(Base):
     __tablename__ = "rooms"
 
     id = Column(Integer, primary_key=True)
-    property_id = Column(Integer, ForeignKey("properties.id"), nullable=False)
-    beds = Column(Integer, default=1)
+    property_id = Column(
+        Integer, ForeignKey("properties.id"), nullable=False, index=True
+    )
+    beds = Column(Integer, default=1, index=True)
     features = Column(String, nullable=True)
-    price = Column(Float, default=0.0)
+    price = Column(Float, default=0.0, index=True)
+    version = Column(Integer, nullable=False, default=0, index=True)
 
     property = relationship("PropertyTable", back_populates="rooms")
 
 
+class RoomRateTable(Base):
+    __tablename__ = "room_rates"
+
+    id = Column(Integer, primary_key=True)
+    room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False, index=True)
+    price = Column(Float, nullable=True)
+    min_nights = Column(Integer, nullable=True)
+    start = Column(Date, nullable=True)
+    end = Column(Date, nullable=True)
+    # Bit ``n`` set for weekday ``n``, Monday being 0; NULL for every day.
+    weekdays = Column(Integer, nullable=True)
+
+
 class BookingTable(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        # Serves the per-room overlap check as a single index seek.
+        Index("ix_bookings_room_stay", "room_id", "check_in", "check_out"),
+        # Ids of archived bookings are never handed out again.
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True)
     room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
@@ -46,5 +69,38 @@ class BookingTable(Base):
     language = Column(String, nullable=False)
     check_in = Column(Date, nullable=False)
     check_out = Column(Date, nullable=False)
+    version = Column(Integer, nullable=False, default=0, index=True)
 
     room = relationship("RoomTable")
+
+
+class BookingArchiveTable(Base):
+    __tablename__ = "bookings_archive"
+    __table_args__ = (
+        Index("ix_bookings_archive_id", "id", unique=True),
+        Index("ix_bookings_archive_room_stay", "room_id", "check_in", "check_out"),
+    )
+
+    # Rows arrive in ``seq`` order but not in booking ``id`` order.
+    seq = Column(Integer, primary_key=True)
+    id = Column(Integer, nullable=False)
+    room_id = Column(Integer, nullable=False)
+    guest_name = Column(String, nullable=False)
+    language = Column(String, nullable=False)
+    check_in = Column(Date, nullable=False)
+    check_out = Column(Date, nullable=False)
+
+
+class IdBlockTable(Base):
+    __tablename__ = "id_blocks"
+
+    name = Column(String, primary_key=True)
+    next_id = Column(Integer, nullable=False)
+
+
+class ChangeVersionTable(Base):
+    __tablename__ = "change_versions"
+
+    # One counter per versioned table, bumped by every write to it.
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False)
@@ -1,7 +1,11 @@
 """Minimal FastAPI application."""
 
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from fastapi import Body, FastAPI, HTTPException, Query, Request, WebSocket
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from pathlib import Path
 
 try:  # Optional dependency for test environment
@@ -15,54 +19,389 @@ except Exception:  # pragma: nocover
     templates = None
 from datetime import date
 
-from ..service import HostService, PropertyService, BookingService
+from ..config import (
+    ARCHIVE_AFTER_DAYS,
+    ASYNC_DB,
+    AUTO_MIGRATE,
+    BOOKING_SHARDS,
+    GROUP_COMMIT,
+    METRICS_ENABLED,
+    PROPERTY_CACHE_SIZE,
+    PROPERTY_CACHE_TTL,
+    PROPERTY_CACHE_VERSION_TTL,
+    QUOTE_CACHE_SIZE,
+    REPOSITORY_BACKEND,
+    SLOW_REQUEST_MS,
+)
+from ..service import (
+    AnalyticsService,
+    BookingService,
+    BulkService,
+    HostService,
+    PropertyService,
+    QuoteService,
+)
 from ..infrastructure import (
+    AnalyticsRepository,
+    AvailabilityIndex,
     HostRepository,
     PropertyRepository,
     BookingRepository,
+    CachedPropertyRepository,
+    GroupCommitBookingRepository,
+    LRUCache,
+    MemoryBookingRepository,
+    MemoryHostRepository,
+    MemoryPropertyRepository,
+    MemoryStore,
     init_db,
 )
-from ..domain import Host
+from ..domain import Host, Room, RoomRate, BookingConflictError
+from .responses import (
+    FastJSONResponse,
+    batch_report,
+    changes_response,
+    etag,
+    ndjson_response,
+    not_modified,
+    page_response,
+    parse_items,
+    tagged,
+    wants_ndjson,
+)
+from .chat import POLICY_VIOLATION, ROLES, ChatHub, channels_for
+from .metrics import (
+    BATCH_SIZE_BUCKETS,
+    CONTENT_TYPE,
+    Histogram,
+    Metrics,
+    MetricsMiddleware,
+    install_sql_hooks,
+)
+from .schemas import BookingIn, HostIn, RateIn, RoomIn
 
+if TYPE_CHECKING:
+    from ..infrastructure.archive import PeriodicArchiver
+    from ..infrastructure.shards import ShardRouter
 
-def create_app() -> FastAPI:
-    """Create and return the FastAPI application."""
+BACKENDS = ("sql", "memory")
+"""Storage backends ``create_app`` can keep the data in."""
 
-    app = FastAPI()
-    # Ensure database tables exist
-    init_db()
 
-    repository = HostRepository()
-    prop_repo = PropertyRepository()
-    booking_repo = BookingRepository()
+def create_app(
+    async_db: bool = ASYNC_DB,
+    auto_migrate: bool = AUTO_MIGRATE,
+    metrics: bool = METRICS_ENABLED,
+    backend: str = REPOSITORY_BACKEND,
+) -> FastAPI:
+    """Create and return the FastAPI application.
+
+    With ``async_db`` the host, property, room and booking routes are served
+    by ``async def`` handlers on the asyncio repositories instead of
+    occupying threadpool workers. Building the app does not touch the
+    database; with ``auto_migrate`` pending schema migrations are applied
+    once on startup. With ``metrics`` request and SQL metrics are recorded
+    in ``app.state.metrics`` and served on ``/metrics``. With
+    ``GROUP_COMMIT`` single bookings are stored through a shared
+    :class:`GroupCommitBookingRepository`. With ``BOOKING_SHARDS`` bookings
+    are spread over those databases, which only the blocking routes support.
+    With ``ARCHIVE_AFTER_DAYS`` finished stays are archived periodically.
+    Tables are exported and imported in bulk on ``/export`` and ``/import``.
+    Free rooms are searched on ``/availability`` and stays priced on
+    ``/rooms/{room_id}/quote`` and ``/quotes``.
+    The chat hub behind ``/chat/ws`` is kept in ``app.state.chat``.
+
+    ``backend`` is ``sql`` or ``memory``. The memory backend keeps every
+    table in a :class:`MemoryStore` of the app, needs no migrations and
+    cannot be combined with ``async_db`` or ``BOOKING_SHARDS``; the reports
+    and ``/availability`` are only served by the ``sql`` backend.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {', '.join(BACKENDS)}")
+    if BOOKING_SHARDS and async_db:
+        raise ValueError("BOOKING_SHARDS cannot be combined with ASYNC_DB")
+    store = None
+    if backend == "memory":
+        if async_db or BOOKING_SHARDS:
+            raise ValueError(
+                "the memory backend cannot be combined with ASYNC_DB or BOOKING_SHARDS"
+            )
+        store = MemoryStore()
+
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.state.metrics = None
+
+    if metrics:
+        registry = app.state.metrics = Metrics()
+        install_sql_hooks()
+        app.add_middleware(
+            MetricsMiddleware, metrics=registry, slow_request_ms=SLOW_REQUEST_MS
+        )
+
+        @app.get("/metrics", include_in_schema=False)
+        def read_metrics() -> PlainTextResponse:
+            """Return all metrics in the Prometheus text format."""
+            return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
+
+    if auto_migrate and store is None:
+
+        @app.on_event("startup")
+        def apply_migrations() -> None:
+            init_db()
+
     host_service = HostService()
     property_service = PropertyService()
+    shards = _shard_router(app, auto_migrate) if BOOKING_SHARDS else None
+    booking_writer = _group_commit_writer(app, shards, store) if GROUP_COMMIT else None
+    if ARCHIVE_AFTER_DAYS:
+        _archiver(app, shards, store)
+    if async_db:
+        from .async_routes import register_async_routes
+
+        register_async_routes(
+            app, host_service, property_service, auto_migrate, booking_writer
+        )
+    else:
+        _register_sync_routes(
+            app, host_service, property_service, booking_writer, shards, store
+        )
+    if store is None:
+        _register_analytics_routes(app, shards)
+        _register_availability_routes(app, property_service, shards)
+    _register_quote_routes(app, store)
+    from .bulk import register_bulk_routes
+
+    bulk_service = BulkService(
+        _host_repository(store),
+        _property_repository(store),
+        _booking_repository(shards, store),
+    )
+    register_bulk_routes(app, bulk_service)
+
+    @app.get("/chat", response_class=HTMLResponse)
+    def chat(request: Request):
+        """Render simple chat interface."""
+        if templates is not None:
+            return templates.TemplateResponse("chat.html", {"request": request})
+        html = (Path(__file__).resolve().parent / "templates" / "chat.html").read_text()
+        return HTMLResponse(html)
+
+    hub = app.state.chat = ChatHub()
+    if app.state.metrics is not None:
+        app.state.metrics.register_callback(
+            "chat_connections",
+            "gauge",
+            "Open chat WebSocket connections.",
+            lambda: hub.stats()["connections"],
+        )
+        app.state.metrics.register_callback(
+            "chat_evictions_total",
+            "counter",
+            "Chat connections closed as slow or idle.",
+            lambda: hub.evictions,
+        )
+
+    @app.websocket("/chat/ws")
+    async def chat_socket(
+        websocket: WebSocket,
+        property_id: int | None = None,
+        booking_id: int | None = None,
+        name: str = "guest",
+        role: str = "guest",
+    ) -> None:
+        """Chat with everyone on the property's and the booking's channels.
+
+        Clients send ``{"text", "channel"}`` objects, where ``channel`` may be
+        left out when only one was joined, and answer ``ping`` frames with
+        ``{"type": "pong"}``.
+        """
+        channels = channels_for(property_id, booking_id)
+        await websocket.accept()
+        if not channels or role not in ROLES or not 0 < len(name) <= 50:
+            await websocket.close(POLICY_VIOLATION, "invalid channel, role or name")
+            return
+        await hub.serve(websocket, channels, name, role)
+
+    @app.on_event("shutdown")
+    async def close_chat() -> None:
+        await hub.close()
+
+    return app
+
+
+def _shard_router(app: FastAPI, auto_migrate: bool) -> ShardRouter:
+    """Open the ``BOOKING_SHARDS``, migrating them on startup with ``auto_migrate``."""
+    from ..infrastructure.shards import ShardRouter
+
+    router = ShardRouter(BOOKING_SHARDS)
+    if auto_migrate:
+        app.add_event_handler("startup", router.migrate)
+    return router
+
+
+def _host_repository(store: MemoryStore | None = None):
+    """Return the blocking host repository, kept in ``store`` if given."""
+    return HostRepository() if store is None else MemoryHostRepository(store)
+
+
+def _property_repository(store: MemoryStore | None = None):
+    """Return the blocking property repository, kept in ``store`` if given."""
+    return PropertyRepository() if store is None else MemoryPropertyRepository(store)
+
+
+def _booking_repository(
+    shards: ShardRouter | None = None, store: MemoryStore | None = None
+):
+    """Return the blocking booking repository.
+
+    It is kept in ``store`` or sharded over ``shards`` if either is given.
+    """
+    if store is not None:
+        return MemoryBookingRepository(store)
+    if shards is None:
+        return BookingRepository()
+    from ..infrastructure.shards import ShardedBookingRepository
+
+    return ShardedBookingRepository(shards)
+
+
+def _group_commit_writer(
+    app: FastAPI,
+    shards: ShardRouter | None = None,
+    store: MemoryStore | None = None,
+) -> GroupCommitBookingRepository:
+    """Build the booking group commit writer and stop it on shutdown."""
+    on_flush = None
+    if app.state.metrics is not None:
+        batches = app.state.metrics.register(
+            Histogram(
+                "booking_group_commit_size",
+                "Bookings stored per group commit.",
+                buckets=BATCH_SIZE_BUCKETS,
+            )
+        )
+        on_flush = batches.observe
+    writer = GroupCommitBookingRepository(
+        _booking_repository(shards, store), on_flush=on_flush
+    )
+    app.add_event_handler("shutdown", writer.close)
+    return writer
+
+
+def _archiver(
+    app: FastAPI,
+    shards: ShardRouter | None = None,
+    store: MemoryStore | None = None,
+) -> PeriodicArchiver:
+    """Archive finished stays in the background while the app is running."""
+    from ..infrastructure.archive import PeriodicArchiver
+
+    archiver = PeriodicArchiver(_booking_repository(shards, store))
+    app.add_event_handler("startup", archiver.start)
+    app.add_event_handler("shutdown", archiver.close)
+    if app.state.metrics is not None:
+        app.state.metrics.register_callback(
+            "bookings_archived_total",
+            "counter",
+            "Bookings moved to the archive.",
+            lambda: archiver.archived,
+        )
+    return archiver
+
+
+def _register_sync_routes(
+    app: FastAPI,
+    host_service: HostService,
+    property_service: PropertyService,
+    booking_writer: GroupCommitBookingRepository | None = None,
+    shards: ShardRouter | None = None,
+    store: MemoryStore | None = None,
+) -> None:
+    """Register the resource routes backed by the blocking repositories.
+
+    Listings of the memory backend are not cached; they are read from memory.
+    """
+    repository = _host_repository(store)
+    prop_repo = _property_repository(store)
+    if PROPERTY_CACHE_SIZE > 0 and store is None:
+        cache = LRUCache(PROPERTY_CACHE_SIZE, PROPERTY_CACHE_TTL)
+        prop_repo = CachedPropertyRepository(
+            prop_repo, cache, version_ttl=PROPERTY_CACHE_VERSION_TTL
+        )
+        if app.state.metrics is not None:
+            app.state.metrics.register_cache("property_cache", cache.stats)
+    booking_repo = booking_writer or _booking_repository(shards, store)
     booking_service = BookingService(booking_repo)
 
     @app.get("/hosts")
-    def list_hosts() -> list[dict]:
-        """Return all hosts in repository."""
-        hosts = repository.list_hosts()
-        return [host_service.to_dict(host) for host in hosts]
+    def list_hosts(
+        request: Request,
+        limit: int | None = Query(None, ge=1),
+        after: int | None = None,
+    ) -> list[dict]:
+        """Return hosts in repository, one keyset page at a time."""
+        if wants_ndjson(request):
+            return ndjson_response(
+                repository.iter_hosts(after=after), host_service.to_dict, limit
+            )
+        hosts = repository.list_hosts(limit=limit, after=after)
+        return page_response(hosts, host_service.to_dict, limit)
 
     @app.post("/hosts")
     def add_host(name: str) -> dict:
         """Add a host by name and return it."""
         host = Host(name=name)
         repository.add(host)
-        return host_service.to_dict(host)
+        return FastJSONResponse(host_service.to_dict(host))
+
+    @app.post("/hosts/batch")
+    def add_hosts(items: list[dict] = Body(...)) -> dict:
+        """Add many hosts in one transaction."""
+        parsed, errors = parse_items(HostIn, items)
+        hosts = repository.add_many(
+            [Host(name=item.name, rating=item.rating) for _, item in parsed]
+        )
+        return batch_report([host_service.to_dict(h) for h in hosts], errors)
 
     @app.post("/properties")
     def add_property(name: str, location: str) -> dict:
         """Create a property and return it."""
         prop = prop_repo.add_property(name=name, location=location)
-        return property_service.to_dict(prop)
+        return FastJSONResponse(property_service.to_dict(prop))
 
     @app.get("/properties")
-    def list_properties() -> list[dict]:
-        """List all properties."""
-        props = prop_repo.list_properties()
-        return [property_service.to_dict(p) for p in props]
+    def list_properties(
+        request: Request,
+        limit: int | None = Query(None, ge=1),
+        after: int | None = None,
+        since: int | None = Query(None, ge=0),
+    ) -> list[dict]:
+        """List properties, one keyset page at a time.
+
+        Responses carry an ``ETag`` that every write changes; requests whose
+        ``If-None-Match`` still holds it get an empty ``304``. With ``since``
+        only the properties changed after that version are listed, in the
+        order they changed, and ``X-Version`` holds the ``since`` of the next
+        request; ``since=0`` lists them all.
+        """
+        tag = etag(request, prop_repo.properties_version())
+        if (unchanged := not_modified(request, tag)) is not None:
+            return unchanged
+        if since is not None:
+            props, version = prop_repo.properties_since(since, limit)
+            response = changes_response(
+                request, props, property_service.to_dict, version
+            )
+        elif wants_ndjson(request):
+            response = ndjson_response(
+                prop_repo.iter_properties(after=after),
+                property_service.to_dict,
+                limit,
+            )
+        else:
+            props = prop_repo.list_properties(limit=limit, after=after)
+            response = page_response(props, property_service.to_dict, limit)
+        return tagged(response, tag)
 
     @app.post("/properties/{property_id}/rooms")
     def add_room(
@@ -73,13 +412,98 @@ def create_app() -> FastAPI:
     ) -> dict:
         """Add a room to a property."""
         room = prop_repo.add_room(property_id, beds, features=features, price=price)
-        return property_service.to_dict(room)
+        return FastJSONResponse(property_service.to_dict(room))
+
+    @app.post("/properties/{property_id}/rooms/batch")
+    def add_rooms(property_id: int, items: list[dict] = Body(...)) -> dict:
+        """Add many rooms to a property in one transaction."""
+        parsed, errors = parse_items(RoomIn, items)
+        rooms = prop_repo.add_rooms(
+            [
+                Room(id=0, property_id=property_id, **item.dict())
+                for _, item in parsed
+            ]
+        )
+        return batch_report([property_service.to_dict(r) for r in rooms], errors)
 
     @app.get("/properties/{property_id}/rooms")
-    def list_rooms(property_id: int) -> list[dict]:
-        """List rooms for a property."""
-        rooms = prop_repo.list_rooms(property_id)
-        return [property_service.to_dict(r) for r in rooms]
+    def list_rooms(
+        property_id: int,
+        request: Request,
+        limit: int | None = Query(None, ge=1),
+        after: int | None = None,
+        since: int | None = Query(None, ge=0),
+        features_query: str | None = None,
+    ) -> list[dict]:
+        """List rooms for a property, one keyset page at a time.
+
+        Entity tags and ``since`` work as for ``GET /properties``.
+        ``features_query`` keeps the rooms whose features match it, as for
+        ``GET /rooms/search``; it cannot be combined with ``since``.
+        """
+        if since is not None and features_query is not None:
+            raise HTTPException(
+                status_code=400, detail="since cannot be combined with features_query"
+            )
+        tag = etag(request, *prop_repo.rooms_version(property_id))
+        if (unchanged := not_modified(request, tag)) is not None:
+            return unchanged
+        if since is not None:
+            rooms, version = prop_repo.rooms_since(since, property_id, limit)
+            response = changes_response(
+                request, rooms, property_service.to_dict, version
+            )
+        else:
+            try:
+                if wants_ndjson(request):
+                    response = ndjson_response(
+                        prop_repo.iter_rooms(property_id, after, features_query),
+                        property_service.to_dict,
+                        limit,
+                    )
+                else:
+                    rooms = prop_repo.list_rooms(
+                        property_id, limit, after, features_query
+                    )
+                    response = page_response(rooms, property_service.to_dict, limit)
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=str(exc))
+        return tagged(response, tag)
+
+    @app.get("/rooms/search")
+    def search_rooms(
+        location: str | None = None,
+        min_beds: int | None = Query(None, ge=1),
+        min_price: float | None = Query(None, ge=0),
+        max_price: float | None = Query(None, ge=0),
+        features: list[str] = Query([]),
+        sort: str = "price",
+        limit: int = Query(50, ge=1, le=500),
+        features_query: str | None = None,
+    ) -> list[dict]:
+        """Search rooms of all properties.
+
+        Every given filter must match; ``features`` may be repeated and each
+        must appear in the room's features. ``features_query`` is a
+        full-text query over the features: its words must all match unless
+        ``OR`` stands between them, ``sea*`` matches words starting with
+        ``sea`` and quoted words match as a phrase. ``sort`` is ``price``,
+        ``beds`` or ``id``, prefixed with ``-`` for descending order.
+        """
+        try:
+            rooms = prop_repo.search_rooms(
+                location,
+                min_beds,
+                min_price,
+                max_price,
+                features=features,
+                sort=sort,
+                limit=limit,
+                features_query=features_query,
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return FastJSONResponse([property_service.to_dict(r) for r in rooms])
 
     @app.post("/bookings")
     def create_booking(
@@ -98,28 +522,231 @@ def create_app() -> FastAPI:
                 check_in,
                 check_out,
             )
+        except BookingConflictError as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
         except ValueError as exc:
-            from fastapi import HTTPException
-
             raise HTTPException(status_code=400, detail=str(exc))
 
-        return booking_service.to_dict(booking)
+        return FastJSONResponse(booking_service.to_dict(booking))
+
+    @app.post("/bookings/batch")
+    def create_bookings(items: list[dict] = Body(...)) -> dict:
+        """Create many bookings in one transaction.
+
+        Every entry is validated like ``POST /bookings``; rejected entries are
+        reported by index while the others are stored.
+        """
+        parsed, errors = parse_items(BookingIn, items)
+        created, rejected = booking_service.create_bookings(
+            [item.dict() for _, item in parsed]
+        )
+        for batch_index, detail in rejected.items():
+            errors[parsed[batch_index][0]] = detail
+        return batch_report([booking_service.to_dict(b) for b in created], errors)
 
     @app.get("/bookings")
-    def list_bookings() -> list[dict]:
-        """Return all bookings."""
-        bookings = booking_service.list_bookings()
-        return [booking_service.to_dict(b) for b in bookings]
+    def list_bookings(
+        request: Request,
+        limit: int | None = Query(None, ge=1),
+        after: int | None = None,
+        include_archived: bool = False,
+        since: int | None = Query(None, ge=0),
+    ) -> list[dict]:
+        """Return bookings, one keyset page at a time.
 
-    @app.get("/chat", response_class=HTMLResponse)
-    def chat(request: Request):
-        """Render simple chat interface."""
-        if templates is not None:
-            return templates.TemplateResponse("chat.html", {"request": request})
-        html = (Path(__file__).resolve().parent / "templates" / "chat.html").read_text()
-        return HTMLResponse(html)
+        Archived bookings are only listed with ``include_archived``.
+        Entity tags and ``since`` work as for ``GET /properties``; ``since``
+        lists live bookings only and is not supported with shards.
+        """
+        tag = etag(request, booking_service.bookings_version())
+        if (unchanged := not_modified(request, tag)) is not None:
+            return unchanged
+        if since is not None:
+            try:
+                bookings, version = booking_service.bookings_since(since, limit)
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=str(exc))
+            response = changes_response(
+                request, bookings, booking_service.to_dict, version
+            )
+        elif wants_ndjson(request):
+            response = ndjson_response(
+                booking_service.iter_bookings(
+                    after=after, include_archived=include_archived
+                ),
+                booking_service.to_dict,
+                limit,
+            )
+        else:
+            bookings = booking_service.list_bookings(
+                limit=limit, after=after, include_archived=include_archived
+            )
+            response = page_response(bookings, booking_service.to_dict, limit)
+        return tagged(response, tag)
 
-    return app
+
+def _register_analytics_routes(app: FastAPI, shards: ShardRouter | None = None) -> None:
+    """Register the report routes.
+
+    Reports are computed by NumPy over an in-memory snapshot, so they are
+    served from the threadpool in both database modes. With ``shards`` the
+    bookings are read from every shard.
+    """
+    stay_sources = None
+    if shards is not None:
+        stay_sources = [read for _, read in shards.session_factories]
+    analytics_service = AnalyticsService(
+        AnalyticsRepository(stay_session_factories=stay_sources)
+    )
+
+    def report(compute, start, end, group_by, property_id) -> FastJSONResponse:
+        try:
+            return FastJSONResponse(compute(start, end, group_by, property_id))
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+    @app.get("/analytics/occupancy")
+    def occupancy(
+        start: date,
+        end: date,
+        group_by: str = "property",
+        property_id: int | None = None,
+    ) -> dict:
+        """Return booked and available room nights in ``[start, end)``.
+
+        Groups are properties or guest ``language``s; ``daily`` holds the
+        rooms booked on every day of the range.
+        """
+        return report(
+            analytics_service.occupancy, start, end, group_by, property_id
+        )
+
+    @app.get("/analytics/revenue")
+    def revenue(
+        start: date,
+        end: date,
+        group_by: str = "property",
+        property_id: int | None = None,
+    ) -> dict:
+        """Return room revenue and average daily rate in ``[start, end)``."""
+        return report(analytics_service.revenue, start, end, group_by, property_id)
+
+
+def _register_availability_routes(
+    app: FastAPI, property_service: PropertyService, shards: ShardRouter | None = None
+) -> None:
+    """Register the free room search.
+
+    Searches scan the in-memory night bitmaps of an :class:`AvailabilityIndex`,
+    so they are served from the threadpool in both database modes. With
+    ``shards`` the bookings are read from every shard.
+    """
+    stay_sources = None
+    if shards is not None:
+        stay_sources = [read for _, read in shards.session_factories]
+    index = AvailabilityIndex(stay_session_factories=stay_sources)
+    prop_repo = PropertyRepository()
+
+    @app.get("/availability")
+    def availability(
+        check_in: date,
+        check_out: date,
+        beds: int | None = Query(None, ge=1),
+        location: str | None = None,
+        limit: int = Query(50, ge=1, le=500),
+        after: int | None = None,
+    ) -> list[dict]:
+        """List rooms free every night from ``check_in`` to ``check_out``.
+
+        Rooms come in id order, optionally with at least ``beds`` beds and
+        in ``location``; pass the ``X-Next-After`` header of a full page as
+        ``after`` for the next one. Stays must lie within the next
+        ``AVAILABILITY_DAYS`` nights.
+        """
+        try:
+            room_ids = index.available_rooms(
+                check_in, check_out, beds, location, after, limit
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        rooms = prop_repo.rooms_by_id(room_ids) if room_ids else []
+        return page_response(rooms, property_service.to_dict, limit)
+
+
+def _register_quote_routes(app: FastAPI, store: MemoryStore | None = None) -> None:
+    """Register the room rate and stay quote routes.
+
+    Quotes are summed by NumPy over cached price calendars, so they are
+    served from the threadpool in both database modes.
+    """
+    cache = None
+    if QUOTE_CACHE_SIZE > 0:
+        cache = LRUCache(QUOTE_CACHE_SIZE, ttl=24 * 3600)
+        if app.state.metrics is not None:
+            app.state.metrics.register_cache("quote_cache", cache.stats)
+    quote_service = QuoteService(_property_repository(store), cache)
+
+    @app.get("/rooms/{room_id}/rates")
+    def list_rates(room_id: int) -> list[dict]:
+        """Return the rates of a room in the order they apply."""
+        return FastJSONResponse(
+            [quote_service.to_dict(r) for r in quote_service.rates(room_id)]
+        )
+
+    @app.put("/rooms/{room_id}/rates")
+    def set_rates(room_id: int, rates: list[RateIn] = Body(...)) -> list[dict]:
+        """Replace the rates of a room.
+
+        Each rate sets the ``price`` and/or the ``min_nights`` of stays
+        checking in on the nights from ``start`` to before ``end`` (either
+        may be left out) that fall on ``weekdays`` (``0`` is Monday; every
+        day if left out). Later rates override earlier ones; other nights
+        cost the room's ``price``.
+        """
+        try:
+            stored = quote_service.set_rates(
+                room_id, [RoomRate(id=0, room_id=room_id, **r.dict()) for r in rates]
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return FastJSONResponse([quote_service.to_dict(r) for r in stored])
+
+    @app.get("/rooms/{room_id}/quote")
+    def quote(room_id: int, check_in: date, check_out: date) -> dict:
+        """Price a stay in a room, with the price of every night."""
+        try:
+            return FastJSONResponse(quote_service.quote(room_id, check_in, check_out))
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+    @app.get("/quotes")
+    def quotes(
+        check_in: date, check_out: date, room_id: list[int] = Query(...)
+    ) -> dict:
+        """Price the same stay in every repeated ``room_id``.
+
+        Rooms that cannot be quoted, e.g. because the stay is shorter than
+        their minimum, are listed in ``errors`` instead.
+        """
+        try:
+            found, errors = quote_service.quote_many(room_id, check_in, check_out)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return FastJSONResponse(
+            {
+                "quotes": found,
+                "errors": [
+                    {"room_id": room, "detail": detail}
+                    for room, detail in errors.items()
+                ],
+            }
+        )
 
 
-app = create_app()
+def __getattr__(name: str):
+    # ``app`` is built on first access so importing this module stays cheap.
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
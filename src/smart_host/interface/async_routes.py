@@ -0,0 +1,324 @@
+"""Resource routes served by ``async def`` handlers.
+
+They expose the same endpoints as the blocking routes registered by
+:func:`smart_host.interface.api.create_app`, but await the asyncio
+repositories so no threadpool worker is held while the database works.
+"""
+
+from __future__ import annotations
+
+from datetime import date
+
+from fastapi import Body, FastAPI, HTTPException, Query, Request
+
+from ..domain import Host, Room, BookingConflictError
+from ..infrastructure.async_repository import (
+    AsyncBookingRepository,
+    AsyncHostRepository,
+    AsyncPropertyRepository,
+    async_init_db,
+    async_session_factories,
+)
+from ..infrastructure.group_commit import (
+    AsyncGroupCommitBookingRepository,
+    GroupCommitBookingRepository,
+)
+from ..infrastructure.sql.engine import create_async_engines
+from ..service import AsyncBookingService, HostService, PropertyService
+from .responses import (
+    FastJSONResponse,
+    batch_report,
+    changes_response,
+    etag,
+    ndjson_response,
+    not_modified,
+    page_response,
+    parse_items,
+    tagged,
+    wants_ndjson,
+)
+from .schemas import BookingIn, HostIn, RoomIn
+
+
+def register_async_routes(
+    app: FastAPI,
+    host_service: HostService,
+    property_service: PropertyService,
+    auto_migrate: bool = True,
+    booking_writer: GroupCommitBookingRepository | None = None,
+) -> None:
+    """Register the asyncio resource routes and their engine lifecycle.
+
+    With a ``booking_writer`` single bookings are awaited from its group
+    commits instead of committed one by one.
+    """
+    write_engine, read_engine = create_async_engines()
+    session_factory, read_session_factory = async_session_factories(
+        write_engine, read_engine
+    )
+    repository = AsyncHostRepository(session_factory, read_session_factory)
+    prop_repo = AsyncPropertyRepository(session_factory, read_session_factory)
+    booking_repo = AsyncBookingRepository(session_factory, read_session_factory)
+    if booking_writer is not None:
+        booking_repo = AsyncGroupCommitBookingRepository(booking_repo, booking_writer)
+    booking_service = AsyncBookingService(booking_repo)
+
+    if auto_migrate:
+
+        @app.on_event("startup")
+        async def init_async_db() -> None:
+            # A no-op after the blocking migration except for in-memory
+            # SQLite, where the async engine holds its own database.
+            await async_init_db(write_engine)
+
+    @app.on_event("shutdown")
+    async def dispose_async_engines() -> None:
+        await write_engine.dispose()
+        if read_engine is not write_engine:
+            await read_engine.dispose()
+
+    @app.get("/hosts")
+    async def list_hosts(
+        request: Request,
+        limit: int | None = Query(None, ge=1),
+        after: int | None = None,
+    ) -> list[dict]:
+        """Return hosts in repository, one keyset page at a time."""
+        if wants_ndjson(request):
+            return ndjson_response(
+                repository.iter_hosts(after=after), host_service.to_dict, limit
+            )
+        hosts = await repository.list_hosts(limit=limit, after=after)
+        return page_response(hosts, host_service.to_dict, limit)
+
+    @app.post("/hosts")
+    async def add_host(name: str) -> dict:
+        """Add a host by name and return it."""
+        host = Host(name=name)
+        await repository.add(host)
+        return FastJSONResponse(host_service.to_dict(host))
+
+    @app.post("/hosts/batch")
+    async def add_hosts(items: list[dict] = Body(...)) -> dict:
+        """Add many hosts in one transaction."""
+        parsed, errors = parse_items(HostIn, items)
+        hosts = await repository.add_many(
+            [Host(name=item.name, rating=item.rating) for _, item in parsed]
+        )
+        return batch_report([host_service.to_dict(h) for h in hosts], errors)
+
+    @app.post("/properties")
+    async def add_property(name: str, location: str) -> dict:
+        """Create a property and return it."""
+        prop = await prop_repo.add_property(name=name, location=location)
+        return FastJSONResponse(property_service.to_dict(prop))
+
+    @app.get("/properties")
+    async def list_properties(
+        request: Request,
+        limit: int | None = Query(None, ge=1),
+        after: int | None = None,
+        since: int | None = Query(None, ge=0),
+    ) -> list[dict]:
+        """List properties, one keyset page at a time.
+
+        Responses carry an ``ETag`` that every write changes; requests whose
+        ``If-None-Match`` still holds it get an empty ``304``. With ``since``
+        only the properties changed after that version are listed, in the
+        order they changed, and ``X-Version`` holds the ``since`` of the next
+        request; ``since=0`` lists them all.
+        """
+        tag = etag(request, await prop_repo.properties_version())
+        if (unchanged := not_modified(request, tag)) is not None:
+            return unchanged
+        if since is not None:
+            props, version = await prop_repo.properties_since(since, limit)
+            response = changes_response(
+                request, props, property_service.to_dict, version
+            )
+        elif wants_ndjson(request):
+            response = ndjson_response(
+                prop_repo.iter_properties(after=after),
+                property_service.to_dict,
+                limit,
+            )
+        else:
+            props = await prop_repo.list_properties(limit=limit, after=after)
+            response = page_response(props, property_service.to_dict, limit)
+        return tagged(response, tag)
+
+    @app.post("/properties/{property_id}/rooms")
+    async def add_room(
+        property_id: int,
+        beds: int = 1,
+        features: str | None = None,
+        price: float = 0.0,
+    ) -> dict:
+        """Add a room to a property."""
+        room = await prop_repo.add_room(
+            property_id, beds, features=features, price=price
+        )
+        return FastJSONResponse(property_service.to_dict(room))
+
+    @app.post("/properties/{property_id}/rooms/batch")
+    async def add_rooms(property_id: int, items: list[dict] = Body(...)) -> dict:
+        """Add many rooms to a property in one transaction."""
+        parsed, errors = parse_items(RoomIn, items)
+        rooms = await prop_repo.add_rooms(
+            [
+                Room(id=0, property_id=property_id, **item.dict())
+                for _, item in parsed
+            ]
+        )
+        return batch_report([property_service.to_dict(r) for r in rooms], errors)
+
+    @app.get("/properties/{property_id}/rooms")
+    async def list_rooms(
+        property_id: int,
+        request: Request,
+        limit: int | None = Query(None, ge=1),
+        after: int | None = None,
+        since: int | None = Query(None, ge=0),
+        features_query: str | None = None,
+    ) -> list[dict]:
+        """List rooms for a property, one keyset page at a time.
+
+        Entity tags and ``since`` work as for ``GET /properties``.
+        ``features_query`` keeps the rooms whose features match it, as for
+        ``GET /rooms/search``; it cannot be combined with ``since``.
+        """
+        if since is not None and features_query is not None:
+            raise HTTPException(
+                status_code=400, detail="since cannot be combined with features_query"
+            )
+        tag = etag(request, *await prop_repo.rooms_version(property_id))
+        if (unchanged := not_modified(request, tag)) is not None:
+            return unchanged
+        if since is not None:
+            rooms, version = await prop_repo.rooms_since(since, property_id, limit)
+            response = changes_response(
+                request, rooms, property_service.to_dict, version
+            )
+        else:
+            try:
+                if wants_ndjson(request):
+                    response = ndjson_response(
+                        prop_repo.iter_rooms(property_id, after, features_query),
+                        property_service.to_dict,
+                        limit,
+                    )
+                else:
+                    rooms = await prop_repo.list_rooms(
+                        property_id, limit, after, features_query
+                    )
+                    response = page_response(rooms, property_service.to_dict, limit)
+            except ValueError as exc:
+                raise HTTPException(status_code=400, detail=str(exc))
+        return tagged(response, tag)
+
+    @app.get("/rooms/search")
+    async def search_rooms(
+        location: str | None = None,
+        min_beds: int | None = Query(None, ge=1),
+        min_price: float | None = Query(None, ge=0),
+        max_price: float | None = Query(None, ge=0),
+        features: list[str] = Query([]),
+        sort: str = "price",
+        limit: int = Query(50, ge=1, le=500),
+        features_query: str | None = None,
+    ) -> list[dict]:
+        """Search rooms of all properties.
+
+        Every given filter must match; ``features`` may be repeated and each
+        must appear in the room's features. ``features_query`` is a
+        full-text query over the features: its words must all match unless
+        ``OR`` stands between them, ``sea*`` matches words starting with
+        ``sea`` and quoted words match as a phrase. ``sort`` is ``price``,
+        ``beds`` or ``id``, prefixed with ``-`` for descending order.
+        """
+        try:
+            rooms = await prop_repo.search_rooms(
+                location,
+                min_beds,
+                min_price,
+                max_price,
+                features=features,
+                sort=sort,
+                limit=limit,
+                features_query=features_query,
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return FastJSONResponse([property_service.to_dict(r) for r in rooms])
+
+    @app.post("/bookings")
+    async def create_booking(
+        room_id: int,
+        guest_name: str,
+        language: str,
+        check_in: date,
+        check_out: date,
+    ) -> dict:
+        """Create a booking for a room."""
+        try:
+            booking = await booking_service.create_booking(
+                room_id,
+                guest_name,
+                language,
+                check_in,
+                check_out,
+            )
+        except BookingConflictError as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+        return FastJSONResponse(booking_service.to_dict(booking))
+
+    @app.post("/bookings/batch")
+    async def create_bookings(items: list[dict] = Body(...)) -> dict:
+        """Create many bookings in one transaction."""
+        parsed, errors = parse_items(BookingIn, items)
+        created, rejected = await booking_service.create_bookings(
+            [item.dict() for _, item in parsed]
+        )
+        for batch_index, detail in rejected.items():
+            errors[parsed[batch_index][0]] = detail
+        return batch_report([booking_service.to_dict(b) for b in created], errors)
+
+    @app.get("/bookings")
+    async def list_bookings(
+        request: Request,
+        limit: int | None = Query(None, ge=1),
+        after: int | None = None,
+        include_archived: bool = False,
+        since: int | None = Query(None, ge=0),
+    ) -> list[dict]:
+        """Return bookings, one keyset page at a time.
+
+        Archived bookings are only listed with ``include_archived``.
+        Entity tags and ``since`` work as for ``GET /properties``; ``since``
+        lists live bookings only and is not supported with shards.
+        """
+        tag = etag(request, await booking_service.bookings_version())
+        if (unchanged := not_modified(request, tag)) is not None:
+            return unchanged
+        if since is not None:
+            bookings, version = await booking_service.bookings_since(since, limit)
+            response = changes_response(
+                request, bookings, booking_service.to_dict, version
+            )
+        elif wants_ndjson(request):
+            response = ndjson_response(
+                booking_service.iter_bookings(
+                    after=after, include_archived=include_archived
+                ),
+                booking_service.to_dict,
+                limit,
+            )
+        else:
+            bookings = await booking_service.list_bookings(
+                limit=limit, after=after, include_archived=include_archived
+            )
+            response = page_response(bookings, booking_service.to_dict, limit)
+        return tagged(response, tag)
@@ -0,0 +1,327 @@
+"""Streaming CSV, Arrow and Parquet exports and bulk imports.
+
+``GET /export/{entity}`` streams a whole table, encoding one chunk of
+:data:`EXPORT_CHUNK_ROWS` rows at a time as it is read from a server-side
+cursor, so an export holds a single chunk in memory however many rows it
+has. ``POST /import/{entity}`` spools the uploaded file to a temporary file
+and upserts its records in batches, see :class:`~..service.BulkService`.
+Arrow and Parquet need ``pyarrow`` (``pip install .[parquet]``); CSV works
+without it. The same conversions are available from the command line::
+
+    python -m smart_host.interface.bulk export bookings bookings.parquet
+    python -m smart_host.interface.bulk import bookings bookings.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import sys
+import tempfile
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from pathlib import Path
+from typing import BinaryIO
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from ..config import BOOKING_SHARDS, IMPORT_BATCH_SIZE
+from ..service import BulkService
+from ..service.bulk_service import ENTITIES
+from .responses import FastJSONResponse
+
+EXPORT_CHUNK_ROWS = 10_000
+"""Rows encoded per chunk of an export."""
+
+UPLOAD_SPOOL_SIZE = 8 * 1024 * 1024
+"""Bytes of an upload kept in memory before it is spooled to disk."""
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+"""Supported file formats and their media types."""
+
+_SUFFIXES = {
+    ".csv": "csv",
+    ".arrow": "arrow",
+    ".arrows": "arrow",
+    ".parquet": "parquet",
+}
+
+_ARROW_TYPES = {
+    "rating": "float64",
+    "price": "float64",
+    "check_in": "date32",
+    "check_out": "date32",
+    "name": "string",
+    "location": "string",
+    "features": "string",
+    "guest_name": "string",
+    "language": "string",
+}
+"""Arrow types of the exported columns; the others are ``int64`` ids."""
+
+
+def check_format(fmt: str) -> None:
+    """Raise ``ValueError`` unless ``fmt`` can be read and written here."""
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(
+            f"unknown format {fmt!r}, expected one of {', '.join(MEDIA_TYPES)}"
+        )
+    if fmt != "csv":
+        _pyarrow(fmt)
+
+
+def format_of(path: str) -> str:
+    """Return the format of the file ``path`` by its suffix."""
+    try:
+        return _SUFFIXES[Path(path).suffix.lower()]
+    except KeyError:
+        raise ValueError(f"cannot tell the format of {path!r}") from None
+
+
+def _pyarrow(fmt: str):
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ValueError(
+            f"{fmt} files require pyarrow, install it with pip install .[parquet]"
+        ) from None
+    return pyarrow
+
+
+def _chunks(rows: Iterable[tuple], size: int) -> Iterator[list[tuple]]:
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def encode(
+    fmt: str,
+    columns: tuple[str, ...],
+    rows: Iterable[tuple],
+    chunk_rows: int = EXPORT_CHUNK_ROWS,
+) -> Iterator[bytes]:
+    """Encode ``rows`` of ``columns`` as a ``fmt`` file, chunk by chunk.
+
+    Raises ``ValueError`` right away for an unsupported format.
+    """
+    check_format(fmt)
+    if fmt == "csv":
+        return _csv_chunks(columns, rows, chunk_rows)
+    return _arrow_chunks(fmt, columns, rows, chunk_rows)
+
+
+def _csv_chunks(
+    columns: tuple[str, ...], rows: Iterable[tuple], chunk_rows: int
+) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for chunk in _chunks(rows, chunk_rows):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file collecting what a pyarrow writer produced so far."""
+
+    def __init__(self) -> None:
+        self._parts: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _arrow_chunks(
+    fmt: str, columns: tuple[str, ...], rows: Iterable[tuple], chunk_rows: int
+) -> Iterator[bytes]:
+    pa = _pyarrow(fmt)
+    schema = pa.schema(
+        [(name, getattr(pa, _ARROW_TYPES.get(name, "int64"))()) for name in columns]
+    )
+    sink = _Sink()
+    if fmt == "parquet":
+        writer = pa.parquet.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    with writer:
+        for chunk in _chunks(rows, chunk_rows):
+            arrays = [
+                pa.array(values, type=field.type)
+                for values, field in zip(zip(*chunk), schema)
+            ]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def decode(fmt: str, file: BinaryIO) -> Iterator[dict]:
+    """Yield the records of the ``fmt`` file ``file`` as dicts."""
+    check_format(fmt)
+    if fmt == "csv":
+        yield from csv.DictReader(
+            io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+        )
+        return
+    pa = _pyarrow(fmt)
+    if fmt == "parquet":
+        batches = pa.parquet.ParquetFile(file).iter_batches(EXPORT_CHUNK_ROWS)
+    else:
+        batches = pa.ipc.open_stream(file)
+    for batch in batches:
+        yield from batch.to_pylist()
+
+
+def register_bulk_routes(app: FastAPI, service: BulkService) -> None:
+    """Register the export and import routes.
+
+    They use the blocking repositories in both database modes: exports are
+    iterated in the threadpool and imports run there once uploaded.
+    """
+
+    @app.get("/export/{entity}")
+    def export(
+        entity: str, format: str = "csv", include_archived: bool = False
+    ) -> StreamingResponse:
+        """Stream every ``hosts``, ``properties``, ``rooms`` or ``bookings`` row.
+
+        Archived bookings are only exported with ``include_archived``.
+        """
+        try:
+            columns = service.columns(entity)
+            chunks = encode(
+                format, columns, service.export_rows(entity, include_archived)
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        return StreamingResponse(
+            chunks,
+            media_type=MEDIA_TYPES[format],
+            headers={
+                "Content-Disposition": f'attachment; filename="{entity}.{format}"'
+            },
+        )
+
+    @app.post("/import/{entity}")
+    async def import_records(
+        entity: str,
+        request: Request,
+        format: str = "csv",
+        batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1),
+    ) -> dict:
+        """Upsert the records of the uploaded file in batches.
+
+        Records with an ``id`` replace the stored row of that id. Returns
+        the ``imported`` and ``rejected`` counts and the first ``errors``
+        with their 1-based record number.
+        """
+        try:
+            service.columns(entity)
+            check_format(format)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        with tempfile.SpooledTemporaryFile(UPLOAD_SPOOL_SIZE) as upload:
+            async for chunk in request.stream():
+                upload.write(chunk)
+            upload.seek(0)
+            try:
+                report = await run_in_threadpool(
+                    service.import_rows, entity, decode(format, upload), batch_size
+                )
+            except (ValueError, csv.Error) as exc:
+                raise HTTPException(status_code=400, detail=str(exc))
+        report["errors"] = [
+            {"record": number, "detail": detail}
+            for number, detail in report["errors"].items()
+        ]
+        return FastJSONResponse(report)
+
+
+def _bulk_service() -> BulkService:
+    from ..infrastructure import BookingRepository, HostRepository, PropertyRepository
+
+    if BOOKING_SHARDS:
+        from ..infrastructure.shards import ShardedBookingRepository, ShardRouter
+
+        bookings = ShardedBookingRepository(ShardRouter(BOOKING_SHARDS))
+    else:
+        bookings = BookingRepository()
+    return BulkService(HostRepository(), PropertyRepository(), bookings)
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Command line entry point exporting or importing one entity."""
+    parser = argparse.ArgumentParser(
+        description="Export or import Smart Host tables as CSV, Arrow or Parquet."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write every row to a file")
+    export.add_argument(
+        "--include-archived", action="store_true", help="export archived bookings"
+    )
+    load = commands.add_parser("import", help="upsert the records of a file")
+    load.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    for command in (export, load):
+        command.add_argument("entity", choices=list(ENTITIES))
+        command.add_argument("path", help="file path, or - for standard streams")
+        command.add_argument(
+            "--format", choices=list(MEDIA_TYPES), help="default: by file suffix"
+        )
+    args = parser.parse_args(argv)
+    try:
+        fmt = args.format or format_of(args.path)
+        check_format(fmt)
+    except ValueError as exc:
+        parser.error(str(exc))
+    service = _bulk_service()
+
+    if args.command == "export":
+        rows = service.export_rows(args.entity, args.include_archived)
+        chunks = encode(fmt, service.columns(args.entity), rows)
+        if args.path == "-":
+            sys.stdout.buffer.writelines(chunks)
+            return
+        with open(args.path, "wb") as out:
+            out.writelines(chunks)
+        return
+    if args.path == "-":
+        report = service.import_rows(
+            args.entity, decode(fmt, sys.stdin.buffer), args.batch_size
+        )
+    else:
+        with open(args.path, "rb") as source:
+            report = service.import_rows(
+                args.entity, decode(fmt, source), args.batch_size
+            )
+    print(f"imported {report['imported']}, rejected {report['rejected']}")
+    for number, error in report["errors"].items():
+        print(f"record {number}: {error}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
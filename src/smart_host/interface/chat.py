@@ -0,0 +1,252 @@
+"""WebSocket chat between the guests and hosts of a property or booking.
+
+Every connection subscribes to ``property:<id>`` and/or ``booking:<id>``
+channels and owns a bounded queue drained by a single writer task. Publishing
+encodes a message once and puts it on each subscriber's queue without
+waiting, so one message never costs a task or a thread. A subscriber whose
+queue is full cannot keep up and is closed rather than buffered without
+limit. A publisher's next frame is only read once its message has been
+queued, so flooding clients are held back by TCP flow control.
+
+One heartbeat task per hub pings connections that have gone quiet and
+closes those that stay silent past the idle timeout, which also cleans up
+peers that vanished without a close frame.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from fastapi import WebSocket
+
+from ..config import CHAT_HEARTBEAT_SECONDS, CHAT_IDLE_TIMEOUT, CHAT_QUEUE_SIZE
+from .responses import dumps
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 2000
+ROLES = ("guest", "host")
+
+GOING_AWAY = 1001
+POLICY_VIOLATION = 1008
+TRY_AGAIN_LATER = 1013
+
+PING = dumps({"type": "ping"}).decode()
+
+
+class _Close(NamedTuple):
+    code: int
+    reason: str
+
+
+def channels_for(property_id: int | None, booking_id: int | None) -> tuple[str, ...]:
+    """Return the channel names of a property and a booking."""
+    channels = []
+    if property_id is not None:
+        channels.append(f"property:{property_id}")
+    if booking_id is not None:
+        channels.append(f"booking:{booking_id}")
+    return tuple(channels)
+
+
+def _parse(conn: Connection, text: str | None) -> dict | None:
+    """Return the message a client frame publishes, ``None`` for a pong."""
+    try:
+        data = json.loads(text) if text is not None else None
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        raise ValueError("frames must be JSON objects")
+    kind = data.get("type", "message")
+    if kind == "pong":
+        return None
+    if kind != "message":
+        raise ValueError(f"unknown frame type {kind!r}")
+    channel = data.get("channel")
+    if channel is None and len(conn.channels) == 1:
+        channel = conn.channels[0]
+    if channel not in conn.channels:
+        raise ValueError("channel must be one of the subscribed channels")
+    body = data.get("text")
+    if not isinstance(body, str) or not body.strip():
+        raise ValueError("text must be a non-empty string")
+    if len(body) > MAX_MESSAGE_LENGTH:
+        raise ValueError(f"text exceeds {MAX_MESSAGE_LENGTH} characters")
+    return {
+        "type": "message",
+        "channel": channel,
+        "from": conn.name,
+        "role": conn.role,
+        "text": body,
+        "sent_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+class Connection:
+    """One subscribed WebSocket and its bounded send queue."""
+
+    __slots__ = ("websocket", "name", "role", "channels", "queue", "last_seen")
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        name: str,
+        role: str,
+        channels: tuple[str, ...],
+        queue_size: int,
+    ) -> None:
+        self.websocket = websocket
+        self.name = name
+        self.role = role
+        self.channels = channels
+        self.queue: asyncio.Queue[str | _Close] = asyncio.Queue(queue_size)
+        self.last_seen = time.monotonic()
+
+    def offer(self, frame: str) -> bool:
+        """Queue ``frame`` unless the queue is full."""
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def close(self, code: int, reason: str) -> None:
+        """Drop pending frames and make the writer close the socket."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(_Close(code, reason))
+
+
+class ChatHub:
+    """Channel subscriptions and message fan-out of one process."""
+
+    def __init__(
+        self,
+        queue_size: int = CHAT_QUEUE_SIZE,
+        heartbeat_seconds: float = CHAT_HEARTBEAT_SECONDS,
+        idle_timeout: float = CHAT_IDLE_TIMEOUT,
+    ) -> None:
+        self.queue_size = queue_size
+        self.heartbeat_seconds = heartbeat_seconds
+        self.idle_timeout = idle_timeout
+        self.evictions = 0
+        self._channels: dict[str, set[Connection]] = {}
+        self._connections: set[Connection] = set()
+        self._heartbeat: asyncio.Task | None = None
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self._connections),
+            "channels": len(self._channels),
+            "evictions": self.evictions,
+        }
+
+    def subscribe(self, conn: Connection) -> None:
+        self._connections.add(conn)
+        for channel in conn.channels:
+            self._channels.setdefault(channel, set()).add(conn)
+
+    def unsubscribe(self, conn: Connection) -> None:
+        self._connections.discard(conn)
+        for channel in conn.channels:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(conn)
+                if not subscribers:
+                    del self._channels[channel]
+
+    def publish(self, channel: str, message: dict) -> int:
+        """Queue ``message`` for every subscriber of ``channel``.
+
+        Returns the number of subscribers it was queued for; those with a
+        full queue are evicted instead.
+        """
+        frame = dumps(message).decode()
+        delivered = 0
+        for conn in tuple(self._channels.get(channel, ())):
+            if conn.offer(frame):
+                delivered += 1
+            else:
+                self.evict(conn, TRY_AGAIN_LATER, "slow consumer")
+        return delivered
+
+    def evict(self, conn: Connection, code: int, reason: str) -> None:
+        """Unsubscribe ``conn`` and close it with ``code``."""
+        if conn not in self._connections:
+            return
+        self.unsubscribe(conn)
+        self.evictions += 1
+        logger.info("closing chat connection of %s: %s", conn.name, reason)
+        conn.close(code, reason)
+
+    def sweep(self, now: float | None = None) -> None:
+        """Ping quiet connections and close those idle past the timeout."""
+        now = time.monotonic() if now is None else now
+        for conn in tuple(self._connections):
+            idle = now - conn.last_seen
+            if idle >= self.idle_timeout:
+                self.evict(conn, GOING_AWAY, "idle")
+            elif idle >= self.heartbeat_seconds and not conn.offer(PING):
+                self.evict(conn, TRY_AGAIN_LATER, "slow consumer")
+
+    async def serve(
+        self, websocket: WebSocket, channels: tuple[str, ...], name: str, role: str
+    ) -> None:
+        """Run one accepted connection until either side closes it."""
+        conn = Connection(websocket, name, role, channels, self.queue_size)
+        self.subscribe(conn)
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._beat())
+        writer = asyncio.create_task(self._write(conn))
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                conn.last_seen = time.monotonic()
+                self._handle(conn, message.get("text"))
+        finally:
+            self.unsubscribe(conn)
+            writer.cancel()
+
+    def _handle(self, conn: Connection, text: str | None) -> None:
+        try:
+            message = _parse(conn, text)
+        except ValueError as exc:
+            if not conn.offer(dumps({"type": "error", "detail": str(exc)}).decode()):
+                self.evict(conn, TRY_AGAIN_LATER, "slow consumer")
+            return
+        if message is not None:
+            self.publish(message["channel"], message)
+
+    async def _write(self, conn: Connection) -> None:
+        try:
+            while True:
+                frame = await conn.queue.get()
+                if isinstance(frame, _Close):
+                    await conn.websocket.close(frame.code, frame.reason)
+                    return
+                await conn.websocket.send_text(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The peer is gone; the reader sees the disconnect and cleans up.
+            logger.debug("chat send to %s failed", conn.name, exc_info=True)
+
+    async def _beat(self) -> None:
+        while self._connections:
+            await asyncio.sleep(self.heartbeat_seconds)
+            self.sweep()
+
+    async def close(self) -> None:
+        """Close every connection, e.g. on shutdown."""
+        for conn in tuple(self._connections):
+            self.unsubscribe(conn)
+            conn.close(GOING_AWAY, "server shutdown")
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
@@ -0,0 +1,309 @@
+"""Request and SQL instrumentation exposed in Prometheus text format.
+
+:class:`MetricsMiddleware` times every HTTP request by route template and
+counts responses by status. SQL statements executed while a request is
+handled are attributed to it through a context variable, which follows the
+request into threadpool workers and asyncio sessions alike. Requests slower
+than ``SLOW_REQUEST_MS`` are logged with their statements grouped by text,
+so repeated statements (N+1 patterns) and statements waiting on database
+locks stand out.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import Engine, event
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+@dataclass
+class RequestStats:
+    """SQL executed on behalf of one request."""
+
+    queries: int = 0
+    seconds: float = 0.0
+    statements: dict[str, list[float]] = field(
+        default_factory=lambda: defaultdict(lambda: [0, 0.0])
+    )
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.queries += 1
+        self.seconds += seconds
+        entry = self.statements[statement]
+        entry[0] += 1
+        entry[1] += seconds
+
+    def breakdown(self, top: int = 5) -> str:
+        """Return the slowest statements as ``count x total ms: sql`` lines."""
+        ranked = sorted(self.statements.items(), key=lambda kv: -kv[1][1])[:top]
+        return "\n".join(
+            f"  {count}x {seconds * 1000:.1f} ms: {' '.join(sql.split())[:200]}"
+            for sql, (count, seconds) in ranked
+        )
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar(
+    "current_request", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    if current_request.get() is not None and context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    stats = current_request.get()
+    started = getattr(context, "_metrics_started", None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+_hooks_installed = False
+
+
+def install_sql_hooks() -> None:
+    """Attribute the statements of every engine to the current request."""
+    global _hooks_installed
+    if not _hooks_installed:
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        _hooks_installed = True
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def header(self, kind: str) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic count per label set."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: dict[tuple, float] = defaultdict(float)
+
+    def inc(self, *labels, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] += amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header("counter") + [
+            f"{self.name}{_labels(self.labels, key)} {value:g}" for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, without labels."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.value = 0.0
+
+    def add(self, amount: float) -> None:
+        with self._lock:
+            self.value += amount
+
+    def render(self) -> list[str]:
+        return self.header("gauge") + [f"{self.name} {self.value:g}"]
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count per label set."""
+
+    def __init__(self, *args, buckets: tuple[float, ...], **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = buckets
+        self._values: dict[tuple, list[float]] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # One slot per bucket, then +Inf, then the sum.
+                counts = self._values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        lines = self.header("histogram")
+        names = self.labels + ("le",)
+        bounds = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+        for key, counts in items:
+            for bound, count in zip(bounds, counts):
+                labels = _labels(names, key + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {counts[-1]:g}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {counts[-2]}")
+        return lines
+
+
+class Metrics:
+    """The application's metrics and their text exposition."""
+
+    def __init__(self) -> None:
+        self.requests = Counter(
+            "http_requests_total",
+            "HTTP responses by route and status.",
+            ("method", "route", "status"),
+        )
+        self.latency = Histogram(
+            "http_request_duration_seconds",
+            "HTTP request latency by route.",
+            ("method", "route"),
+            buckets=LATENCY_BUCKETS,
+        )
+        self.in_flight = Gauge(
+            "http_requests_in_flight", "HTTP requests currently being handled."
+        )
+        self.db_queries = Histogram(
+            "http_request_db_queries",
+            "SQL statements executed per request by route.",
+            ("method", "route"),
+            buckets=QUERY_COUNT_BUCKETS,
+        )
+        self.db_latency = Histogram(
+            "http_request_db_duration_seconds",
+            "Time spent executing SQL per request by route.",
+            ("method", "route"),
+            buckets=LATENCY_BUCKETS,
+        )
+        self._extra: list[_Metric] = []
+        self._callbacks: list[tuple[str, str, str, Callable[[], float]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Render ``metric`` along with the request metrics and return it."""
+        self._extra.append(metric)
+        return metric
+
+    def register_callback(
+        self, name: str, kind: str, help: str, read: Callable[[], float]
+    ) -> None:
+        """Expose the value returned by ``read`` at scrape time."""
+        self._callbacks.append((name, kind, help, read))
+
+    def register_cache(self, prefix: str, stats: Callable[[], dict]) -> None:
+        """Expose the ``hits``/``misses``/``evictions``/``size`` of a cache."""
+        for key in ("hits", "misses", "evictions"):
+            self.register_callback(
+                f"{prefix}_{key}_total",
+                "counter",
+                f"Cache {key}.",
+                lambda key=key: stats()[key],
+            )
+        self.register_callback(
+            f"{prefix}_entries", "gauge", "Cached entries.", lambda: stats()["size"]
+        )
+
+    def observe_request(
+        self,
+        method: str,
+        route: str,
+        status: int,
+        seconds: float,
+        stats: RequestStats,
+    ) -> None:
+        self.requests.inc(method, route, status)
+        self.latency.observe(seconds, method, route)
+        self.db_queries.observe(stats.queries, method, route)
+        self.db_latency.observe(stats.seconds, method, route)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in (
+            self.requests,
+            self.latency,
+            self.in_flight,
+            self.db_queries,
+            self.db_latency,
+            *self._extra,
+        ):
+            lines.extend(metric.render())
+        for name, kind, help, read in self._callbacks:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            lines.append(f"{name} {read():g}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware feeding :class:`Metrics` and logging slow requests."""
+
+    def __init__(self, app, metrics: Metrics, slow_request_ms: float) -> None:
+        self.app = app
+        self.metrics = metrics
+        self.slow_seconds = slow_request_ms / 1000
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        self.metrics.in_flight.add(1)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.metrics.in_flight.add(-1)
+            current_request.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            self.metrics.observe_request(method, route, status, elapsed, stats)
+            if elapsed >= self.slow_seconds:
+                logger.warning(
+                    "slow request %s %s -> %s in %.1f ms; %d queries, %.1f ms SQL\n%s",
+                    method,
+                    scope["path"],
+                    status,
+                    elapsed * 1000,
+                    stats.queries,
+                    stats.seconds * 1000,
+                    stats.breakdown(),
+                )
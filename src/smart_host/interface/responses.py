@@ -0,0 +1,180 @@
+"""Response helpers shared by the sync and async routes."""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterable, Callable, Iterable
+from datetime import date
+from itertools import islice
+import json
+from typing import Any
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+
+try:  # Optional dependency for faster encoding
+    import orjson
+except ImportError:  # pragma: nocover
+    orjson = None
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _default(obj: Any) -> str:
+    if isinstance(obj, date):
+        return obj.isoformat()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+_encode = json.JSONEncoder(
+    ensure_ascii=False, separators=(",", ":"), default=_default
+).encode
+
+
+def dumps(data: Any) -> bytes:
+    """Encode ``data`` as compact UTF-8 JSON; dates become ISO strings."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return _encode(data).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by :func:`dumps`.
+
+    Routes return it directly with plain dicts so FastAPI skips response
+    model validation and ``jsonable_encoder``.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def wants_ndjson(request: Request) -> bool:
+    """Return whether the client opted into newline-delimited JSON."""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _ndjson_line(data: dict) -> bytes:
+    return dumps(data) + b"\n"
+
+
+async def _async_lines(
+    items: AsyncIterable, to_dict: Callable[[object], dict], limit: int | None
+):
+    count = 0
+    async for item in items:
+        if limit is not None and count >= limit:
+            break
+        yield _ndjson_line(to_dict(item))
+        count += 1
+
+
+def ndjson_response(
+    items: Iterable | AsyncIterable,
+    to_dict: Callable[[object], dict],
+    limit: int | None,
+) -> StreamingResponse:
+    """Stream ``items`` as one JSON document per line.
+
+    ``items`` may be a regular or an asynchronous iterable.
+    """
+    if hasattr(items, "__aiter__"):
+        return StreamingResponse(
+            _async_lines(items, to_dict, limit), media_type=NDJSON_MEDIA_TYPE
+        )
+    if limit is not None:
+        items = islice(items, limit)
+    lines = (_ndjson_line(to_dict(item)) for item in items)
+    return StreamingResponse(lines, media_type=NDJSON_MEDIA_TYPE)
+
+
+def page_response(
+    items: list, to_dict: Callable[[object], dict], limit: int | None
+) -> FastJSONResponse:
+    """Return one page of ``items``.
+
+    Full pages advertise the ``after`` value of the next page in the
+    ``X-Next-After`` header.
+    """
+    response = FastJSONResponse([to_dict(item) for item in items])
+    if limit is not None and len(items) == limit:
+        response.headers["X-Next-After"] = str(items[-1].id)
+    return response
+
+
+def etag(request: Request, *version: int) -> str:
+    """Return the weak entity tag of a listing at change ``version``.
+
+    JSON and NDJSON representations of a listing get different tags.
+    """
+    kind = "ndjson" if wants_ndjson(request) else "json"
+    return f'W/"{".".join(map(str, version))}-{kind}"'
+
+
+def not_modified(request: Request, tag: str) -> Response | None:
+    """Return a ``304`` response if ``If-None-Match`` lists ``tag``.
+
+    Tags are compared weakly, as ``If-None-Match`` asks for.
+    """
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return None
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    if "*" in tags or tag.removeprefix("W/") in tags:
+        return Response(status_code=304, headers={"ETag": tag})
+    return None
+
+
+def tagged(response: Response, tag: str) -> Response:
+    """Set the ``ETag`` header of ``response`` and return it."""
+    response.headers["ETag"] = tag
+    return response
+
+
+def changes_response(
+    request: Request,
+    items: list,
+    to_dict: Callable[[object], dict],
+    version: int,
+) -> Response:
+    """Return the rows of a ``since`` query, as NDJSON if asked for.
+
+    ``X-Version`` holds the ``since`` value of the next query.
+    """
+    if wants_ndjson(request):
+        response = ndjson_response(items, to_dict, None)
+    else:
+        response = FastJSONResponse([to_dict(item) for item in items])
+    response.headers["X-Version"] = str(version)
+    return response
+
+
+def parse_items(
+    model: type[BaseModel], items: list[dict]
+) -> tuple[list[tuple[int, BaseModel]], dict[int, str]]:
+    """Validate batch ``items`` one by one.
+
+    Returns the parsed items with their position and the validation errors
+    keyed by position, so one bad entry does not reject the whole batch.
+    """
+    parsed: list[tuple[int, BaseModel]] = []
+    errors: dict[int, str] = {}
+    for index, item in enumerate(items):
+        try:
+            parsed.append((index, model.parse_obj(item)))
+        except ValidationError as exc:
+            errors[index] = str(exc)
+    return parsed, errors
+
+
+def batch_report(created: list[dict], errors: dict[int, str]) -> FastJSONResponse:
+    """Return the response of a batch endpoint."""
+    return FastJSONResponse(
+        {
+            "created": created,
+            "errors": [
+                {"index": index, "detail": detail}
+                for index, detail in sorted(errors.items())
+            ],
+        }
+    )
@@ -0,0 +1,41 @@
+"""Request bodies accepted by the API."""
+
+from datetime import date
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class HostIn(BaseModel):
+    """Host entry of a batch request."""
+
+    name: str
+    rating: float = 0.0
+
+
+class RoomIn(BaseModel):
+    """Room entry of a batch request."""
+
+    beds: int = 1
+    features: Optional[str] = None
+    price: float = 0.0
+
+
+class BookingIn(BaseModel):
+    """Booking entry of a batch request."""
+
+    room_id: int
+    guest_name: str
+    language: str
+    check_in: date
+    check_out: date
+
+
+class RateIn(BaseModel):
+    """Nightly rate of a room, see :class:`~smart_host.domain.RoomRate`."""
+
+    price: Optional[float] = None
+    min_nights: Optional[int] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
+    weekdays: Optional[list[int]] = None
@@ -0,0 +1,277 @@
+"""Pre-forking launcher behind ``python -m smart_host``.
+
+The parent process binds the listening socket, optionally builds the app
+once (``preload``) and forks the workers, which all accept connections from
+that socket. Database engines hand every forked worker its own connection
+pools, see :mod:`smart_host.infrastructure.sql.engine`. Each worker can warm
+up before it starts accepting: the ``WARMUP_PATHS`` are requested in
+process, which compiles their SQL, fills the listing caches and opens the
+pooled connections.
+
+The parent replaces workers that die, and reacts to signals:
+
+* ``SIGHUP`` forks a new set of workers and then stops the old ones
+  gracefully. Without ``preload`` the new workers import the app afresh
+  and so pick up code changes.
+* ``SIGTERM``/``SIGINT`` stop the workers gracefully and exit.
+"""
+
+from __future__ import annotations
+
+import logging
+import logging.config
+import os
+import select
+import signal
+import socket
+import time
+from collections.abc import Iterable
+
+import uvicorn
+from uvicorn.config import LOGGING_CONFIG
+from uvicorn.importer import import_from_string
+
+from .config import (
+    GRACEFUL_TIMEOUT,
+    HOST,
+    PORT,
+    PRELOAD,
+    WARMUP,
+    WARMUP_PATHS,
+    WORKERS,
+)
+
+logger = logging.getLogger("uvicorn.error")
+
+APP = "smart_host.interface.api:app"
+"""Import string of the served application."""
+
+BOOT_ERROR = 3
+"""Exit status of a worker whose app failed to start."""
+
+
+def load_app():
+    """Import and build the application."""
+    return import_from_string(APP)
+
+
+async def warm_up(app, paths: Iterable[str] = WARMUP_PATHS) -> None:
+    """Serve a ``GET`` of each of ``paths`` in process, discarding the body.
+
+    Requests go straight to the router, so they are neither counted in the
+    request metrics nor able to fail the worker: errors are only logged.
+    """
+    for target in paths:
+        path, _, query = target.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"warmup")],
+            "client": None,
+            "server": None,
+            "app": app,
+        }
+        status = []
+
+        async def receive() -> dict:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: dict) -> None:
+            if message["type"] == "http.response.start":
+                status.append(message["status"])
+
+        started = time.perf_counter()
+        try:
+            await app.router(scope, receive, send)
+        except Exception:
+            logger.warning("Warm-up of %s failed", target, exc_info=True)
+            continue
+        logger.info(
+            "Warmed up %s (%s) in %.1f ms",
+            target,
+            status[0] if status else "-",
+            (time.perf_counter() - started) * 1000,
+        )
+
+
+def serve(
+    host: str = HOST,
+    port: int = PORT,
+    workers: int = WORKERS,
+    preload: bool = PRELOAD,
+    warmup: bool = WARMUP,
+) -> int:
+    """Serve the API until stopped and return the exit status.
+
+    A single worker is served in this process without forking.
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    logging.config.dictConfig(LOGGING_CONFIG)
+    sock = socket.create_server((host, port), backlog=2048)
+    app = load_app() if preload or workers == 1 else None
+    if workers == 1:
+        return _run_worker(sock, app, warmup)
+    logger.info("Listening on http://%s:%d with %d workers", host, port, workers)
+    return _Arbiter(sock, app, workers, warmup).run()
+
+
+def _run_worker(sock: socket.socket, app, warmup: bool) -> int:
+    if app is None:
+        app = load_app()
+    if warmup:
+        # Startup handlers run before uvicorn accepts on the socket, and
+        # this one runs last, after the migrations.
+        async def warm_up_worker() -> None:
+            await warm_up(app)
+
+        app.add_event_handler("startup", warm_up_worker)
+    server = uvicorn.Server(
+        uvicorn.Config(app, timeout_graceful_shutdown=GRACEFUL_TIMEOUT)
+    )
+    server.run(sockets=[sock])
+    return 0 if server.started else BOOT_ERROR
+
+
+class _Arbiter:
+    """Fork, watch and replace the worker processes."""
+
+    def __init__(self, sock: socket.socket, app, workers: int, warmup: bool) -> None:
+        self._sock = sock
+        self._app = app
+        self._workers = workers
+        self._warmup = warmup
+        self._pids: set[int] = set()
+        self._signals: list[int] = []
+        self._wakeup: tuple[int, int] | None = None
+        self._status = 0
+
+    def run(self) -> int:
+        wake_read, wake_write = self._wakeup = os.pipe()
+        for fd in self._wakeup:
+            os.set_blocking(fd, False)
+        signal.set_wakeup_fd(wake_write)
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(sig, lambda sig, frame: self._signals.append(sig))
+        try:
+            self._spawn(self._workers)
+            while self._pids:
+                select.select([wake_read], [], [], 1.0)
+                try:
+                    while os.read(wake_read, 1024):
+                        pass
+                except BlockingIOError:
+                    pass
+                self._handle()
+        finally:
+            signal.set_wakeup_fd(-1)
+            os.close(wake_read)
+            os.close(wake_write)
+        return self._status
+
+    def _handle(self) -> None:
+        signals = set(self._signals)
+        self._signals.clear()
+        if signals & {signal.SIGTERM, signal.SIGINT}:
+            logger.info("Stopping %d workers", len(self._pids))
+            self._workers = 0
+            self._stop(set(self._pids))
+        elif signal.SIGHUP in signals and self._workers:
+            logger.info("Reloading: replacing %d workers", len(self._pids))
+            old = set(self._pids)
+            self._spawn(self._workers)
+            self._stop(old)
+        self._reap()
+
+    def _spawn(self, count: int) -> None:
+        for _ in range(count):
+            pid = os.fork()
+            if pid:
+                self._pids.add(pid)
+                continue
+            # Worker: forget the parent's signal handling and serve.
+            status = BOOT_ERROR
+            try:
+                signal.set_wakeup_fd(-1)
+                for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGCHLD):
+                    signal.signal(sig, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.default_int_handler)
+                for fd in self._wakeup:
+                    os.close(fd)
+                status = _run_worker(self._sock, self._app, self._warmup)
+            except BaseException:
+                logger.exception("Worker %d crashed", os.getpid())
+            finally:
+                logging.shutdown()
+                os._exit(status)
+
+    def _stop(self, pids: set[int]) -> None:
+        for pid in pids:
+            _kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT + 5
+        while pids & self._pids and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        for pid in pids & self._pids:
+            logger.warning("Killing worker %d after %ds", pid, GRACEFUL_TIMEOUT)
+            _kill(pid, signal.SIGKILL)
+
+    def _reap(self) -> None:
+        while self._pids:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self._pids.clear()
+                return
+            if not pid:
+                return
+            if pid not in self._pids:
+                continue
+            self._pids.discard(pid)
+            code = os.waitstatus_to_exitcode(status)
+            if code == BOOT_ERROR:
+                logger.error("Worker %d failed to boot, shutting down", pid)
+                self._status = BOOT_ERROR
+                self._workers = 0
+                self._stop(set(self._pids))
+            elif self._workers and len(self._pids) < self._workers:
+                logger.warning("Worker %d exited with %d, restarting", pid, code)
+                self._spawn(1)
+
+
+def _kill(pid: int, sig: int) -> None:
+    try:
+        os.kill(pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Parse the command line of ``python -m smart_host`` and serve."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m smart_host")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument(
+        "--preload",
+        action=argparse.BooleanOptionalAction,
+        default=PRELOAD,
+        help="build the app before forking the workers",
+    )
+    parser.add_argument(
+        "--warmup",
+        action=argparse.BooleanOptionalAction,
+        default=WARMUP,
+        help="request WARMUP_PATHS in each worker before accepting traffic",
+    )
+    args = parser.parse_args(argv)
+    return serve(args.host, args.port, args.workers, args.preload, args.warmup)
@@ -2,6 +2,17 @@
 
 from .host_service import HostService
 from .property_service import PropertyService
-from .booking_service import BookingService
+from .booking_service import AsyncBookingService, BookingService
+from .analytics_service import AnalyticsService
+from .bulk_service import BulkService
+from .quote_service import QuoteService
 
-__all__ = ["HostService", "PropertyService", "BookingService"]
+__all__ = [
+    "HostService",
+    "PropertyService",
+    "BookingService",
+    "AsyncBookingService",
+    "AnalyticsService",
+    "BulkService",
+    "QuoteService",
+]
@@ -0,0 +1,197 @@
+"""Occupancy and revenue reports computed over columnar stays."""
+
+from __future__ import annotations
+
+from datetime import date
+
+import numpy as np
+
+from ..infrastructure import AnalyticsRepository
+
+GROUPINGS = ("property", "language")
+"""Keys reports can be grouped by."""
+
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def to_epoch_day(day: date) -> int:
+    """Return ``day`` as days since 1970-01-01, like the stay columns."""
+    return day.toordinal() - _EPOCH
+
+
+class _Window:
+    """The stays of one snapshot clipped to ``[start, end)``."""
+
+    def __init__(self, snapshot, start: date, end: date, property_id: int | None):
+        if end <= start:
+            raise ValueError("end must be after start")
+        first, last = to_epoch_day(start), to_epoch_day(end)
+        stays, rooms = snapshot.stays, snapshot.rooms
+        mask = (stays.check_in < last) & (stays.check_out > first)
+        room_id = stays.room_id[mask]
+        self.property_id = rooms.property_id[room_id]
+        if property_id is not None:
+            keep = self.property_id == property_id
+            mask[mask] = keep
+            room_id, self.property_id = room_id[keep], self.property_id[keep]
+        self.start = start
+        self.days = last - first
+        # Offsets of the first and the day after the last night in range.
+        self.begin = np.maximum(stays.check_in[mask], first) - first
+        self.stop = np.minimum(stays.check_out[mask], last) - first
+        self.nights = self.stop - self.begin
+        self.price = rooms.price[room_id]
+        self.language = stays.language[mask]
+        self.languages = stays.languages
+        room_property = rooms.property_id
+        if property_id is not None:
+            room_property = room_property[room_property == property_id]
+        else:
+            room_property = room_property[room_property >= 0]
+        self.room_property = room_property
+
+    def per_day(self, weights: np.ndarray) -> np.ndarray:
+        """Sum ``weights`` over every night of every stay, day by day.
+
+        Each stay adds its weight at its first night and removes it after
+        its last, so a cumulative sum of the difference array gives the
+        daily totals without expanding stays into nights.
+        """
+        size = self.days + 1
+        diff = np.bincount(self.begin, weights, minlength=size)
+        diff -= np.bincount(self.stop, weights, minlength=size)
+        return np.cumsum(diff[:-1])
+
+    def groups(self, group_by: str) -> tuple[np.ndarray, np.ndarray]:
+        """Return the group keys and the group index of every stay.
+
+        Properties are taken from the rooms, so those without stays in the
+        range still get a group.
+        """
+        if group_by == "property":
+            keys = np.unique(self.room_property)
+            return keys, np.searchsorted(keys, self.property_id)
+        if group_by == "language":
+            return np.array(self.languages), self.language
+        raise ValueError(f"group_by must be one of {', '.join(GROUPINGS)}")
+
+    def dates(self) -> list[str]:
+        first = self.start.toordinal()
+        return [date.fromordinal(first + day).isoformat() for day in range(self.days)]
+
+
+def _sums(index: np.ndarray, weights: np.ndarray, size: int) -> list[float]:
+    return np.bincount(index, weights, minlength=size).tolist()
+
+
+class AnalyticsService:
+    """Aggregate bookings by night over a date range."""
+
+    def __init__(self, repository: AnalyticsRepository) -> None:
+        self._repository = repository
+
+    def _window(self, start: date, end: date, property_id: int | None) -> _Window:
+        return _Window(self._repository.snapshot(), start, end, property_id)
+
+    def occupancy(
+        self,
+        start: date,
+        end: date,
+        group_by: str = "property",
+        property_id: int | None = None,
+    ) -> dict:
+        """Return booked and available room nights in ``[start, end)``.
+
+        Grouped by property, a group's occupancy is relative to its own
+        rooms; grouped by language, to all rooms in the report.
+        """
+        window = self._window(start, end, property_id)
+        keys, index = window.groups(group_by)
+        booked = _sums(index, window.nights, len(keys))
+        room_count = len(window.room_property)
+        if group_by == "property":
+            rooms = np.bincount(
+                np.searchsorted(keys, window.room_property), minlength=len(keys)
+            )
+        else:
+            rooms = np.full(len(keys), room_count)
+        available = (rooms * window.days).tolist()
+        total_available = room_count * window.days
+        total_booked = int(window.nights.sum())
+        daily = window.per_day(np.ones(len(window.nights)))
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "days": window.days,
+            "rooms": room_count,
+            "booked_nights": total_booked,
+            "available_nights": total_available,
+            "occupancy": _ratio(total_booked, total_available),
+            "groups": [
+                {
+                    group_by: key,
+                    "booked_nights": int(nights),
+                    "available_nights": int(free),
+                    "occupancy": _ratio(nights, free),
+                }
+                for key, nights, free in zip(keys.tolist(), booked, available)
+            ],
+            "daily": [
+                {
+                    "date": day,
+                    "booked_rooms": int(count),
+                    "occupancy": _ratio(count, room_count),
+                }
+                for day, count in zip(window.dates(), daily.tolist())
+            ],
+        }
+
+    def revenue(
+        self,
+        start: date,
+        end: date,
+        group_by: str = "property",
+        property_id: int | None = None,
+    ) -> dict:
+        """Return room revenue in ``[start, end)`` at the rooms' nightly price.
+
+        ``adr`` is the average daily rate, revenue per booked night.
+        """
+        window = self._window(start, end, property_id)
+        keys, index = window.groups(group_by)
+        amount = window.nights * window.price
+        revenue = _sums(index, amount, len(keys))
+        booked = _sums(index, window.nights, len(keys))
+        total_revenue = float(amount.sum())
+        total_booked = int(window.nights.sum())
+        daily = window.per_day(window.price)
+        return {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "days": window.days,
+            "revenue": round(total_revenue, 2),
+            "booked_nights": total_booked,
+            "adr": _rate(total_revenue, total_booked),
+            "groups": [
+                {
+                    group_by: key,
+                    "revenue": round(amount, 2),
+                    "booked_nights": int(nights),
+                    "adr": _rate(amount, nights),
+                }
+                for key, amount, nights in zip(keys.tolist(), revenue, booked)
+                if nights
+            ],
+            "daily": [
+                {"date": day, "revenue": round(amount, 2)}
+                for day, amount in zip(window.dates(), daily.tolist())
+            ],
+        }
+
+
+def _ratio(part: float, whole: float) -> float:
+    return round(part / whole, 4) if whole else 0.0
+
+
+def _rate(amount: float, nights: float) -> float:
+    return round(amount / nights, 2) if nights else 0.0
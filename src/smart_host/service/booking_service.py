@@ -1,10 +1,11 @@
 """Service layer for booking operations."""
 
-from dataclasses import asdict
+from collections.abc import Iterator
 from datetime import date
 
 from ..domain import Booking
 from ..infrastructure import BookingRepository
+from .serialization import to_dict
 
 
 class BookingService:
@@ -22,9 +23,68 @@ class BookingService:
         check_out: date,
     ) -> Booking:
         """Create and persist a booking."""
+        booking = self.new_booking(
+            room_id, guest_name, language, check_in, check_out
+        )
+        return self._repository.add_booking(booking)
+
+    def create_bookings(
+        self, requests: list[dict]
+    ) -> tuple[list[Booking], dict[int, str]]:
+        """Create many bookings in one repository transaction.
+
+        ``requests`` hold the keyword arguments of :meth:`create_booking`.
+        Returns the stored bookings and the error messages of the rejected
+        requests keyed by their position.
+        """
+        bookings, positions, errors = self._prepare_batch(requests)
+        conflicts = self._repository.add_bookings(bookings)
+        return self._batch_result(bookings, positions, errors, conflicts)
+
+    @classmethod
+    def _prepare_batch(
+        cls, requests: list[dict]
+    ) -> tuple[list[Booking], list[int], dict[int, str]]:
+        """Validate ``requests`` into bookings, their positions and errors."""
+        errors: dict[int, str] = {}
+        positions: list[int] = []
+        bookings: list[Booking] = []
+        for index, request in enumerate(requests):
+            try:
+                bookings.append(cls.new_booking(**request))
+            except ValueError as exc:
+                errors[index] = str(exc)
+                continue
+            positions.append(index)
+        return bookings, positions, errors
+
+    @staticmethod
+    def _batch_result(
+        bookings: list[Booking],
+        positions: list[int],
+        errors: dict[int, str],
+        conflicts: dict[int, Exception],
+    ) -> tuple[list[Booking], dict[int, str]]:
+        for batch_index, exc in conflicts.items():
+            errors[positions[batch_index]] = str(exc)
+        created = [b for i, b in enumerate(bookings) if i not in conflicts]
+        return created, dict(sorted(errors.items()))
+
+    @staticmethod
+    def new_booking(
+        room_id: int,
+        guest_name: str,
+        language: str,
+        check_in: date,
+        check_out: date,
+    ) -> Booking:
+        """Validate the stay and return an unsaved booking.
+
+        Raises ``ValueError`` for a stay that does not end after it starts.
+        """
         if check_out <= check_in:
             raise ValueError("check_out must occur after check_in")
-        booking = Booking(
+        return Booking(
             id=0,
             room_id=room_id,
             guest_name=guest_name,
@@ -32,12 +92,86 @@ class BookingService:
             check_in=check_in,
             check_out=check_out,
         )
-        return self._repository.add_booking(booking)
 
-    def list_bookings(self) -> list[Booking]:
-        """Return all stored bookings."""
-        return self._repository.list_bookings()
+    def list_bookings(
+        self,
+        limit: int | None = None,
+        after: int | None = None,
+        include_archived: bool = False,
+    ) -> list[Booking]:
+        """Return stored bookings, optionally one keyset page at a time."""
+        return self._repository.list_bookings(
+            limit=limit, after=after, include_archived=include_archived
+        )
+
+    def iter_bookings(
+        self, after: int | None = None, include_archived: bool = False
+    ) -> Iterator[Booking]:
+        """Stream stored bookings in id order."""
+        return self._repository.iter_bookings(
+            after=after, include_archived=include_archived
+        )
+
+    def bookings_version(self) -> int:
+        """Return the change version of the live bookings."""
+        return self._repository.bookings_version()
+
+    def bookings_since(
+        self, since: int, limit: int | None = None
+    ) -> tuple[list[Booking], int]:
+        """Return live bookings changed after version ``since`` and the next one."""
+        return self._repository.bookings_since(since, limit)
 
     def to_dict(self, booking: Booking) -> dict:
         """Return booking as serializable dict."""
-        return asdict(booking)
+        return to_dict(booking)
+
+
+class AsyncBookingService(BookingService):
+    """Booking logic on top of an asyncio repository.
+
+    Same operations as :class:`BookingService`, awaiting the repository.
+    """
+
+    async def create_booking(
+        self,
+        room_id: int,
+        guest_name: str,
+        language: str,
+        check_in: date,
+        check_out: date,
+    ) -> Booking:
+        """Create and persist a booking."""
+        booking = self.new_booking(
+            room_id, guest_name, language, check_in, check_out
+        )
+        return await self._repository.add_booking(booking)
+
+    async def create_bookings(
+        self, requests: list[dict]
+    ) -> tuple[list[Booking], dict[int, str]]:
+        """Create many bookings in one repository transaction."""
+        bookings, positions, errors = self._prepare_batch(requests)
+        conflicts = await self._repository.add_bookings(bookings)
+        return self._batch_result(bookings, positions, errors, conflicts)
+
+    async def list_bookings(
+        self,
+        limit: int | None = None,
+        after: int | None = None,
+        include_archived: bool = False,
+    ) -> list[Booking]:
+        """Return stored bookings, optionally one keyset page at a time."""
+        return await self._repository.list_bookings(
+            limit=limit, after=after, include_archived=include_archived
+        )
+
+    async def bookings_version(self) -> int:
+        """Return the change version of the live bookings."""
+        return await self._repository.bookings_version()
+
+    async def bookings_since(
+        self, since: int, limit: int | None = None
+    ) -> tuple[list[Booking], int]:
+        """Return live bookings changed after version ``since`` and the next one."""
+        return await self._repository.bookings_since(since, limit)
@@ -0,0 +1,254 @@
+"""Bulk export and import of hosts, properties, rooms and bookings."""
+
+from __future__ import annotations
+
+from collections.abc import Callable, Iterable, Iterator
+from datetime import date
+from itertools import islice
+from operator import attrgetter
+
+from ..config import IMPORT_BATCH_SIZE
+from ..domain import Booking, Host, Property, Room
+from ..infrastructure import BookingRepository, HostRepository, PropertyRepository
+from .booking_service import BookingService
+
+ENTITIES: dict[str, tuple[str, ...]] = {
+    "hosts": ("id", "name", "rating"),
+    "properties": ("id", "name", "location"),
+    "rooms": ("id", "property_id", "beds", "features", "price"),
+    "bookings": ("id", "room_id", "guest_name", "language", "check_in", "check_out"),
+}
+"""Columns of every exportable entity, in file order."""
+
+MAX_REPORTED_ERRORS = 100
+"""Rejected records an import report lists individually."""
+
+
+def _text(record: dict, name: str) -> str:
+    value = record.get(name)
+    if value is None or value == "":
+        raise ValueError(f"{name} is required")
+    return str(value)
+
+
+def _optional_text(record: dict, name: str) -> str | None:
+    value = record.get(name)
+    return None if value is None or value == "" else str(value)
+
+
+def _number(convert: Callable, record: dict, name: str, default=None):
+    value = record.get(name)
+    if value is None or value == "":
+        if default is None:
+            raise ValueError(f"{name} is required")
+        return default
+    try:
+        return convert(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number, not {value!r}") from None
+
+
+def _date(record: dict, name: str) -> date:
+    value = record.get(name)
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(_text(record, name))
+    except ValueError as exc:
+        raise ValueError(f"{name} must be an ISO date: {exc}") from None
+
+
+def _parse_host(record: dict) -> Host:
+    return Host(
+        id=_number(int, record, "id", 0) or None,
+        name=_text(record, "name"),
+        rating=_number(float, record, "rating", 0.0),
+    )
+
+
+def _parse_property(record: dict) -> Property:
+    return Property(
+        id=_number(int, record, "id", 0),
+        name=_text(record, "name"),
+        location=_text(record, "location"),
+    )
+
+
+def _parse_room(record: dict) -> Room:
+    return Room(
+        id=_number(int, record, "id", 0),
+        property_id=_number(int, record, "property_id"),
+        beds=_number(int, record, "beds", 1),
+        features=_optional_text(record, "features"),
+        price=_number(float, record, "price", 0.0),
+    )
+
+
+def _parse_booking(record: dict) -> Booking:
+    booking = BookingService.new_booking(
+        room_id=_number(int, record, "room_id"),
+        guest_name=_text(record, "guest_name"),
+        language=_text(record, "language"),
+        check_in=_date(record, "check_in"),
+        check_out=_date(record, "check_out"),
+    )
+    booking.id = _number(int, record, "id", 0)
+    return booking
+
+
+_PARSERS = {
+    "hosts": _parse_host,
+    "properties": _parse_property,
+    "rooms": _parse_room,
+    "bookings": _parse_booking,
+}
+
+
+class BulkService:
+    """Stream whole tables out and validate and upsert records in batches.
+
+    Exports read from server-side cursors, so they hold one chunk of rows at
+    a time however large the table. Imports take any iterable of records,
+    e.g. the rows of a CSV file as dicts, and store them ``batch_size`` at a
+    time. A record with an ``id`` replaces the stored row of that id, the
+    others are added with new ids.
+    """
+
+    def __init__(
+        self,
+        hosts: HostRepository,
+        properties: PropertyRepository,
+        bookings: BookingRepository,
+    ) -> None:
+        self._hosts = hosts
+        self._properties = properties
+        self._bookings = bookings
+
+    @staticmethod
+    def columns(entity: str) -> tuple[str, ...]:
+        """Return the columns of ``entity``; raises ``ValueError`` if unknown."""
+        try:
+            return ENTITIES[entity]
+        except KeyError:
+            raise ValueError(
+                f"unknown entity {entity!r}, expected one of {', '.join(ENTITIES)}"
+            ) from None
+
+    def export_rows(
+        self, entity: str, include_archived: bool = False
+    ) -> Iterator[tuple]:
+        """Yield every row of ``entity`` in id order as a tuple of its columns.
+
+        Archived bookings are only exported with ``include_archived``.
+        """
+        row = attrgetter(*self.columns(entity))
+        if entity == "hosts":
+            items = self._hosts.iter_hosts()
+        elif entity == "properties":
+            items = self._properties.iter_properties()
+        elif entity == "rooms":
+            items = self._properties.iter_rooms()
+        else:
+            items = self._bookings.iter_bookings(include_archived=include_archived)
+        return map(row, items)
+
+    def import_rows(
+        self,
+        entity: str,
+        records: Iterable[dict],
+        batch_size: int = IMPORT_BATCH_SIZE,
+    ) -> dict:
+        """Validate ``records`` and store the valid ones in batches.
+
+        Returns the number of ``imported`` and ``rejected`` records and the
+        ``errors`` of the first :data:`MAX_REPORTED_ERRORS` rejected ones,
+        keyed by their 1-based position in ``records``.
+        """
+        self.columns(entity)
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        parse = _PARSERS[entity]
+        imported = rejected = 0
+        errors: dict[int, str] = {}
+
+        def reject(number: int, exc: Exception) -> None:
+            nonlocal rejected
+            rejected += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors[number] = str(exc)
+
+        numbered = enumerate(records, start=1)
+        while chunk := list(islice(numbered, batch_size)):
+            numbers: list[int] = []
+            items: list = []
+            for number, record in chunk:
+                try:
+                    items.append(parse(record))
+                except (TypeError, ValueError) as exc:
+                    reject(number, exc)
+                    continue
+                numbers.append(number)
+            invalid = self._check_references(entity, items)
+            for index, exc in invalid.items():
+                reject(numbers[index], exc)
+            if invalid:
+                numbers = [n for i, n in enumerate(numbers) if i not in invalid]
+                items = [item for i, item in enumerate(items) if i not in invalid]
+            conflicts = self._store(entity, items) if items else {}
+            for index, exc in conflicts.items():
+                reject(numbers[index], exc)
+            imported += len(items) - len(conflicts)
+        return {"imported": imported, "rejected": rejected, "errors": errors}
+
+    def _check_references(self, entity: str, items: list) -> dict[int, Exception]:
+        """Return the errors of ``items`` naming rows that do not exist.
+
+        Rooms must belong to a stored property, and a stored room to the one
+        it already belongs to; bookings must be of a stored room.
+        """
+        errors: dict[int, Exception] = {}
+        if entity == "rooms":
+            stored = {
+                room.id: room.property_id
+                for room in self._properties.rooms_by_id(
+                    sorted({room.id for room in items if room.id})
+                )
+            }
+            properties = {
+                prop.id
+                for prop in self._properties.properties_by_id(
+                    sorted({room.property_id for room in items})
+                )
+            }
+            for index, room in enumerate(items):
+                if room.property_id not in properties:
+                    errors[index] = ValueError(
+                        f"property {room.property_id} does not exist"
+                    )
+                elif stored.get(room.id, room.property_id) != room.property_id:
+                    errors[index] = ValueError(
+                        f"room {room.id} belongs to property {stored[room.id]} "
+                        "and cannot move to another one"
+                    )
+        elif entity == "bookings":
+            rooms = {
+                room.id
+                for room in self._properties.rooms_by_id(
+                    sorted({booking.room_id for booking in items})
+                )
+            }
+            for index, booking in enumerate(items):
+                if booking.room_id not in rooms:
+                    errors[index] = ValueError(f"room {booking.room_id} does not exist")
+        return errors
+
+    def _store(self, entity: str, items: list) -> dict[int, Exception]:
+        if entity == "hosts":
+            self._hosts.upsert_many(items)
+        elif entity == "properties":
+            self._properties.upsert_properties(items)
+        elif entity == "rooms":
+            self._properties.upsert_rooms(items)
+        else:
+            return self._bookings.upsert_bookings(items)
+        return {}
@@ -1,13 +1,18 @@
 """Basic service definitions."""
 
-from dataclasses import asdict
-
 from ..domain import Host
+from .serialization import to_dict
 
 
 class HostService:
     """Service operations for managing hosts."""
 
     def to_dict(self, host: Host) -> dict:
-        """Return a host as a serializable dictionary."""
-        return asdict(host)
+        """Return a host as a serializable dictionary.
+
+        Hosts that were never stored have no ``id`` and it is left out.
+        """
+        data = to_dict(host)
+        if host.id is None:
+            del data["id"]
+        return data
@@ -1,8 +1,7 @@
 """Service operations for properties and rooms."""
 
-from dataclasses import asdict
-
 from ..domain import Property, Room
+from .serialization import to_dict
 
 
 class PropertyService:
@@ -10,4 +9,4 @@ class PropertyService:
 
     def to_dict(self, obj: Property | Room) -> dict:
         """Return dataclass as dict."""
-        return asdict(obj)
+        return to_dict(obj)
@@ -0,0 +1,218 @@
+"""Stay quotes priced from per-room nightly calendars."""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+import numpy as np
+
+from ..config import AVAILABILITY_DAYS
+from ..domain import RoomRate
+from ..infrastructure import MISSING, PropertyRepository
+from .analytics_service import to_epoch_day
+from .serialization import to_dict
+
+MAX_QUOTE_ROOMS = 500
+"""Rooms one batch quote may ask for."""
+
+
+class PriceCalendar:
+    """Nightly prices and minimum stays of one room for ``days`` nights.
+
+    Nights start at ``start`` days since 1970-01-01 and take the room's base
+    price unless one of its rates, applied in order, sets another.
+    """
+
+    __slots__ = ("start", "prices", "min_nights")
+
+    def __init__(
+        self, base_price: float, rates: list[RoomRate], start: int, days: int
+    ) -> None:
+        self.start = start
+        self.prices = np.full(days, base_price, np.float64)
+        self.min_nights = np.ones(days, np.int32)
+        # 1970-01-01 was a Thursday, weekday 3.
+        weekday = (np.arange(start, start + days) + 3) % 7
+        for rate in rates:
+            low = 0 if rate.start is None else to_epoch_day(rate.start) - start
+            high = days if rate.end is None else to_epoch_day(rate.end) - start
+            nights = slice(min(max(low, 0), days), min(max(high, 0), days))
+            if rate.weekdays is None:
+                selected = nights
+            else:
+                on = np.isin(weekday[nights], rate.weekdays)
+                selected = np.flatnonzero(on) + nights.start
+            if rate.price is not None:
+                self.prices[selected] = rate.price
+            if rate.min_nights is not None:
+                self.min_nights[selected] = rate.min_nights
+
+
+def check_rate(rate: RoomRate) -> None:
+    """Raise ``ValueError`` unless ``rate`` is a valid rate."""
+    if rate.price is None and rate.min_nights is None:
+        raise ValueError("a rate must set price or min_nights")
+    if rate.price is not None and rate.price < 0:
+        raise ValueError("price must not be negative")
+    if rate.min_nights is not None and rate.min_nights < 1:
+        raise ValueError("min_nights must be at least 1")
+    if rate.start is not None and rate.end is not None and rate.end <= rate.start:
+        raise ValueError("end must be after start")
+    if rate.weekdays is not None and (
+        not rate.weekdays or not set(rate.weekdays) <= set(range(7))
+    ):
+        raise ValueError("weekdays must list days from 0 (Monday) to 6")
+
+
+class QuoteService:
+    """Price stays from cached calendars of the rooms' nightly rates.
+
+    A room's calendar covers the next ``days`` nights and is materialized
+    once from its base price and rates, then kept in ``cache`` keyed by the
+    room's change version, which every price or rate change bumps. Quotes
+    therefore never use a stale calendar, even after writes by another
+    worker. Stays beyond the calendar are priced from a calendar of just
+    their nights. Without a cache every quote materializes its calendars.
+    """
+
+    def __init__(
+        self,
+        properties: PropertyRepository,
+        cache=None,
+        days: int = AVAILABILITY_DAYS,
+    ) -> None:
+        self._properties = properties
+        self._cache = cache
+        self._days = days
+
+    def to_dict(self, rate: RoomRate) -> dict:
+        """Return dataclass as dict."""
+        return to_dict(rate)
+
+    def rates(self, room_id: int) -> list[RoomRate]:
+        """Return the rates of room ``room_id`` in the order they apply."""
+        return self._properties.list_rates([room_id])
+
+    def set_rates(self, room_id: int, rates: list[RoomRate]) -> list[RoomRate]:
+        """Replace the rates of room ``room_id``; later rates override earlier.
+
+        Raises ``ValueError`` for an invalid rate or an unknown room.
+        """
+        for rate in rates:
+            check_rate(rate)
+        rates = self._properties.set_rates(room_id, rates)
+        if self._cache is not None:
+            self._cache.invalidate(("calendar", room_id))
+        return rates
+
+    def quote(
+        self,
+        room_id: int,
+        check_in: date,
+        check_out: date,
+        today: date | None = None,
+    ) -> dict:
+        """Price a stay in room ``room_id`` and list its nightly prices.
+
+        Raises ``ValueError`` for an unknown room or an invalid stay,
+        including one shorter than the room's minimum stay.
+        """
+        quotes, errors = self._quote([room_id], check_in, check_out, today, True)
+        if errors:
+            raise ValueError(errors[room_id])
+        return quotes[0]
+
+    def quote_many(
+        self,
+        room_ids: list[int],
+        check_in: date,
+        check_out: date,
+        today: date | None = None,
+    ) -> tuple[list[dict], dict[int, str]]:
+        """Price the same stay in each of ``room_ids``.
+
+        Returns the quotes in room id order and the reasons the other rooms
+        could not be quoted, keyed by room id. Raises ``ValueError`` for an
+        invalid stay or more than :data:`MAX_QUOTE_ROOMS` rooms.
+        """
+        if len(room_ids) > MAX_QUOTE_ROOMS:
+            raise ValueError(f"at most {MAX_QUOTE_ROOMS} rooms can be quoted at once")
+        return self._quote(room_ids, check_in, check_out, today, False)
+
+    def _quote(
+        self,
+        room_ids: list[int],
+        check_in: date,
+        check_out: date,
+        today: date | None,
+        nightly: bool,
+    ) -> tuple[list[dict], dict[int, str]]:
+        if check_out <= check_in:
+            raise ValueError("check_out must occur after check_in")
+        first, last = to_epoch_day(check_in), to_epoch_day(check_out)
+        start = to_epoch_day(today or date.today())
+        if first < start or last > start + self._days:
+            # Outside the cached window: a calendar of just the stay.
+            start, days = first, last - first
+        else:
+            days = self._days
+        rooms = self._properties.room_prices(sorted(set(room_ids)))
+        calendars = self._calendars(rooms, start, days)
+        errors = {
+            room_id: f"room {room_id} does not exist"
+            for room_id in set(room_ids) - {room[0] for room in rooms}
+        }
+        nights = last - first
+        if not calendars:
+            return [], errors
+        stays = np.stack([c.prices[first - start : last - start] for c in calendars])
+        totals = stays.sum(axis=1).round(2)
+        minimums = np.array([c.min_nights[first - start] for c in calendars])
+        quotes = []
+        for (room_id, _, _), total, minimum, prices in zip(
+            rooms, totals.tolist(), minimums.tolist(), stays
+        ):
+            if nights < minimum:
+                errors[room_id] = (
+                    f"room {room_id} requires at least {minimum} nights "
+                    f"from {check_in}"
+                )
+                continue
+            quote = {
+                "room_id": room_id,
+                "check_in": check_in,
+                "check_out": check_out,
+                "nights": nights,
+                "total": total,
+                "average": round(total / nights, 2),
+            }
+            if nightly:
+                quote["nightly"] = [
+                    {"night": check_in + timedelta(days=i), "price": price}
+                    for i, price in enumerate(prices.tolist())
+                ]
+            quotes.append(quote)
+        return quotes, dict(sorted(errors.items()))
+
+    def _calendars(
+        self, rooms: list[tuple[int, float, int]], start: int, days: int
+    ) -> list[PriceCalendar]:
+        """Return the calendars of ``rooms``, loading the rates of misses at once."""
+        cached = self._cache is not None and days == self._days
+        calendars: list = [MISSING] * len(rooms)
+        if cached:
+            for i, (room_id, _, version) in enumerate(rooms):
+                calendars[i] = self._cache.get(("calendar", room_id, version, start))
+        missing = [i for i, calendar in enumerate(calendars) if calendar is MISSING]
+        if not missing:
+            return calendars
+        rates: dict[int, list[RoomRate]] = {}
+        for rate in self._properties.list_rates(rooms[i][0] for i in missing):
+            rates.setdefault(rate.room_id, []).append(rate)
+        for i in missing:
+            room_id, price, version = rooms[i]
+            calendar = PriceCalendar(price, rates.get(room_id, []), start, days)
+            if cached:
+                self._cache.set(("calendar", room_id, version, start), calendar)
+            calendars[i] = calendar
+        return calendars
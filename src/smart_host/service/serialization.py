@@ -0,0 +1,22 @@
+"""Shallow conversion of domain dataclasses into dictionaries."""
+
+from dataclasses import fields
+from functools import cache
+from operator import attrgetter
+from typing import Callable
+
+
+@cache
+def _field_reader(cls: type) -> tuple[tuple[str, ...], Callable]:
+    names = tuple(f.name for f in fields(cls))
+    return names, attrgetter(*names)
+
+
+def to_dict(obj) -> dict:
+    """Return the fields of a flat dataclass instance as a dict.
+
+    Unlike :func:`dataclasses.asdict` nothing is copied recursively; the
+    field names and getter are computed once per class.
+    """
+    names, read = _field_reader(type(obj))
+    return dict(zip(names, read(obj)))
@@ -0,0 +1,164 @@
+"""Tests for the bulk export and import routes."""
+
+import io
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from smart_host.domain import Booking
+from smart_host.infrastructure.repository import (
+    BookingRepository,
+    HostRepository,
+    PropertyRepository,
+)
+from smart_host.infrastructure.sql.migrations import migrate
+from smart_host.interface.bulk import decode, encode, register_bulk_routes
+from smart_host.service import BulkService
+
+
+def make_service() -> BulkService:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    migrate(engine)
+    factory = sessionmaker(bind=engine)
+    return BulkService(
+        HostRepository(factory), PropertyRepository(factory), BookingRepository(factory)
+    )
+
+
+def make_client(service: BulkService) -> TestClient:
+    app = FastAPI()
+    register_bulk_routes(app, service)
+    return TestClient(app)
+
+
+class BulkRoutesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.service = make_service()
+        self.client = make_client(self.service)
+        properties = self.service._properties
+        prop = properties.add_property(name="Aruba House", location="Paradera")
+        self.rooms = [properties.add_room(prop.id, 2, price=100.0) for _ in range(2)]
+        self.bookings = self.service._bookings
+        for day in range(1, 20, 3):
+            check_in = date(2024, 1, day)
+            self.bookings.add_booking(
+                Booking(
+                    id=0,
+                    room_id=self.rooms[day % 2].id,
+                    guest_name='Ana "Q", Jr',
+                    language="en",
+                    check_in=check_in,
+                    check_out=check_in + timedelta(days=2),
+                )
+            )
+
+    def test_csv_export_round_trips_into_an_empty_database(self):
+        response = self.client.get("/export/bookings")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/csv"))
+        lines = response.text.splitlines()
+        self.assertEqual(
+            lines[0], "id,room_id,guest_name,language,check_in,check_out"
+        )
+        self.assertEqual(len(lines), 8)
+
+        target = make_client(make_service())
+        for entity in ("properties", "rooms"):
+            exported = self.client.get(f"/export/{entity}").content
+            target.post(f"/import/{entity}", content=exported)
+        report = target.post(
+            "/import/bookings?batch_size=3", content=response.content
+        ).json()
+        self.assertEqual(report, {"imported": 7, "rejected": 0, "errors": []})
+        self.assertEqual(target.get("/export/bookings").content, response.content)
+
+    def test_import_validates_and_upserts(self):
+        room = self.rooms[1].id
+        upload = (
+            "id,room_id,guest_name,language,check_in,check_out\n"
+            f"1,{room},Bo,nl,2024-03-01,2024-03-04\n"
+            f",{room},,en,2024-03-10,2024-03-11\n"
+            f",{room},Cy,en,2024-03-12,2024-03-12\n"
+            f",{room},Di,en,2024-03-02,2024-03-03\n"
+            f",{room},Ed,en,2024-03-04,2024-03-06\n"
+        )
+        report = self.client.post("/import/bookings", content=upload).json()
+        self.assertEqual((report["imported"], report["rejected"]), (2, 3))
+        errors = {error["record"]: error["detail"] for error in report["errors"]}
+        self.assertEqual(sorted(errors), [2, 3, 4])
+        self.assertIn("guest_name is required", errors[2])
+        self.assertIn("already booked", errors[4])
+        stored = self.bookings.list_bookings()
+        self.assertEqual(len(stored), 8)
+        self.assertEqual(
+            (stored[0].room_id, stored[0].guest_name, stored[0].check_in),
+            (room, "Bo", date(2024, 3, 1)),
+        )
+
+    def test_import_rejects_unknown_references(self):
+        room = self.rooms[0]
+        other = self.service._properties.add_property(name="Villa", location="Noord")
+        rooms = (
+            "id,property_id,beds,features,price\n"
+            f"{room.id},{room.property_id},3,,120\n"
+            ",99,1,,50\n"
+            f"{self.rooms[1].id},{other.id},1,,50\n"
+        )
+        report = self.client.post("/import/rooms", content=rooms).json()
+        self.assertEqual((report["imported"], report["rejected"]), (1, 2))
+        errors = {error["record"]: error["detail"] for error in report["errors"]}
+        self.assertIn("property 99 does not exist", errors[2])
+        self.assertIn("cannot move", errors[3])
+        bookings = (
+            "id,room_id,guest_name,language,check_in,check_out\n"
+            f",{room.id},Bo,nl,2024-03-01,2024-03-04\n"
+            ",99,Cy,en,2024-03-01,2024-03-04\n"
+        )
+        report = self.client.post("/import/bookings", content=bookings).json()
+        self.assertEqual((report["imported"], report["rejected"]), (1, 1))
+        self.assertIn("room 99 does not exist", report["errors"][0]["detail"])
+        self.assertEqual(len(self.bookings.list_bookings()), 8)
+
+    def test_unknown_entity_and_format_are_rejected(self):
+        self.assertEqual(self.client.get("/export/guests").status_code, 400)
+        self.assertEqual(
+            self.client.get("/export/rooms?format=xlsx").status_code, 400
+        )
+        self.assertEqual(self.client.post("/import/guests").status_code, 400)
+
+
+class ArrowFormatTestCase(unittest.TestCase):
+    def setUp(self):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            self.skipTest("pyarrow unavailable")
+
+    def test_formats_round_trip_in_chunks(self):
+        columns = ("id", "property_id", "beds", "features", "price")
+        rows = [
+            (i, 1, i % 3 + 1, None if i % 2 else "wifi", i * 1.5) for i in range(1, 8)
+        ]
+        for fmt in ("parquet", "arrow"):
+            with self.subTest(fmt):
+                chunks = list(encode(fmt, columns, iter(rows), chunk_rows=3))
+                self.assertGreater(len(chunks), 3)
+                records = list(decode(fmt, io.BytesIO(b"".join(chunks))))
+                self.assertEqual([tuple(r.values()) for r in records], rows)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,31 +6,76 @@ sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
 
 try:
     from fastapi.testclient import TestClient
+    from starlette.websockets import WebSocketDisconnect
 except Exception:  # httpx or fastapi might be missing
     TestClient = None  # type: ignore
 
-import types
-
-fake_infra = types.ModuleType("smart_host.infrastructure")
-fake_infra.HostRepository = lambda *a, **k: None
-fake_infra.PropertyRepository = lambda *a, **k: None
-fake_infra.BookingRepository = lambda *a, **k: None
-fake_infra.init_db = lambda: None
-sys.modules["smart_host.infrastructure"] = fake_infra
-
 from smart_host.interface.api import create_app
+from smart_host.interface.chat import ChatHub, Connection, _Close
 
 
 class ChatRouteTestCase(unittest.TestCase):
     def setUp(self):
         if TestClient is None:
             self.skipTest("TestClient unavailable")
-        self.client = TestClient(create_app())
+        self.client = TestClient(create_app(backend="memory"))
 
     def test_chat_route(self):
         resp = self.client.get("/chat")
         self.assertEqual(resp.status_code, 200)
 
+    def test_messages_reach_channel_subscribers_only(self):
+        with self.client as client, client.websocket_connect(
+            "/chat/ws?property_id=1&name=Ana"
+        ) as ana, client.websocket_connect(
+            "/chat/ws?property_id=1&booking_id=5&name=Bob&role=host"
+        ) as bob, client.websocket_connect(
+            "/chat/ws?property_id=2&name=Eva"
+        ) as eva:
+            ana.send_json({"text": "Is the pool heated?"})
+            for ws in (ana, bob):
+                message = ws.receive_json()
+                self.assertEqual(message["channel"], "property:1")
+                self.assertEqual(message["from"], "Ana")
+            bob.send_json({"text": "Yes"})
+            self.assertEqual(bob.receive_json()["type"], "error")
+            eva.send_json({"text": "Hello"})
+            self.assertEqual(eva.receive_json()["from"], "Eva")
+
+    def test_join_without_channel_is_refused(self):
+        with self.client.websocket_connect("/chat/ws") as ws:
+            with self.assertRaises(WebSocketDisconnect) as ctx:
+                ws.receive_json()
+        self.assertEqual(ctx.exception.code, 1008)
+
+
+class ChatHubTestCase(unittest.TestCase):
+    def connect(self, hub: ChatHub, channel: str = "property:1") -> Connection:
+        conn = Connection(None, "Ana", "guest", (channel,), hub.queue_size)
+        hub.subscribe(conn)
+        return conn
+
+    def test_slow_consumer_is_evicted(self):
+        hub = ChatHub(queue_size=2)
+        slow, other = self.connect(hub), self.connect(hub, "property:2")
+        for _ in range(2):
+            self.assertEqual(hub.publish("property:1", {"text": "hi"}), 1)
+        self.assertEqual(hub.publish("property:1", {"text": "hi"}), 0)
+        self.assertEqual(slow.queue.get_nowait(), _Close(1013, "slow consumer"))
+        self.assertEqual(hub.stats(), {"connections": 1, "channels": 1, "evictions": 1})
+        self.assertTrue(other.queue.empty())
+
+    def test_heartbeat_pings_then_closes_idle_connections(self):
+        hub = ChatHub(heartbeat_seconds=10, idle_timeout=30)
+        conn = self.connect(hub)
+        hub.sweep(conn.last_seen + 5)
+        self.assertTrue(conn.queue.empty())
+        hub.sweep(conn.last_seen + 10)
+        self.assertEqual(conn.queue.get_nowait(), '{"type":"ping"}')
+        hub.sweep(conn.last_seen + 30)
+        self.assertEqual(conn.queue.get_nowait(), _Close(1001, "idle"))
+        self.assertEqual(hub.stats()["connections"], 0)
+
 
 if __name__ == "__main__":
     unittest.main()
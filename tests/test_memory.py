@@ -0,0 +1,211 @@
+"""Tests for the in-memory repository backend."""
+
+import sys
+from pathlib import Path
+import unittest
+from datetime import date, timedelta
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from smart_host.domain import Booking, BookingConflictError, Host
+from smart_host.infrastructure import (
+    BookingRepository,
+    HostRepository,
+    MemoryBookingRepository,
+    MemoryHostRepository,
+    MemoryPropertyRepository,
+    MemoryStore,
+    PropertyRepository,
+)
+from smart_host.infrastructure.sql.migrations import migrate
+from smart_host.interface.api import create_app
+
+
+def make_booking(room_id: int, check_in: date, nights: int, booking_id: int = 0):
+    return Booking(
+        id=booking_id,
+        room_id=room_id,
+        guest_name="Bob",
+        language="en",
+        check_in=check_in,
+        check_out=check_in + timedelta(days=nights),
+    )
+
+
+def backends() -> dict[str, tuple]:
+    """Return empty host, property and booking repositories of each backend."""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    migrate(engine)
+    factory = sessionmaker(bind=engine)
+    store = MemoryStore()
+    return {
+        "sql": (
+            HostRepository(factory),
+            PropertyRepository(factory),
+            BookingRepository(factory),
+        ),
+        "memory": (
+            MemoryHostRepository(store),
+            MemoryPropertyRepository(store),
+            MemoryBookingRepository(store),
+        ),
+    }
+
+
+class MemoryBackendParityTestCase(unittest.TestCase):
+    """The memory repositories answer like the SQL ones."""
+
+    def setUp(self):
+        self.backends = backends()
+        for hosts, props, bookings in self.backends.values():
+            hosts.add_many([Host(name=name) for name in ("Ana", "Bo", "Cy")])
+            house = props.add_property(name="House", location="Paradera")
+            villa = props.add_property(name="Villa", location="Noord")
+            props.add_room(house.id, 2, features="Sea view, WiFi", price=120.0)
+            props.add_room(house.id, 1, features="Garden", price=60.0)
+            props.add_room(villa.id, 4, features="wifi, pool", price=300.0)
+            for day in (1, 8, 15):
+                for room_id in (1, 2):
+                    bookings.add_booking(make_booking(room_id, date(2024, 1, day), 5))
+
+    def assertSameOnEveryBackend(self, call):
+        results = {name: call(*repos) for name, repos in self.backends.items()}
+        self.assertEqual(results["memory"], results["sql"])
+        return results["sql"]
+
+    def test_listings_and_searches(self):
+        def run(hosts, props, bookings):
+            return (
+                hosts.list_hosts(limit=2, after=1),
+                list(props.iter_properties()),
+                props.list_rooms(1, limit=1, after=1),
+                props.search_rooms(location="Paradera", sort="-beds"),
+                props.search_rooms(min_price=100, features=["WIFI"]),
+                props.search_rooms(features_query="gard* OR pool"),
+                props.search_rooms(features_query='"view wifi"'),
+                props.list_rooms(1, features_query="VIEW OR garden"),
+                bookings.list_bookings(limit=4, after=1),
+            )
+
+        self.assertEqual(len(self.assertSameOnEveryBackend(run)[4]), 2)
+
+    def test_conflicts_upserts_and_archive(self):
+        def run(hosts, props, bookings):
+            with self.assertRaises(BookingConflictError):
+                bookings.add_booking(make_booking(1, date(2024, 1, 4), 2))
+            conflicts = bookings.add_bookings(
+                [
+                    make_booking(1, date(2024, 1, 6), 2),
+                    make_booking(3, date(2024, 1, 6), 2),
+                    make_booking(3, date(2024, 1, 7), 2),
+                ]
+            )
+            archived = bookings.archive(date(2024, 1, 7), batch_size=1)
+            rejected = bookings.upsert_bookings(
+                [
+                    make_booking(1, date(2024, 1, 16), 5, booking_id=5),
+                    make_booking(2, date(2024, 1, 1), 1, booking_id=2),
+                    make_booking(2, date(2024, 1, 20), 3),
+                    make_booking(2, date(2024, 1, 21), 3, booking_id=6),
+                ]
+            )
+            return (
+                list(conflicts),
+                archived,
+                {index: str(exc) for index, exc in rejected.items()},
+                list(bookings.iter_bookings(include_archived=True)),
+            )
+
+        conflicts, archived, rejected, _ = self.assertSameOnEveryBackend(run)
+        self.assertEqual((conflicts, archived), ([2], 2))
+        self.assertEqual(list(rejected), [1, 3])
+
+    def test_change_versions(self):
+        def run(hosts, props, bookings):
+            version = props.properties_version()
+            (first,) = props.list_properties(limit=1)
+            props.upsert_properties([first])
+            room = props.add_room(2, features="Garden")
+            room.property_id = 1
+            with self.assertRaises(ValueError):
+                props.upsert_rooms([room])
+            room.property_id, room.features = 2, "Pool"
+            props.upsert_rooms([room])
+            page, cursor = props.rooms_since(0, property_id=2, limit=2)
+            return (
+                props.properties_since(version),
+                props.rooms_since(cursor, property_id=2),
+                props.rooms_version(2)[1],
+                bookings.bookings_since(0, limit=2)[0],
+            )
+
+        self.assertSameOnEveryBackend(run)
+
+
+class MemoryStoreTestCase(unittest.TestCase):
+    def test_repositories_copy_rows_in_and_out(self):
+        props = MemoryPropertyRepository()
+        room = props.add_room(1, features="Garden")
+        room.features = "Pool"
+        self.assertEqual(props.list_rooms()[0].features, "Garden")
+        props.list_rooms()[0].features = "Pool"
+        self.assertEqual(props.search_rooms(features_query="pool"), [])
+
+    def test_booking_ids_are_never_reused(self):
+        bookings = MemoryBookingRepository()
+        for day in (1, 5):
+            bookings.add_booking(make_booking(1, date(2024, 1, day), 2))
+        self.assertEqual(bookings.archive(date(2025, 1, 1)), 2)
+        booking = bookings.add_booking(make_booking(1, date(2024, 2, 1), 2))
+        self.assertEqual(booking.id, 3)
+
+    def test_archive_keeps_the_remaining_ids_sorted(self):
+        bookings = MemoryBookingRepository()
+        for day in (1, 3, 20, 5, 25, 7):
+            bookings.add_booking(make_booking(1, date(2024, 1, day), 2))
+        self.assertEqual(bookings.archive(date(2024, 1, 15), batch_size=2), 4)
+        self.assertEqual([b.id for b in bookings.list_bookings()], [3, 5])
+        self.assertEqual([b.id for b in bookings.list_bookings(after=3)], [5])
+
+
+class MemoryAppTestCase(unittest.TestCase):
+    def test_routes_share_one_store(self):
+        client = TestClient(create_app(auto_migrate=False, backend="memory"))
+        prop = client.post("/properties?name=House&location=Paradera").json()
+        room = client.post(f"/properties/{prop['id']}/rooms?price=80").json()
+        stay = {
+            "room_id": room["id"],
+            "guest_name": "Bob",
+            "language": "en",
+            "check_in": "2024-01-01",
+            "check_out": "2024-01-04",
+        }
+        self.assertEqual(client.post("/bookings", params=stay).status_code, 200)
+        self.assertEqual(client.post("/bookings", params=stay).status_code, 409)
+        quote = client.get(
+            f"/rooms/{room['id']}/quote",
+            params={"check_in": "2024-01-01", "check_out": "2024-01-04"},
+        ).json()
+        self.assertEqual(quote["total"], 240.0)
+        exported = client.get("/export/bookings").text.splitlines()
+        self.assertEqual(len(exported), 2)
+        self.assertEqual(client.get("/availability").status_code, 404)
+
+    def test_unknown_and_unsupported_backends(self):
+        with self.assertRaises(ValueError):
+            create_app(backend="redis")
+        with self.assertRaises(ValueError):
+            create_app(async_db=True, backend="memory")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""Tests for the request and SQL metrics."""
+
+import sys
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from smart_host.interface.metrics import (
+    Metrics,
+    MetricsMiddleware,
+    install_sql_hooks,
+)
+
+
+def make_client(metrics: Metrics, slow_request_ms: float) -> TestClient:
+    """Return a client for an app whose route runs ``item_id`` statements."""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    install_sql_hooks()
+    app = FastAPI()
+    app.add_middleware(
+        MetricsMiddleware, metrics=metrics, slow_request_ms=slow_request_ms
+    )
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int) -> dict:
+        with engine.connect() as conn:
+            for _ in range(item_id):
+                conn.execute(text("SELECT 1"))
+        return {"id": item_id}
+
+    return TestClient(app)
+
+
+class MetricsMiddlewareTestCase(unittest.TestCase):
+    def test_requests_and_queries_are_attributed_to_route(self):
+        metrics = Metrics()
+        client = make_client(metrics, slow_request_ms=10_000)
+        client.get("/items/3")
+        client.get("/missing")
+        rendered = metrics.render()
+        self.assertIn(
+            'http_requests_total{method="GET",route="/items/{item_id}",status="200"} 1',
+            rendered,
+        )
+        self.assertIn(
+            'http_requests_total{method="GET",route="unmatched",status="404"} 1',
+            rendered,
+        )
+        self.assertIn(
+            'http_request_db_queries_sum{method="GET",route="/items/{item_id}"} 3',
+            rendered,
+        )
+        self.assertIn("http_requests_in_flight 0", rendered)
+
+    def test_slow_requests_are_logged_with_sql(self):
+        client = make_client(Metrics(), slow_request_ms=0)
+        with self.assertLogs("smart_host.interface.metrics", "WARNING") as logs:
+            client.get("/items/2")
+        self.assertIn("2 queries", logs.output[0])
+        self.assertIn("2x", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,73 +1,20 @@
 """Basic sanity tests for the Smart Host services."""
 
+import json
 import sys
 from pathlib import Path
-import types
 import unittest
 from datetime import date
 
 # Ensure src package is on sys.path
 sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
 
-from smart_host.domain import Host, Property, Room, Booking
-
-
-class FakePropertyRepository:
-    def __init__(self) -> None:
-        self.properties: list[Property] = []
-        self.next_id = 1
-
-    def add_property(self, name: str, location: str) -> Property:
-        prop = Property(id=self.next_id, name=name, location=location)
-        self.next_id += 1
-        self.properties.append(prop)
-        return prop
-
-    def list_properties(self) -> list[Property]:
-        return list(self.properties)
-
-    def add_room(
-        self,
-        property_id: int,
-        beds: int = 1,
-        *,
-        features: str | None = None,
-        price: float = 0.0,
-    ) -> Room:
-        return Room(
-            id=1, property_id=property_id, beds=beds, features=features, price=price
-        )
-
-    def list_rooms(self, property_id: int) -> list[Room]:
-        return []
-
-
-class FakeBookingRepository:
-    def __init__(self) -> None:
-        self.bookings: list[Booking] = []
-        self.next_id = 1
-
-    def add_booking(self, booking: Booking) -> Booking:
-        booking.id = self.next_id
-        self.next_id += 1
-        self.bookings.append(booking)
-        return booking
-
-    def list_bookings(self) -> list[Booking]:
-        return list(self.bookings)
-
-
-# Provide fake infrastructure module so importing service layer succeeds without
-# SQLAlchemy installed.
-fake_infra = types.ModuleType("smart_host.infrastructure")
-fake_infra.PropertyRepository = FakePropertyRepository
-fake_infra.BookingRepository = FakeBookingRepository
-fake_infra.HostRepository = lambda *a, **k: None
-fake_infra.init_db = lambda: None
-sys.modules["smart_host.infrastructure"] = fake_infra
-
-PropertyRepository = FakePropertyRepository
-
+from smart_host.domain import Host
+from smart_host.infrastructure import (
+    MemoryBookingRepository,
+    MemoryPropertyRepository,
+    MemoryStore,
+)
 from smart_host.service import HostService, PropertyService, BookingService
 
 
@@ -81,7 +28,7 @@ class HostServiceTestCase(unittest.TestCase):
 
 class PropertyServiceTestCase(unittest.TestCase):
     def test_add_property(self):
-        repo = FakePropertyRepository()
+        repo = MemoryPropertyRepository()
         service = PropertyService()
         prop = repo.add_property(name="Aruba House", location="Paradera")
         result = service.to_dict(prop)
@@ -91,9 +38,9 @@ class PropertyServiceTestCase(unittest.TestCase):
 
 class BookingServiceTestCase(unittest.TestCase):
     def test_create_booking(self):
-        repo = FakeBookingRepository()
-        service = BookingService(repo)
-        prop_repo = PropertyRepository()
+        store = MemoryStore()
+        service = BookingService(MemoryBookingRepository(store))
+        prop_repo = MemoryPropertyRepository(store)
         prop = prop_repo.add_property(name="Test Property", location="Nowhere")
         room = prop_repo.add_room(property_id=prop.id)
         check_in = date(2024, 1, 1)
@@ -111,8 +58,7 @@ class BookingServiceTestCase(unittest.TestCase):
         self.assertEqual(result["language"], "nl")
 
     def test_create_booking_invalid_dates(self):
-        repo = FakeBookingRepository()
-        service = BookingService(repo)
+        service = BookingService(MemoryBookingRepository())
         with self.assertRaises(ValueError):
             service.create_booking(
                 room_id=1,
@@ -123,12 +69,61 @@ class BookingServiceTestCase(unittest.TestCase):
             )
 
 
+class ResponseEncodingTestCase(unittest.TestCase):
+    def test_dumps_encodes_dates_with_and_without_orjson(self):
+        from smart_host.interface import responses
+
+        data = {"check_in": date(2024, 1, 1), "guest_name": "Zoë"}
+        expected = {"check_in": "2024-01-01", "guest_name": "Zoë"}
+        fallback = responses.orjson
+        try:
+            for encoder in {fallback, None}:
+                responses.orjson = encoder
+                self.assertEqual(json.loads(responses.dumps(data)), expected)
+        finally:
+            responses.orjson = fallback
+
+
+class ConditionalResponseTestCase(unittest.TestCase):
+    def test_matching_entity_tag_gets_not_modified(self):
+        from fastapi import FastAPI, Request
+        from fastapi.testclient import TestClient
+
+        from smart_host.interface.responses import (
+            FastJSONResponse,
+            etag,
+            not_modified,
+            tagged,
+        )
+
+        app = FastAPI()
+        version = [1]
+
+        @app.get("/items")
+        def items(request: Request):
+            tag = etag(request, version[0])
+            if (unchanged := not_modified(request, tag)) is not None:
+                return unchanged
+            return tagged(FastJSONResponse([version[0]]), tag)
+
+        client = TestClient(app)
+        tag = client.get("/items").headers["etag"]
+        self.assertEqual(tag, 'W/"1-json"')
+        response = client.get("/items", headers={"If-None-Match": f'"x", {tag}'})
+        self.assertEqual((response.status_code, response.content), (304, b""))
+        ndjson = {"Accept": "application/x-ndjson", "If-None-Match": tag}
+        self.assertEqual(client.get("/items", headers=ndjson).status_code, 200)
+        version[0] = 2
+        response = client.get("/items", headers={"If-None-Match": tag})
+        self.assertEqual(response.json(), [2])
+
+
 class APIBookingValidationTestCase(unittest.TestCase):
     def test_api_returns_400_for_invalid_dates(self):
         from smart_host.interface.api import create_app
         from fastapi import HTTPException
 
-        app = create_app()
+        app = create_app(backend="memory")
 
         create_booking = next(
             route.endpoint
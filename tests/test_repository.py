@@ -0,0 +1,1007 @@
+"""Tests for the SQLAlchemy backed repositories."""
+
+import asyncio
+import random
+import sys
+import tempfile
+import threading
+from pathlib import Path
+import unittest
+from datetime import date, timedelta
+from unittest import mock
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from smart_host.domain import Booking, BookingConflictError, RoomRate
+from smart_host.infrastructure.analytics import AnalyticsRepository
+from smart_host.infrastructure.availability import AvailabilityIndex
+from smart_host.infrastructure.group_commit import GroupCommitBookingRepository
+from smart_host.infrastructure.locks import StripedLock
+from smart_host.infrastructure.shards import (
+    IdAllocator,
+    ShardedBookingRepository,
+    ShardRouter,
+    jump_hash,
+    rebalance,
+)
+from smart_host.infrastructure.cache import CachedPropertyRepository, LRUCache
+from smart_host.config import DATABASE_URL
+from smart_host.infrastructure.sql import ReadSessionLocal, SessionLocal
+from smart_host.infrastructure.sql.engine import create_engines
+from smart_host.infrastructure.sql import migrations
+from smart_host.infrastructure.sql.migrations import MIGRATIONS, migrate
+from smart_host.infrastructure.repository import (
+    BookingRepository,
+    PropertyRepository,
+)
+from smart_host.service.analytics_service import AnalyticsService
+from smart_host.service.quote_service import QuoteService
+
+
+def memory_session_factory() -> sessionmaker:
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    migrate(engine)
+    return sessionmaker(bind=engine)
+
+
+def make_booking(
+    room_id: int, check_in: date, check_out: date, language: str = "en"
+) -> Booking:
+    return Booking(
+        id=0,
+        room_id=room_id,
+        guest_name="Bob",
+        language=language,
+        check_in=check_in,
+        check_out=check_out,
+    )
+
+
+class BookingRepositoryTestCase(unittest.TestCase):
+    def setUp(self):
+        factory = memory_session_factory()
+        prop_repo = PropertyRepository(factory)
+        prop = prop_repo.add_property(name="Aruba House", location="Paradera")
+        self.room = prop_repo.add_room(prop.id, 2)
+        self.other_room = prop_repo.add_room(prop.id, 1)
+        self.repo = BookingRepository(factory)
+        self.repo.add_booking(
+            make_booking(self.room.id, date(2024, 1, 10), date(2024, 1, 15))
+        )
+
+    def test_overlapping_booking_rejected(self):
+        for check_in, check_out in [
+            (date(2024, 1, 8), date(2024, 1, 11)),
+            (date(2024, 1, 14), date(2024, 1, 20)),
+            (date(2024, 1, 11), date(2024, 1, 12)),
+            (date(2024, 1, 1), date(2024, 2, 1)),
+        ]:
+            with self.assertRaises(BookingConflictError):
+                self.repo.add_booking(make_booking(self.room.id, check_in, check_out))
+        self.assertEqual(len(self.repo.list_bookings()), 1)
+
+    def test_adjacent_and_other_room_bookings_accepted(self):
+        self.repo.add_booking(
+            make_booking(self.room.id, date(2024, 1, 5), date(2024, 1, 10))
+        )
+        self.repo.add_booking(
+            make_booking(self.room.id, date(2024, 1, 15), date(2024, 1, 18))
+        )
+        self.repo.add_booking(
+            make_booking(self.other_room.id, date(2024, 1, 10), date(2024, 1, 15))
+        )
+        self.assertEqual(len(self.repo.list_bookings()), 4)
+
+    def test_add_bookings_reports_conflicts_by_position(self):
+        batch = [
+            make_booking(self.room.id, date(2024, 1, 12), date(2024, 1, 13)),
+            make_booking(self.room.id, date(2024, 1, 20), date(2024, 1, 25)),
+            make_booking(self.room.id, date(2024, 1, 22), date(2024, 1, 23)),
+            make_booking(self.other_room.id, date(2024, 1, 1), date(2024, 1, 5)),
+        ]
+        conflicts = self.repo.add_bookings(batch)
+        self.assertEqual(sorted(conflicts), [0, 2])
+        self.assertTrue(batch[1].id and batch[3].id)
+        self.assertEqual(len(self.repo.list_bookings()), 3)
+
+    def test_upsert_keeps_a_stay_until_its_move_is_accepted(self):
+        (stored,) = self.repo.list_bookings()
+        stored.check_in, stored.check_out = date(2024, 1, 11), date(2024, 1, 14)
+        taken = make_booking(self.room.id, date(2024, 1, 10), date(2024, 1, 15))
+        rejected = self.repo.upsert_bookings([taken, stored])
+        self.assertEqual(list(rejected), [0])
+        stays = [(b.id, b.check_in) for b in self.repo.list_bookings()]
+        self.assertEqual(stays, [(stored.id, date(2024, 1, 11))])
+
+
+class KeysetPaginationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.repo = PropertyRepository(memory_session_factory())
+        for i in range(5):
+            self.repo.add_property(name=f"House {i}", location="Paradera")
+
+    def test_pages_follow_after_cursor(self):
+        first = self.repo.list_properties(limit=2)
+        second = self.repo.list_properties(limit=2, after=first[-1].id)
+        self.assertEqual([p.name for p in first], ["House 0", "House 1"])
+        self.assertEqual([p.name for p in second], ["House 2", "House 3"])
+
+    def test_iter_streams_remaining_rows(self):
+        names = [p.name for p in self.repo.iter_properties(after=3)]
+        self.assertEqual(names, ["House 3", "House 4"])
+
+
+class RoomSearchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.repo = PropertyRepository(memory_session_factory())
+        house = self.repo.add_property(name="House", location="Paradera")
+        villa = self.repo.add_property(name="Villa", location="Noord")
+        self.repo.add_room(house.id, 2, features="Sea view, WiFi", price=120.0)
+        self.repo.add_room(house.id, 1, features="Garden", price=60.0)
+        self.repo.add_room(villa.id, 4, features="wifi, pool", price=300.0)
+
+    def prices(self, **filters) -> list[float]:
+        return [room.price for room in self.repo.search_rooms(**filters)]
+
+    def test_filters_combine(self):
+        self.assertEqual(self.prices(location="Paradera"), [60.0, 120.0])
+        self.assertEqual(self.prices(min_beds=2, max_price=200), [120.0])
+        self.assertEqual(self.prices(features=["wifi"]), [120.0, 300.0])
+        self.assertEqual(self.prices(features=["wifi", "pool"]), [300.0])
+
+    def test_sort_and_limit(self):
+        self.assertEqual(self.prices(sort="-price", limit=2), [300.0, 120.0])
+        with self.assertRaises(ValueError):
+            self.repo.search_rooms(sort="name")
+
+    def test_features_query(self):
+        self.assertEqual(self.prices(features_query="wifi pool"), [300.0])
+        self.assertEqual(self.prices(features_query="gard* OR pool"), [60.0, 300.0])
+        self.assertEqual(self.prices(features_query='"view wifi"'), [120.0])
+        self.assertEqual(self.prices(features_query="vie"), [])
+        rooms = self.repo.list_rooms(1, features_query="VIEW OR garden")
+        self.assertEqual([room.price for room in rooms], [120.0, 60.0])
+        for query in ("", "OR wifi", "wifi OR", "* wifi", '"wifi'):
+            with self.assertRaises(ValueError):
+                self.repo.search_rooms(features_query=query)
+
+    def test_features_index_follows_writes(self):
+        (room,) = self.repo.search_rooms(features_query="garden")
+        room.features = "Balcony"
+        self.repo.upsert_rooms([room])
+        self.assertEqual(self.prices(features_query="garden"), [])
+        self.assertEqual(self.prices(features_query="balc*"), [60.0])
+
+
+class CachedPropertyRepositoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.inner = PropertyRepository(memory_session_factory())
+        self.repo = CachedPropertyRepository(self.inner, LRUCache(maxsize=8))
+        self.first = self.repo.add_property(name="House", location="Paradera")
+        self.second = self.repo.add_property(name="Villa", location="Noord")
+
+    def test_repeated_reads_hit_the_cache(self):
+        self.repo.list_properties()
+        self.repo.list_properties()
+        self.assertEqual(self.repo.stats()["hits"], 1)
+        self.assertEqual(self.repo.stats()["misses"], 1)
+
+    def test_add_room_invalidates_only_its_property(self):
+        self.repo.list_rooms(self.first.id)
+        self.repo.list_rooms(self.second.id)
+        self.repo.add_room(self.first.id, beds=2)
+        self.assertEqual(len(self.repo.list_rooms(self.first.id)), 1)
+        self.repo.list_rooms(self.second.id)
+        self.assertEqual(self.repo.stats()["hits"], 1)
+
+    def test_add_property_invalidates_listing(self):
+        self.assertEqual(len(self.repo.list_properties()), 2)
+        self.repo.add_property(name="Cabin", location="Savaneta")
+        self.assertEqual(len(self.repo.list_properties()), 3)
+
+    def test_versions_are_read_once_per_interval(self):
+        calls = []
+        read = self.inner.properties_version
+        self.inner.properties_version = lambda: calls.append(1) or read()
+        for _ in range(3):
+            self.repo.list_properties()
+        self.assertEqual(len(calls), 1)
+        self.repo.add_property(name="Cabin", location="Savaneta")
+        self.assertEqual(len(self.repo.list_properties()), 3)
+        self.assertEqual(len(calls), 2)
+
+    def test_other_workers_writes_show_once_the_version_expires(self):
+        repo = CachedPropertyRepository(self.inner, LRUCache(), version_ttl=0)
+        self.assertEqual(len(repo.list_rooms(self.first.id)), 0)
+        self.inner.add_room(self.first.id, beds=2)
+        self.assertEqual(len(repo.list_rooms(self.first.id)), 1)
+
+    def test_entries_expire_and_evict(self):
+        cache = LRUCache(maxsize=1, ttl=0)
+        cache.set(("a",), 1)
+        cache.set(("b",), 2)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.stats()["size"], 1)
+        self.assertIsNot(cache.get(("b",)), 2)
+
+
+class AnalyticsTestCase(unittest.TestCase):
+    def setUp(self):
+        factory = memory_session_factory()
+        prop_repo = PropertyRepository(factory)
+        first = prop_repo.add_property(name="Aruba House", location="Paradera")
+        second = prop_repo.add_property(name="Noord Villa", location="Noord")
+        rooms = [
+            prop_repo.add_room(first.id, 2, price=100.0),
+            prop_repo.add_room(first.id, 1, price=50.0),
+            prop_repo.add_room(second.id, 2, price=80.0),
+        ]
+        self.props, self.rooms = prop_repo, rooms
+        self.room_ids = [room.id for room in rooms]
+        self.bookings = BookingRepository(factory)
+        for room, check_in, check_out, language in [
+            (rooms[0], date(2024, 1, 30), date(2024, 2, 3), "en"),
+            (rooms[1], date(2024, 2, 10), date(2024, 2, 12), "nl"),
+            (rooms[2], date(2024, 2, 27), date(2024, 3, 2), "en"),
+        ]:
+            self.bookings.add_booking(
+                make_booking(room.id, check_in, check_out, language)
+            )
+        self.service = AnalyticsService(AnalyticsRepository(factory))
+        self.february = (date(2024, 2, 1), date(2024, 3, 1))
+
+    def test_occupancy_clips_stays_to_the_range(self):
+        report = self.service.occupancy(*self.february)
+        self.assertEqual(report["days"], 29)
+        self.assertEqual((report["booked_nights"], report["available_nights"]), (7, 87))
+        self.assertEqual(
+            [(g["booked_nights"], g["available_nights"]) for g in report["groups"]],
+            [(4, 58), (3, 29)],
+        )
+        booked = [day["booked_rooms"] for day in report["daily"]]
+        self.assertEqual(booked[:3], [1, 1, 0])
+        self.assertEqual(booked[9:12], [1, 1, 0])
+        self.assertEqual(booked[-3:], [1, 1, 1])
+
+    def test_revenue_by_language(self):
+        report = self.service.revenue(*self.february, group_by="language")
+        self.assertEqual(report["revenue"], 540.0)
+        self.assertEqual(
+            [(g["language"], g["revenue"], g["adr"]) for g in report["groups"]],
+            [("en", 440.0, 88.0), ("nl", 100.0, 50.0)],
+        )
+
+    def test_new_bookings_are_picked_up(self):
+        self.service.revenue(*self.february)
+        self.bookings.add_booking(
+            make_booking(
+                self.room_ids[2], date(2024, 2, 5), date(2024, 2, 7), "pap"
+            )
+        )
+        report = self.service.revenue(*self.february, property_id=2)
+        self.assertEqual(report["revenue"], 400.0)
+        self.assertEqual(report["groups"][0]["booked_nights"], 5)
+
+    def test_upserted_rooms_and_bookings_are_picked_up(self):
+        self.service.revenue(*self.february)
+        self.rooms[0].price = 250.0
+        self.props.upsert_rooms([self.rooms[0]])
+        self.assertEqual(self.service.revenue(*self.february)["revenue"], 840.0)
+        booking = self.bookings.list_bookings(limit=1)[0]
+        booking.check_in, booking.check_out = date(2024, 2, 10), date(2024, 2, 14)
+        self.assertEqual(self.bookings.upsert_bookings([booking]), {})
+        report = self.service.occupancy(*self.february)
+        self.assertEqual(report["booked_nights"], 9)
+        self.assertEqual(self.service.revenue(*self.february)["revenue"], 1340.0)
+
+    def test_invalid_range_and_grouping(self):
+        with self.assertRaises(ValueError):
+            self.service.occupancy(date(2024, 2, 1), date(2024, 2, 1))
+        with self.assertRaises(ValueError):
+            self.service.revenue(*self.february, group_by="room")
+
+
+class AvailabilityIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        factory = memory_session_factory()
+        self.props = PropertyRepository(factory)
+        first = self.props.add_property(name="Aruba House", location="Paradera")
+        second = self.props.add_property(name="Noord Villa", location="Noord")
+        self.room_ids = [
+            self.props.add_room(first.id, 2).id,
+            self.props.add_room(first.id, 1).id,
+            self.props.add_room(second.id, 3).id,
+        ]
+        self.bookings = BookingRepository(factory)
+        self.today = date(2024, 1, 1)
+        self.bookings.add_booking(
+            make_booking(self.room_ids[0], date(2024, 1, 5), date(2024, 1, 9))
+        )
+        self.index = AvailabilityIndex(factory, days=60)
+
+    def free(self, check_in, check_out, **filters):
+        return self.index.available_rooms(
+            check_in, check_out, today=self.today, **filters
+        )
+
+    def test_stays_and_filters(self):
+        rooms = self.room_ids
+        self.assertEqual(self.free(date(2024, 1, 8), date(2024, 1, 10)), rooms[1:])
+        self.assertEqual(self.free(date(2024, 1, 9), date(2024, 1, 12)), rooms)
+        self.assertEqual(self.free(date(2024, 1, 1), date(2024, 1, 5)), rooms)
+        self.assertEqual(
+            self.free(date(2024, 1, 9), date(2024, 1, 12), beds=2),
+            [rooms[0], rooms[2]],
+        )
+        self.assertEqual(
+            self.free(date(2024, 1, 9), date(2024, 1, 12), location="Paradera"),
+            rooms[:2],
+        )
+        self.assertEqual(
+            self.free(date(2024, 1, 9), date(2024, 1, 12), after=rooms[0], limit=1),
+            [rooms[1]],
+        )
+        self.assertEqual(
+            self.free(date(2024, 1, 9), date(2024, 1, 12), location="Oranjestad"),
+            [],
+        )
+
+    def test_new_rooms_and_bookings_are_picked_up(self):
+        stay = (date(2024, 2, 20), date(2024, 2, 24))
+        self.assertEqual(self.free(*stay), self.room_ids)
+        self.bookings.add_booking(make_booking(self.room_ids[2], *stay))
+        room = self.props.add_room(1, 4)
+        self.assertEqual(self.free(*stay), self.room_ids[:2] + [room.id])
+        self.assertEqual(self.free(*stay, beds=4), [room.id])
+
+    def test_booking_moved_to_another_room_frees_the_old_one(self):
+        stay = (date(2024, 1, 5), date(2024, 1, 9))
+        self.assertEqual(self.free(*stay), self.room_ids[1:])
+        (booking,) = self.bookings.list_bookings()
+        booking.room_id = self.room_ids[1]
+        self.assertEqual(self.bookings.upsert_bookings([booking]), {})
+        self.assertEqual(self.free(*stay), [self.room_ids[0], self.room_ids[2]])
+
+    def test_window_is_checked_and_moves_daily(self):
+        with self.assertRaises(ValueError):
+            self.free(date(2024, 1, 3), date(2024, 1, 3))
+        with self.assertRaises(ValueError):
+            self.free(date(2023, 12, 31), date(2024, 1, 2))
+        with self.assertRaises(ValueError):
+            self.free(date(2024, 2, 28), date(2024, 3, 2))
+        self.today = date(2024, 1, 7)
+        self.assertEqual(
+            self.free(date(2024, 3, 5), date(2024, 3, 7)), self.room_ids
+        )
+        self.assertEqual(
+            self.free(date(2024, 1, 7), date(2024, 1, 8)), self.room_ids[1:]
+        )
+
+
+class QuoteTestCase(unittest.TestCase):
+    def setUp(self):
+        factory = memory_session_factory()
+        self.props = PropertyRepository(factory)
+        prop = self.props.add_property(name="Aruba House", location="Paradera")
+        self.room = self.props.add_room(prop.id, price=100.0)
+        self.flat = self.props.add_room(prop.id, price=80.0)
+        self.cache = LRUCache()
+        self.service = QuoteService(self.props, self.cache, days=60)
+        self.today = date(2024, 1, 1)
+        self.service.set_rates(
+            self.room.id,
+            [
+                # Fridays and Saturdays, then a season overriding them.
+                RoomRate(id=0, room_id=0, price=150.0, weekdays=[4, 5]),
+                RoomRate(
+                    id=0,
+                    room_id=0,
+                    price=200.0,
+                    min_nights=3,
+                    start=date(2024, 1, 20),
+                    end=date(2024, 1, 25),
+                ),
+            ],
+        )
+
+    def quote(self, check_in, check_out):
+        return self.service.quote(self.room.id, check_in, check_out, self.today)
+
+    def test_rates_override_the_base_price(self):
+        quote = self.quote(date(2024, 1, 4), date(2024, 1, 8))
+        self.assertEqual(quote["total"], 500.0)
+        self.assertEqual(
+            [night["price"] for night in quote["nightly"]], [100, 150, 150, 100]
+        )
+        # The season wins over the weekend.
+        quote = self.quote(date(2024, 1, 18), date(2024, 1, 22))
+        self.assertEqual((quote["total"], quote["average"]), (650.0, 162.5))
+        # Stays beyond the cached calendar are priced alike.
+        self.assertEqual(
+            self.quote(date(2024, 2, 28), date(2024, 3, 4))["total"], 600.0
+        )
+
+    def test_minimum_stay_and_unknown_rooms(self):
+        with self.assertRaisesRegex(ValueError, "at least 3 nights"):
+            self.quote(date(2024, 1, 21), date(2024, 1, 23))
+        quotes, errors = self.service.quote_many(
+            [self.flat.id, 99, self.room.id], date(2024, 1, 21), date(2024, 1, 23)
+        )
+        self.assertEqual(
+            [(q["room_id"], q["total"]) for q in quotes], [(self.flat.id, 160.0)]
+        )
+        self.assertEqual(sorted(errors), [self.room.id, 99])
+        with self.assertRaises(ValueError):
+            self.service.set_rates(99, [RoomRate(id=0, room_id=0, price=1.0)])
+        with self.assertRaises(ValueError):
+            self.service.set_rates(self.room.id, [RoomRate(id=0, room_id=0)])
+
+    def test_calendars_are_cached_until_prices_change(self):
+        stay = (date(2024, 1, 2), date(2024, 1, 4))
+        self.quote(*stay)
+        self.quote(*stay)
+        self.assertEqual(self.cache.hits, 1)
+        self.room.price = 90.0
+        self.props.upsert_rooms([self.room])
+        self.assertEqual(self.quote(*stay)["total"], 180.0)
+        self.service.set_rates(self.room.id, [])
+        self.assertEqual(self.service.rates(self.room.id), [])
+        self.assertEqual(self.cache.hits, 1)
+
+
+class ArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        factory = memory_session_factory()
+        prop_repo = PropertyRepository(factory)
+        prop = prop_repo.add_property(name="Aruba House", location="Paradera")
+        self.room_ids = [prop_repo.add_room(prop.id, price=100.0).id for _ in range(3)]
+        self.repo = BookingRepository(factory)
+        for day in (1, 11, 21):
+            for room_id in self.room_ids:
+                check_in = date(2024, 1, day)
+                self.repo.add_booking(
+                    make_booking(room_id, check_in, check_in + timedelta(days=5))
+                )
+        self.analytics = AnalyticsRepository(factory)
+        self.analytics.snapshot()
+
+    def test_archive_moves_finished_stays_in_batches(self):
+        self.assertEqual(self.repo.archive(date(2024, 1, 20), batch_size=4), 6)
+        self.assertEqual(self.repo.archive(date(2024, 1, 20), batch_size=4), 0)
+        live = self.repo.list_bookings()
+        self.assertEqual([b.id for b in live], [7, 8, 9])
+        everything = self.repo.list_bookings(include_archived=True)
+        self.assertEqual([b.id for b in everything], list(range(1, 10)))
+        page = self.repo.list_bookings(limit=3, after=5, include_archived=True)
+        self.assertEqual([b.id for b in page], [6, 7, 8])
+        streamed = self.repo.iter_bookings(after=2, include_archived=True)
+        self.assertEqual([b.id for b in streamed], list(range(3, 10)))
+
+    def test_archived_ids_are_never_handed_out_again(self):
+        self.assertEqual(self.repo.archive(date(2025, 1, 1)), 9)
+        self.assertEqual(self.repo.list_bookings(), [])
+        booking = self.repo.add_booking(
+            make_booking(self.room_ids[0], date(2024, 3, 1), date(2024, 3, 3))
+        )
+        self.assertEqual(booking.id, 10)
+
+    def test_archived_stays_still_conflict_and_count(self):
+        self.repo.archive(date(2024, 1, 20))
+        with self.assertRaises(BookingConflictError):
+            self.repo.add_booking(
+                make_booking(self.room_ids[0], date(2024, 1, 3), date(2024, 1, 4))
+            )
+        rejected = self.repo.add_bookings(
+            [
+                make_booking(self.room_ids[1], date(2024, 1, 14), date(2024, 1, 16)),
+                make_booking(self.room_ids[1], date(2024, 1, 16), date(2024, 1, 18)),
+            ]
+        )
+        self.assertEqual(list(rejected), [0])
+        self.assertEqual(len(self.analytics.snapshot().stays), 10)
+
+    def test_snapshot_follows_an_archive_pass_refilled_to_the_same_count(self):
+        self.assertEqual(self.repo.archive(date(2024, 1, 10)), 3)
+        for room_id in self.room_ids:
+            self.repo.add_booking(
+                make_booking(room_id, date(2024, 2, 1), date(2024, 2, 3))
+            )
+        stays = self.analytics.snapshot().stays
+        everything = self.repo.list_bookings(include_archived=True)
+        self.assertEqual(
+            sorted(stays.check_in.tolist()),
+            sorted((b.check_in - date(1970, 1, 1)).days for b in everything),
+        )
+
+
+class ChangeVersionTestCase(unittest.TestCase):
+    def setUp(self):
+        factory = memory_session_factory()
+        self.props = PropertyRepository(factory)
+        self.bookings = BookingRepository(factory)
+        self.first = self.props.add_property(name="House", location="Paradera")
+        self.second = self.props.add_property(name="Villa", location="Noord")
+
+    def test_since_lists_changes_in_version_order(self):
+        changed, version = self.props.properties_since(0)
+        self.assertEqual([p.id for p in changed], [self.first.id, self.second.id])
+        self.assertEqual(version, self.props.properties_version())
+        self.assertEqual(self.props.properties_since(version), ([], version))
+
+        self.props.upsert_properties([self.first])
+        third = self.props.add_property(name="Cabin", location="Savaneta")
+        page, cursor = self.props.properties_since(version, limit=1)
+        self.assertEqual([p.id for p in page], [self.first.id])
+        rest, latest = self.props.properties_since(cursor, limit=5)
+        self.assertEqual([p.id for p in rest], [third.id])
+        self.assertEqual(latest, self.props.properties_version())
+
+    def test_room_tokens_change_per_property(self):
+        room = self.props.add_room(self.first.id, beds=2)
+        first, second = (
+            self.props.rooms_version(self.first.id),
+            self.props.rooms_version(self.second.id),
+        )
+        other = self.props.add_room(self.second.id)
+        self.assertEqual(self.props.rooms_version(self.first.id), first)
+        self.assertNotEqual(self.props.rooms_version(self.second.id), second)
+        room.beds = 3
+        self.props.upsert_rooms([room])
+        self.assertNotEqual(self.props.rooms_version(self.first.id), first)
+        changed, _ = self.props.rooms_since(0, property_id=self.first.id)
+        self.assertEqual([r.id for r in changed], [room.id])
+
+    def test_rooms_cannot_move_to_another_property(self):
+        room = self.props.add_room(self.first.id, beds=2)
+        version = self.props.rooms_version()
+        room.beds, room.property_id = 3, self.second.id
+        with self.assertRaises(ValueError):
+            self.props.upsert_rooms([room])
+        self.assertEqual(self.props.rooms_version(), version)
+        (stored,) = self.props.list_rooms()
+        self.assertEqual((stored.property_id, stored.beds), (self.first.id, 2))
+
+    def test_booking_writes_and_archiving_bump_the_version(self):
+        room = self.props.add_room(self.first.id)
+        versions = [self.bookings.bookings_version()]
+        for day in (1, 5, 9):
+            self.bookings.add_booking(
+                make_booking(room.id, date(2024, 1, day), date(2024, 1, day + 2))
+            )
+        versions.append(self.bookings.bookings_version())
+        self.bookings.archive(date(2024, 1, 8))
+        versions.append(self.bookings.bookings_version())
+        self.assertEqual(versions, sorted(set(versions)))
+        changed, _ = self.bookings.bookings_since(versions[0])
+        self.assertEqual([b.check_in.day for b in changed], [9])
+
+
+class ConcurrentBookingTestCase(unittest.TestCase):
+    """Parallel bookings through two "processes" sharing one database file."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        url = f"sqlite:///{tmp.name}/test.db"
+        self.workers = []
+        for _ in range(2):
+            write_engine, read_engine = create_engines(url)
+            self.addCleanup(write_engine.dispose)
+            self.addCleanup(read_engine.dispose)
+            self.workers.append((sessionmaker(write_engine), sessionmaker(read_engine)))
+        migrate(write_engine)
+        prop_repo = PropertyRepository(*self.workers[0])
+        prop = prop_repo.add_property(name="Aruba House", location="Paradera")
+        self.rooms = [prop_repo.add_room(prop.id, 2).id for _ in range(3)]
+
+    def run_threads(self, targets) -> None:
+        threads = [threading.Thread(target=target) for target in targets]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_simultaneous_bookings_of_a_room_admit_one(self):
+        repos = [BookingRepository(*factories) for factories in self.workers]
+        rounds, threads = 20, 8
+        barrier = threading.Barrier(threads)
+        stored, errors = [], []
+
+        def book(worker: int) -> None:
+            repo = repos[worker % 2]
+            for day in range(rounds):
+                # Every thread asks for the same stay at once, the even
+                # ones through the other "process".
+                check_in = date(2024, 1, 1) + timedelta(days=2 * day)
+                booking = make_booking(
+                    self.rooms[day % len(self.rooms)],
+                    check_in,
+                    check_in + timedelta(days=1 + worker % 2),
+                )
+                barrier.wait()
+                try:
+                    stored.append(repo.add_booking(booking))
+                except BookingConflictError:
+                    pass
+                except Exception as exc:  # e.g. "database is locked"
+                    errors.append(exc)
+
+        self.run_threads([lambda w=w: book(w) for w in range(threads)])
+        self.assertEqual(errors, [])
+        self.assertEqual(len(stored), rounds)
+        self.assertEqual(len(repos[0].list_bookings()), rounds)
+
+    def test_bookings_of_other_rooms_do_not_wait(self):
+        locks = StripedLock()
+        repo = BookingRepository(*self.workers[0], room_locks=locks)
+        busy, free = self.rooms[0], self.rooms[1]
+
+        def book(room_id: int) -> threading.Thread:
+            booking = make_booking(room_id, date(2024, 1, 1), date(2024, 1, 3))
+            thread = threading.Thread(target=repo.add_booking, args=(booking,))
+            thread.start()
+            return thread
+
+        with locks.hold([busy]):
+            waiting, other = book(busy), book(free)
+            other.join(5)
+            self.assertFalse(other.is_alive())
+            waiting.join(0.2)
+            self.assertTrue(waiting.is_alive())
+        waiting.join(5)
+        self.assertEqual(len(repo.list_bookings()), 2)
+
+
+class GroupCommitTestCase(unittest.TestCase):
+    def setUp(self):
+        factory = memory_session_factory()
+        prop_repo = PropertyRepository(factory)
+        prop = prop_repo.add_property(name="Aruba House", location="Paradera")
+        self.room_id = prop_repo.add_room(prop.id, 2).id
+        self.batches = []
+        self.repo = GroupCommitBookingRepository(
+            BookingRepository(factory),
+            interval_ms=50,
+            batch_size=4,
+            on_flush=self.batches.append,
+        )
+        self.addCleanup(self.repo.close)
+
+    def test_each_caller_gets_its_own_outcome(self):
+        start = date(2024, 1, 1)
+        futures = [
+            self.repo.submit(
+                make_booking(
+                    self.room_id,
+                    start + timedelta(days=day % 5),
+                    start + timedelta(days=day % 5 + 1),
+                )
+            )
+            for day in range(10)
+        ]
+        outcomes = [future.exception() or future.result() for future in futures]
+        self.assertTrue(all(b.id for b in outcomes[:5]))
+        for outcome in outcomes[5:]:
+            self.assertIsInstance(outcome, BookingConflictError)
+        self.assertEqual(self.batches, [4, 4, 2])
+        self.assertEqual(len(self.repo.list_bookings()), 5)
+
+    def test_bad_booking_only_fails_its_caller(self):
+        good = make_booking(self.room_id, date(2024, 1, 1), date(2024, 1, 2))
+        bad = make_booking(self.room_id, None, None)
+        futures = [self.repo.submit(good), self.repo.submit(bad)]
+        self.assertTrue(futures[0].result().id)
+        self.assertIsNotNone(futures[1].exception())
+        self.assertEqual(self.batches, [2])
+
+    def test_failed_batch_is_bisected_to_the_bad_booking(self):
+        inner = self.repo._repository
+        transactions = []
+
+        def add_bookings(bookings):
+            transactions.append(len(bookings))
+            if any(booking.guest_name == "Bad" for booking in bookings):
+                raise ValueError("bad booking")
+            return inner.add_bookings(bookings)
+
+        repo = GroupCommitBookingRepository(
+            mock.Mock(wraps=inner, add_bookings=add_bookings),
+            interval_ms=1000,
+            batch_size=16,
+        )
+        self.addCleanup(repo.close)
+        bookings = [
+            make_booking(self.room_id, date(2024, 1, day), date(2024, 1, day + 1))
+            for day in range(1, 17)
+        ]
+        bookings[5].guest_name = "Bad"
+        futures = [repo.submit(booking) for booking in bookings]
+        self.assertIsInstance(futures[5].exception(), ValueError)
+        for future in futures[:5] + futures[6:]:
+            self.assertTrue(future.result().id)
+        self.assertEqual(transactions, [16, 8, 8, 4, 4, 2, 2, 1, 1])
+
+        # A fault of every row is not bisected down to each of them.
+        bookings = [
+            make_booking(self.room_id, date(2025, 1, day), date(2025, 1, day + 1))
+            for day in range(1, 17)
+        ]
+        for booking in bookings:
+            booking.guest_name = "Bad"
+        transactions.clear()
+        futures = [repo.submit(booking) for booking in bookings]
+        for future in futures:
+            self.assertIsInstance(future.exception(), ValueError)
+        self.assertEqual(transactions, [16, 8, 8])
+
+    def test_close_flushes_queued_bookings(self):
+        future = self.repo.submit(
+            make_booking(self.room_id, date(2024, 1, 1), date(2024, 1, 2))
+        )
+        self.repo.close()
+        self.assertTrue(future.result(0).id)
+        with self.assertRaises(RuntimeError):
+            self.repo.submit(make_booking(self.room_id, date(2024, 2, 1), None))
+
+    def test_booking_submitted_while_closing_is_not_stranded(self):
+        first = make_booking(self.room_id, date(2024, 1, 1), date(2024, 1, 2))
+        self.repo.submit(first).result()
+        # Hold the next booking between the closed check and the queue until
+        # close queued the writer's stop marker, or gave up waiting for it.
+        entered, stopping = threading.Event(), threading.Event()
+        writer_queue = self.repo._queue
+
+        class HeldQueue:
+            get = writer_queue.get
+
+            def put(self, item) -> None:
+                if isinstance(item, tuple):
+                    entered.set()
+                    stopping.wait(0.5)
+                else:
+                    stopping.set()
+                writer_queue.put(item)
+
+        self.repo._queue = HeldQueue()
+        futures = []
+        late = make_booking(self.room_id, date(2024, 1, 2), date(2024, 1, 3))
+        submitter = threading.Thread(
+            target=lambda: futures.append(self.repo.submit(late))
+        )
+        submitter.start()
+        entered.wait(5)
+        self.repo.close()
+        submitter.join()
+        self.assertTrue(futures[0].result(timeout=5).id)
+
+
+class ShardedBookingTestCase(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.catalog_url = f"sqlite:///{tmp.name}/main.db"
+        write_engine, read_engine = create_engines(self.catalog_url)
+        self.addCleanup(write_engine.dispose)
+        self.addCleanup(read_engine.dispose)
+        migrate(write_engine)
+        self.catalog = (sessionmaker(write_engine), sessionmaker(read_engine))
+        prop_repo = PropertyRepository(*self.catalog)
+        self.rooms = {}
+        for _ in range(12):
+            prop = prop_repo.add_property(name="Aruba House", location="Paradera")
+            self.rooms[prop_repo.add_room(prop.id).id] = prop.id
+
+    def open(self, shard_count: int) -> ShardedBookingRepository:
+        urls = [f"sqlite:///{self.tmp}/shard{i}.db" for i in range(shard_count)]
+        router = ShardRouter(urls, self.catalog[1])
+        self.addCleanup(router.dispose)
+        router.migrate()
+        return ShardedBookingRepository(router, IdAllocator(self.catalog[0]))
+
+    def book_every_room(self, repo, check_in: date) -> list[Booking]:
+        bookings = [
+            make_booking(room_id, check_in, check_in + timedelta(days=2))
+            for room_id in self.rooms
+        ]
+        self.assertEqual(repo.add_bookings(bookings), {})
+        return bookings
+
+    def shard_contents(self, repo) -> list[set[int]]:
+        return [{b.room_id for b in s.list_bookings()} for s in repo._shards]
+
+    def test_bookings_live_on_the_shard_of_their_property(self):
+        repo = self.open(3)
+        stored = self.book_every_room(repo, date(2024, 1, 1))
+        stored.append(
+            repo.add_booking(make_booking(1, date(2024, 2, 1), date(2024, 2, 3)))
+        )
+        for shard, rooms in enumerate(self.shard_contents(repo)):
+            for room_id in rooms:
+                self.assertEqual(jump_hash(self.rooms[room_id], 3), shard)
+        ids = [b.id for b in stored]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual([b.id for b in repo.list_bookings()], sorted(ids))
+        self.assertEqual([b.id for b in repo.iter_bookings()], sorted(ids))
+        page = repo.list_bookings(limit=4, after=sorted(ids)[2])
+        self.assertEqual([b.id for b in page], sorted(ids)[3:7])
+        analytics = AnalyticsRepository(
+            *self.catalog,
+            stay_session_factories=[r for _, r in repo._router.session_factories],
+        )
+        self.assertEqual(len(analytics.snapshot().stays), len(ids))
+
+    def test_conflicts_and_unknown_rooms_are_rejected(self):
+        repo = self.open(2)
+        self.book_every_room(repo, date(2024, 1, 1))
+        with self.assertRaises(BookingConflictError):
+            repo.add_booking(make_booking(1, date(2024, 1, 2), date(2024, 1, 4)))
+        with self.assertRaises(ValueError):
+            repo.add_booking(make_booking(999, date(2024, 1, 2), date(2024, 1, 4)))
+        rejected = repo.add_bookings(
+            [
+                make_booking(2, date(2024, 1, 2), date(2024, 1, 3)),
+                make_booking(999, date(2024, 1, 2), date(2024, 1, 3)),
+                make_booking(3, date(2024, 3, 1), date(2024, 3, 3)),
+            ]
+        )
+        self.assertIsInstance(rejected[0], BookingConflictError)
+        self.assertIsInstance(rejected[1], ValueError)
+        self.assertEqual(sorted(rejected), [0, 1])
+
+    def test_shard_on_the_main_database_takes_ids_outside_its_lock(self):
+        urls = [self.catalog_url, f"sqlite:///{self.tmp}/shard1.db"]
+        router = ShardRouter(urls, self.catalog[1])
+        self.addCleanup(router.dispose)
+        router.migrate()
+        repo = ShardedBookingRepository(router, IdAllocator(self.catalog[0]))
+        room_id = next(r for r, p in self.rooms.items() if jump_hash(p, 2) == 0)
+        booking = repo.add_booking(
+            make_booking(room_id, date(2024, 1, 1), date(2024, 1, 3))
+        )
+        ids = [b.id for b in self.book_every_room(repo, date(2024, 2, 1))]
+        self.assertEqual(len(set(ids + [booking.id])), len(self.rooms) + 1)
+
+    def test_shard_at_database_url_shares_the_main_engines(self):
+        router = ShardRouter([DATABASE_URL, f"sqlite:///{self.tmp}/shard1.db"])
+        self.addCleanup(router.dispose)
+        write, read = router.session_factories[0]
+        self.assertIs(write.kw["bind"], SessionLocal.kw["bind"])
+        self.assertIs(read.kw["bind"], ReadSessionLocal.kw["bind"])
+
+    def test_rebalance_moves_bookings_to_the_new_layout(self):
+        # Start unsharded: all bookings in the main database.
+        unsharded = BookingRepository(*self.catalog)
+        for room_id in self.rooms:
+            unsharded.add_booking(
+                make_booking(room_id, date(2024, 1, 1), date(2024, 1, 3))
+            )
+        ids = [b.id for b in unsharded.list_bookings()]
+        self.assertEqual(unsharded.archive(date(2024, 2, 1)), 12)
+        two = [f"sqlite:///{self.tmp}/shard{i}.db" for i in range(2)]
+        self.assertEqual(rebalance([self.catalog_url], two, self.catalog_url), 12)
+        self.assertEqual(unsharded.list_bookings(include_archived=True), [])
+
+        three = two + [f"sqlite:///{self.tmp}/shard2.db"]
+        moved = rebalance(two, three, self.catalog_url)
+        expected = sum(jump_hash(p, 3) == 2 for p in self.rooms.values())
+        self.assertEqual(moved, expected)
+        self.assertEqual(rebalance(two, three, self.catalog_url), 0)
+
+        repo = self.open(3)
+        self.assertEqual(repo.list_bookings(), [])
+        listed = repo.list_bookings(include_archived=True)
+        self.assertEqual([b.id for b in listed], ids)
+        for shard, rooms in enumerate(self.shard_contents(repo)):
+            for room_id in rooms:
+                self.assertEqual(jump_hash(self.rooms[room_id], 3), shard)
+        booking = repo.add_booking(make_booking(1, date(2024, 2, 1), date(2024, 2, 3)))
+        self.assertGreater(booking.id, max(ids))
+
+
+class EngineFactoryTestCase(unittest.TestCase):
+    def test_sqlite_file_engines_use_wal_and_readonly_reader(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            write_engine, read_engine = create_engines(f"sqlite:///{tmp}/test.db")
+            try:
+                with write_engine.connect() as conn:
+                    mode = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+                with read_engine.connect() as conn:
+                    query_only = conn.exec_driver_sql("PRAGMA query_only").scalar()
+            finally:
+                write_engine.dispose()
+                read_engine.dispose()
+        self.assertEqual(mode, "wal")
+        self.assertEqual(query_only, 1)
+
+    def test_memory_database_shares_one_engine(self):
+        write_engine, read_engine = create_engines("sqlite://")
+        self.assertIs(write_engine, read_engine)
+
+
+class MigrationTestCase(unittest.TestCase):
+    def test_migrations_apply_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine, _ = create_engines(f"sqlite:///{tmp}/test.db")
+            try:
+                first = migrate(engine)
+                second = migrate(engine)
+            finally:
+                engine.dispose()
+        self.assertEqual(first, [m.version for m in MIGRATIONS])
+        self.assertEqual(second, [])
+
+    def test_autoincrement_step_counts_archived_ids_as_used(self):
+        engine = create_engine(
+            "sqlite://",
+            connect_args={"check_same_thread": False},
+            poolclass=StaticPool,
+        )
+        with mock.patch.object(migrations, "MIGRATIONS", MIGRATIONS[:8]):
+            migrate(engine)
+        factory = sessionmaker(bind=engine)
+        props = PropertyRepository(factory)
+        room = props.add_room(props.add_property("House", "Paradera").id)
+        bookings = BookingRepository(factory)
+        for day in (1, 20, 5):
+            bookings.add_booking(
+                make_booking(room.id, date(2024, 1, day), date(2024, 1, day + 2))
+            )
+        # Archives bookings 1 and 3, the highest id.
+        self.assertEqual(bookings.archive(date(2024, 1, 10)), 2)
+        self.assertEqual(migrate(engine), [9])
+        (kept,) = bookings.list_bookings()
+        self.assertEqual((kept.id, kept.check_in), (2, date(2024, 1, 20)))
+        booking = bookings.add_booking(
+            make_booking(room.id, date(2024, 2, 1), date(2024, 2, 3))
+        )
+        self.assertEqual(booking.id, 4)
+
+
+class AsyncBookingRepositoryTestCase(unittest.TestCase):
+    def setUp(self):
+        try:
+            import aiosqlite  # noqa: F401
+        except ImportError:
+            self.skipTest("aiosqlite unavailable")
+
+    def test_overlap_rejected_and_pages_listed(self):
+        from smart_host.infrastructure.async_repository import (
+            AsyncBookingRepository,
+            async_init_db,
+            async_session_factories,
+        )
+        from smart_host.infrastructure.sql.engine import create_async_engines
+
+        async def scenario():
+            write_engine, read_engine = create_async_engines("sqlite://")
+            await async_init_db(write_engine)
+            repo = AsyncBookingRepository(
+                *async_session_factories(write_engine, read_engine)
+            )
+            await repo.add_booking(make_booking(1, date(2024, 1, 1), date(2024, 1, 5)))
+            await repo.add_booking(make_booking(1, date(2024, 1, 5), date(2024, 1, 7)))
+            with self.assertRaises(BookingConflictError):
+                await repo.add_booking(
+                    make_booking(1, date(2024, 1, 4), date(2024, 1, 6))
+                )
+            page = await repo.list_bookings(limit=1, after=1)
+            streamed = [b.id async for b in repo.iter_bookings()]
+            await write_engine.dispose()
+            return page, streamed
+
+        page, streamed = asyncio.run(scenario())
+        self.assertEqual([b.check_in for b in page], [date(2024, 1, 5)])
+        self.assertEqual(streamed, [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
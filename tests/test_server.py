@@ -0,0 +1,61 @@
+"""Tests for the ``python -m smart_host`` launcher."""
+
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+import unittest
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / "src"))
+
+from fastapi import FastAPI, HTTPException
+from sqlalchemy import text
+
+from smart_host.infrastructure.sql.engine import create_db_engine
+from smart_host.server import warm_up
+
+
+class WarmUpTestCase(unittest.TestCase):
+    def test_requests_every_path_and_survives_errors(self):
+        app = FastAPI()
+        seen = []
+
+        @app.get("/items")
+        def items(limit: int = 10) -> list:
+            seen.append(limit)
+            return []
+
+        @app.get("/broken")
+        def broken() -> None:
+            raise HTTPException(500)
+
+        with self.assertLogs("uvicorn.error", "INFO") as logs:
+            asyncio.run(warm_up(app, ["/broken", "/items?limit=1", "/missing"]))
+        self.assertEqual(seen, [1])
+        self.assertIn("Warmed up /items?limit=1 (200)", "\n".join(logs.output))
+        self.assertIn("Warm-up of /broken failed", "\n".join(logs.output))
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "requires fork")
+class ForkedEngineTestCase(unittest.TestCase):
+    def test_forked_child_opens_its_own_connections(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_db_engine(f"sqlite:///{tmp}/test.db", readonly=True)
+            self.addCleanup(engine.dispose)
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            parent_pool = engine.pool
+            self.assertEqual(parent_pool.checkedin(), 1)
+            pid = os.fork()
+            if not pid:
+                fresh = engine.pool is not parent_pool
+                os._exit(0 if fresh and engine.pool.checkedin() == 0 else 1)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+            self.assertIs(engine.pool, parent_pool)
+            self.assertEqual(parent_pool.checkedin(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()